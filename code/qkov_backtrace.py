@@ -0,0 +1,308 @@
+"""GEBH backtracing: path and ancestry queries over the layered drift graph."""
+import collections
+
+import numpy as np
+
+
+def rank_by_target(target, cost, k):
+    """
+    Indices of the k lowest-cost candidates for each target, and their rank
+    among that target's candidates (0 = lowest cost)
+    """
+    order = np.lexsort((cost, target))
+    sorted_target = target[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_target[1:] != sorted_target[:-1]
+    start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    rank = np.arange(len(order)) - start
+    keep = rank < k
+    return order[keep], rank[keep]
+
+
+class DriftBacktracer:
+    """
+    Query engine over a drift map's edges, with edge drift as path cost
+
+    Every edge runs from level L to level L+1, so all queries are dynamic
+    programs that sweep the levels once, each level a handful of array
+    operations over its edges:
+
+    - lowest_drift_paths: the k paths from a node with the lowest cumulative
+      drift down to a target level (the deepest by default)
+    - ancestors: every node with a path into the given nodes, e.g. all the
+      nodes feeding a classifier-lock node
+    - leaf_chains: the best and worst (lowest and highest cumulative drift)
+      chain from a root into every leaf
+    - chain_costs: lowest cumulative drift (and optionally the path) for
+      thousands of (source, target) pairs at once
+
+    Results are memoized, so the backtracer is a snapshot: take a new one
+    (RecursiveQKOVMapper.backtracer does) after the map changes. Per-source
+    reach for chain_costs is kept up to about memo_bytes.
+    """
+
+    def __init__(self, arrays, memo_bytes=256 * 1024 * 1024):
+        self.arrays = arrays
+        self.src = arrays.edge_src
+        self.dst = arrays.indices
+        self.cost = np.asarray(arrays.edge_drift, dtype=np.float64)
+        if np.any(arrays.level[self.dst] != arrays.level[self.src] + 1):
+            raise ValueError("Backtracing needs every edge to run from level L to level L+1")
+
+        self.memo = {}
+        self.memo_bytes = memo_bytes
+        self.reach_memo = collections.OrderedDict()
+        self.reach_bytes = 0
+
+    @property
+    def depth(self):
+        return self.arrays.depth
+
+    def level_edges(self, level):
+        """Slice of the edges leaving a level (CSR rows are contiguous per level)"""
+        offsets, indptr = self.arrays.level_offsets, self.arrays.indptr
+        return slice(indptr[offsets[level]], indptr[offsets[level + 1]])
+
+    def chain_from_predecessors(self, ends, predecessor):
+        """
+        (len(ends), depth) node chains ending at each of ends, walked back
+        through predecessor (edge into each node, -1 at chain starts); levels
+        outside a chain are -1
+        """
+        ends = np.asarray(ends, dtype=np.int64)
+        chains = np.full((len(ends), self.depth), -1, dtype=np.int64)
+        rows = np.arange(len(ends))
+        nodes = ends
+        while len(rows):
+            chains[rows, self.arrays.level[nodes]] = nodes
+            edge = predecessor[nodes]
+            more = edge >= 0
+            rows, nodes = rows[more], self.src[edge[more]]
+        return chains
+
+    def lowest_drift_paths(self, source, k=3, target_level=None):
+        """
+        The k lowest cumulative drift paths from source to any node of
+        target_level (default: the deepest level), as a list of (cost, node
+        ids from source to target), lowest cost first
+        """
+        target_level = self.depth - 1 if target_level is None else target_level
+        key = ('paths', int(source), k, target_level)
+        if key in self.memo:
+            return self.memo[key]
+
+        # State per reached node: its k best costs, and for each the edge and
+        # the rank (at the edge's source) it extends
+        source_level = int(self.arrays.level[source])
+        nodes = np.array([source])
+        costs = np.zeros((1, 1))
+        steps = []
+        for level in range(source_level, target_level):
+            edges = np.arange(self.level_edges(level).start, self.level_edges(level).stop)
+            slot = np.searchsorted(nodes, self.src[edges])
+            reached = (slot < len(nodes)) & (nodes[np.minimum(slot, len(nodes) - 1)] ==
+                                             self.src[edges])
+            edges, slot = edges[reached], slot[reached]
+            if len(edges) == 0:
+                return self.memo.setdefault(key, [])
+
+            # Every (edge, rank) extension, then the k cheapest per target
+            width = costs.shape[1]
+            candidate = (costs[slot] + self.cost[edges][:, None]).ravel()
+            edge = np.repeat(edges, width)
+            rank = np.tile(np.arange(width), len(edges))
+            finite = np.isfinite(candidate)
+            candidate, edge, rank = candidate[finite], edge[finite], rank[finite]
+            picked, new_rank = rank_by_target(self.dst[edge], candidate, k)
+
+            nodes = np.unique(self.dst[edge[picked]])
+            width = int(new_rank.max()) + 1
+            row = np.searchsorted(nodes, self.dst[edge[picked]])
+            costs = np.full((len(nodes), width), np.inf)
+            costs[row, new_rank] = candidate[picked]
+            back = np.full((len(nodes), width, 2), -1, dtype=np.int64)
+            back[row, new_rank] = np.stack([edge[picked], rank[picked]], axis=1)
+            steps.append((nodes, back))
+
+        # The k cheapest end states, traced back level by level
+        row, rank = np.unravel_index(np.argsort(costs, axis=None, kind='stable')[:k], costs.shape)
+        finite = np.isfinite(costs[row, rank])
+        row, rank = row[finite], rank[finite]
+        paths = np.full((len(row), len(steps) + 1), source, dtype=np.int64)
+        path_costs = costs[row, rank]
+        for step in range(len(steps) - 1, -1, -1):
+            step_nodes, back = steps[step]
+            paths[:, step + 1] = step_nodes[row]
+            edge, rank = back[row, rank, 0], back[row, rank, 1]
+            if step:
+                row = np.searchsorted(steps[step - 1][0], self.src[edge])
+        return self.memo.setdefault(key, [(float(cost), path)
+                                          for cost, path in zip(path_costs, paths)])
+
+    def ancestors(self, nodes):
+        """Sorted ids of every node with a path into any of nodes"""
+        nodes = np.unique(np.atleast_1d(np.asarray(nodes, dtype=np.int64)))
+        key = ('ancestors', nodes.tobytes())
+        if key in self.memo:
+            return self.memo[key]
+
+        reached = np.zeros(self.arrays.num_nodes, dtype=bool)
+        reached[nodes] = True
+        found = np.zeros_like(reached)
+        for level in range(int(self.arrays.level[nodes].max(initial=0)) - 1, -1, -1):
+            edges = self.level_edges(level)
+            feeding = self.src[edges][reached[self.dst[edges]]]
+            reached[feeding] = True
+            found[feeding] = True
+        return self.memo.setdefault(key, np.flatnonzero(found))
+
+    def chain_extremes(self, largest):
+        """
+        Lowest (or highest) cumulative drift from any root (node without
+        incoming edges) to every node, with the edge into each node on that
+        chain (-1 at roots)
+        """
+        key = ('extremes', largest)
+        if key in self.memo:
+            return self.memo[key]
+        total = np.zeros(self.arrays.num_nodes)
+        predecessor = np.full(self.arrays.num_nodes, -1, dtype=np.int64)
+        sign = -1.0 if largest else 1.0
+        for level in range(self.depth - 1):
+            edges = np.arange(self.level_edges(level).start, self.level_edges(level).stop)
+            candidate = total[self.src[edges]] + self.cost[edges]
+            picked, _ = rank_by_target(self.dst[edges], sign * candidate, 1)
+            total[self.dst[edges[picked]]] = candidate[picked]
+            predecessor[self.dst[edges[picked]]] = edges[picked]
+        return self.memo.setdefault(key, (total, predecessor))
+
+    def leaf_chains(self):
+        """
+        The best and worst chain into every leaf (node without outgoing edges)
+
+        Returns 'leaves' and, for 'best' and 'worst', the cumulative drift
+        ('best_cost') and the (num_leaves, depth) chain of node ids by level
+        ('best_chain'), -1 at levels above the chain's root.
+        """
+        if 'leaf_chains' not in self.memo:
+            leaves = np.flatnonzero(np.diff(self.arrays.indptr) == 0)
+            chains = {'leaves': leaves}
+            for name, largest in (('best', False), ('worst', True)):
+                total, predecessor = self.chain_extremes(largest)
+                chains[f'{name}_cost'] = total[leaves]
+                chains[f'{name}_chain'] = self.chain_from_predecessors(leaves, predecessor)
+            self.memo['leaf_chains'] = chains
+        return self.memo['leaf_chains']
+
+    def reach(self, sources):
+        """
+        Every node reachable from each source with its lowest cumulative
+        drift and the edge into it on that path (-1 at the source), as flat
+        (owner, node, cost, predecessor) arrays sorted by (owner, node), where
+        owner indexes sources. Sources are distinct; per-source results are
+        memoized.
+
+        Only reached nodes are stored: each level expands the previous
+        frontier through its out-edges and keeps the cheapest candidate per
+        (owner, target), so the work follows the reachable edges rather than
+        sources x nodes.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        missing = np.array([s for s in sources.tolist() if s not in self.reach_memo],
+                           dtype=np.int64)
+        if len(missing):
+            self.remember_reach(missing, *self.sweep(missing))
+
+        parts = [self.reach_memo[s] for s in sources.tolist()]
+        for source in sources.tolist():
+            self.reach_memo.move_to_end(source)
+        owner = np.repeat(np.arange(len(sources)), [len(part[0]) for part in parts])
+        node, cost, predecessor = (np.concatenate([part[i] for part in parts]) for i in range(3))
+        return owner, node, cost, predecessor
+
+    def sweep(self, sources):
+        """Sparse multi-source lowest-drift sweep over the levels (see reach)"""
+        num_nodes = self.arrays.num_nodes
+        level = self.arrays.level[sources]
+        owner = [np.flatnonzero(level == level.min())]
+        node = [sources[owner[0]]]
+        cost = [np.zeros(len(owner[0]))]
+        predecessor = [np.full(len(owner[0]), -1, dtype=np.int64)]
+        frontier = (owner[0], node[0], cost[0])
+        for current in range(int(level.min()), self.depth - 1):
+            # Sources on the next level join the frontier there
+            joining = np.flatnonzero(level == current + 1)
+            front_owner, front_node, front_cost = frontier
+            edges = self.arrays.ranges(self.arrays.indptr[front_node],
+                                       self.arrays.indptr[front_node + 1])
+            fanout = np.diff(self.arrays.indptr)[front_node]
+            edge_owner = np.repeat(front_owner, fanout)
+            candidate = np.repeat(front_cost, fanout) + self.cost[edges]
+            picked, _ = rank_by_target(edge_owner * num_nodes + self.dst[edges], candidate, 1)
+            frontier = (np.concatenate([edge_owner[picked], joining]),
+                        np.concatenate([self.dst[edges[picked]], sources[joining]]),
+                        np.concatenate([candidate[picked], np.zeros(len(joining))]))
+            owner.append(frontier[0])
+            node.append(frontier[1])
+            cost.append(frontier[2])
+            predecessor.append(np.concatenate([edges[picked], np.full(len(joining), -1)]))
+            if len(frontier[0]) == 0 and not (level > current + 1).any():
+                break
+
+        owner, node, cost, predecessor = (np.concatenate(values)
+                                          for values in (owner, node, cost, predecessor))
+        order = np.lexsort((node, owner))
+        return owner[order], node[order], cost[order], predecessor[order]
+
+    def remember_reach(self, sources, owner, node, cost, predecessor):
+        """Store each source's slice of a sweep, dropping the oldest beyond memo_bytes"""
+        bounds = np.searchsorted(owner, np.arange(len(sources) + 1))
+        for i, source in enumerate(sources.tolist()):
+            part = slice(bounds[i], bounds[i + 1])
+            self.reach_memo[source] = (node[part], cost[part], predecessor[part])
+            self.reach_bytes += 24 * (bounds[i + 1] - bounds[i])
+        # Never evict this batch's own sources, which reach() reads back
+        while self.reach_bytes > self.memo_bytes and len(self.reach_memo) > len(sources):
+            _, (old_node, _, _) = self.reach_memo.popitem(last=False)
+            self.reach_bytes -= 24 * len(old_node)
+
+    def chain_costs(self, sources, targets, return_paths=False, block_sources=4096):
+        """
+        Lowest cumulative drift from sources[i] to targets[i] for every pair
+        (inf if there is no path)
+
+        Pairs are answered block_sources distinct sources at a time, each
+        block one sparse sweep over the levels (see reach). With
+        return_paths, also returns the (num_pairs, depth) node chains by
+        level, -1 outside the path (and for unreachable pairs).
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        costs = np.full(len(sources), np.inf)
+        paths = np.full((len(sources), self.depth), -1, dtype=np.int64)
+
+        unique_sources = np.unique(sources)
+        for start in range(0, len(unique_sources), block_sources):
+            block = unique_sources[start:start + block_sources]
+            pairs = np.flatnonzero(np.isin(sources, block))
+            owner, node, cost, predecessor = self.reach(block)
+
+            # Look each pair up among the reached (owner, node) keys
+            num_nodes = self.arrays.num_nodes
+            keys = owner * num_nodes + node
+            pair_keys = np.searchsorted(block, sources[pairs]) * num_nodes + targets[pairs]
+            found = np.minimum(np.searchsorted(keys, pair_keys), max(len(keys) - 1, 0))
+            hit = (keys[found] == pair_keys) if len(keys) else np.zeros(len(pairs), dtype=bool)
+            costs[pairs[hit]] = cost[found[hit]]
+            if not return_paths:
+                continue
+
+            # Walk back through predecessor edges, one level per step
+            rows, state = pairs[hit], found[hit]
+            while len(rows):
+                paths[rows, self.arrays.level[node[state]]] = node[state]
+                edge = predecessor[state]
+                more = edge >= 0
+                rows, state, edge = rows[more], state[more], edge[more]
+                state = np.searchsorted(keys, owner[state] * num_nodes + self.src[edge])
+        return (costs, paths) if return_paths else costs
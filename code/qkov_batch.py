@@ -0,0 +1,268 @@
+"""
+Resumable batch rendering of drift map parameter sweeps.
+
+    python qkov_batch.py sweep.json --output renders/ --workers 8
+
+The sweep spec is a JSON file (or an inline JSON object):
+
+    {
+        "params": {"depth": [4, 5], "nodes_per_level": [8, 64], "array_core": true},
+        "seeds": {"start": 0, "count": 100},
+        "artifacts": ["png", "data"],
+        "render": {"png": {"dpi": 100, "render_mode": "batched"}, "gif": {"frames": 30}}
+    }
+
+List-valued params are swept as a cartesian product, times every seed
+("seeds" may also be a list or a count). Each entry's artifacts go to
+<output>/<kind>/<entry id>.<ext> and one JSON line per finished entry
+(parameters, artifact paths and sizes, per-stage timings or the error) is
+appended to <output>/manifest.jsonl. Rerunning the same command skips the
+entries already recorded there as done, so an interrupted batch resumes
+where it stopped.
+"""
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qkov_concurrency import bounded_map, write_atomic
+
+# Mapper parameters a spec may set or sweep
+SPEC_PARAMS = ('depth', 'nodes_per_level', 'drift_threshold', 'array_core', 'layout')
+
+# Artifact kinds and their file extensions; 'data' holds the map arrays and positions,
+# 'thumb' a matplotlib-free preview (see RecursiveQKOVMapper.thumbnail_png)
+ARTIFACTS = {'png': 'png', 'gif': 'gif', 'html': 'html', 'data': 'npz', 'thumb': 'png'}
+
+MANIFEST = 'manifest.jsonl'
+
+
+def load_spec(spec):
+    """Read a sweep spec from a JSON file path, a JSON string or a dict"""
+    if isinstance(spec, dict):
+        return spec
+    if os.path.exists(spec):
+        with open(spec) as f:
+            return json.load(f)
+    return json.loads(spec)
+
+
+def expand_spec(spec):
+    """
+    Expand a sweep spec into entries: dicts with an id, the mapper params
+    and the seed, in a stable order
+    """
+    params = spec.get('params', {})
+    unknown = sorted(set(params) - set(SPEC_PARAMS))
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {unknown}; expected some of {SPEC_PARAMS}")
+    swept = [name for name in params if isinstance(params[name], list)]
+
+    seeds = spec.get('seeds', [0])
+    if isinstance(seeds, int):
+        seeds = range(seeds)
+    elif isinstance(seeds, dict):
+        seeds = range(seeds.get('start', 0), seeds.get('start', 0) + seeds['count'])
+
+    entries = []
+    for values in itertools.product(*(params[name] for name in swept)):
+        point = dict(params, **dict(zip(swept, values)))
+        for seed in seeds:
+            # Readable swept values plus a digest of everything that determines the output
+            digest = hashlib.sha256(json.dumps([point, seed, spec.get('render', {})],
+                                               sort_keys=True).encode('utf-8')).hexdigest()[:10]
+            label = '-'.join([f"{name}{value}" for name, value in zip(swept, values)] +
+                             [f"seed{seed}"])
+            entries.append({'id': f"{label}-{digest}", 'params': point, 'seed': seed})
+    return entries
+
+
+def read_manifest(path):
+    """Return the manifest records by entry id; a torn last line (after a crash) is ignored"""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['id']] = record
+    return records
+
+
+def repair_manifest(path):
+    """Cut a torn last line (after a crash) off the manifest, so new lines start clean"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def run_batch(spec, output, workers=None, artifacts=None, chunk_entries=1, restart=False,
+              progress=None):
+    """
+    Render every entry of spec not yet done in output's manifest
+
+    Entries go to a process pool in tasks of chunk_entries, with at most two
+    tasks per worker in flight; each worker builds, renders and writes its
+    entries itself, so the parent only appends manifest lines and throughput
+    scales with the worker count. Failed entries are recorded with their
+    error and retried on the next run. Returns a summary dict.
+    """
+    spec = load_spec(spec)
+    artifacts = list(artifacts or spec.get('artifacts', ['png']))
+    unknown = sorted(set(artifacts) - set(ARTIFACTS))
+    if unknown:
+        raise ValueError(f"Unknown artifacts {unknown}; expected some of {sorted(ARTIFACTS)}")
+    render = spec.get('render', {})
+    workers = workers or os.cpu_count() or 1
+
+    os.makedirs(output, exist_ok=True)
+    for kind in artifacts:
+        os.makedirs(os.path.join(output, kind), exist_ok=True)
+    manifest_path = os.path.join(output, MANIFEST)
+    if restart and os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    repair_manifest(manifest_path)
+
+    entries = expand_spec(spec)
+    done = {entry_id for entry_id, record in read_manifest(manifest_path).items()
+            if record.get('status') == 'ok' and set(artifacts) <= set(record.get('artifacts', {}))}
+    todo = [entry for entry in entries if entry['id'] not in done]
+    chunks = [todo[start:start + chunk_entries] for start in range(0, len(todo), chunk_entries)]
+
+    counts = {'ok': 0, 'error': 0}
+    start = time.perf_counter()
+    with open(manifest_path, 'a') as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        def record(result):
+            for line in result:
+                manifest.write(json.dumps(line) + '\n')
+                counts[line['status']] += 1
+            # Flushed and synced per task, so a crash loses at most the tasks in flight
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            if progress is not None:
+                progress(counts['ok'] + counts['error'], len(todo))
+
+        # Collect tasks as they finish, with a bounded number in flight
+        for result in bounded_map(pool, _render_entries,
+                                  ((chunk, output, artifacts, render) for chunk in chunks),
+                                  workers, ordered=False):
+            record(result)
+
+    seconds = time.perf_counter() - start
+    return {
+        'entries': len(entries),
+        'skipped': len(entries) - len(todo),
+        'rendered': counts['ok'],
+        'failed': counts['error'],
+        'seconds': seconds,
+        'entries_per_second': (counts['ok'] + counts['error']) / seconds if todo else 0.0,
+        'workers': workers,
+    }
+
+
+def render_entry(entry, output, artifacts, render):
+    """Build one entry's map and write its artifacts; returns its manifest record"""
+    from qkov_recursive_map import RecursiveQKOVMapper
+
+    record = {'id': entry['id'], 'params': entry['params'], 'seed': entry['seed'],
+              'artifacts': {}, 'bytes': {}, 'timings': {}, 'pid': os.getpid()}
+    timings = record['timings']
+    start = time.perf_counter()
+    try:
+        mapper = RecursiveQKOVMapper(seed=entry['seed'], **entry['params'])
+        timings['build'] = time.perf_counter() - start
+        for kind in artifacts:
+            stage_start = time.perf_counter()
+            data = render_artifact(mapper, kind, render.get(kind, {}))
+            path = os.path.join(kind, f"{entry['id']}.{ARTIFACTS[kind]}")
+            write_atomic(os.path.join(output, path), data)
+            timings[kind] = time.perf_counter() - stage_start
+            record['artifacts'][kind] = path
+            record['bytes'][kind] = len(data)
+        record['status'] = 'ok'
+    except Exception as error:
+        record['status'] = 'error'
+        record['error'] = f"{type(error).__name__}: {error}"
+        record['traceback'] = traceback.format_exc()
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+
+def render_artifact(mapper, kind, options):
+    """Return the bytes of one artifact of mapper"""
+    if kind == 'png':
+        return mapper.render_png(**options)
+    if kind == 'gif':
+        buffer = io.BytesIO()
+        mapper.create_animation(buffer, **options)
+        return buffer.getvalue()
+    if kind == 'html':
+        return mapper.generate_html_output(**options).encode('utf-8')
+    if kind == 'thumb':
+        return mapper.thumbnail_png(**options)
+
+    # Map arrays in the layout the render service accepts as an upload, plus derived values
+    from qkov_service import CORE_FIELDS
+
+    arrays = mapper.map_arrays()
+    fields = {name: getattr(arrays, name) for name in CORE_FIELDS + (
+        'drift', 'is_classifier', 'edge_drift', 'edge_noise')}
+    if fields['edge_noise'] is None:
+        del fields['edge_noise']
+    if options.get('positions', True):
+        fields['positions'] = mapper.position_array()
+    buffer = io.BytesIO()
+    (np.savez_compressed if options.get('compress') else np.savez)(buffer, **fields)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('spec', help='sweep spec: a JSON file or an inline JSON object')
+    parser.add_argument('-o', '--output', required=True, help='artifact and manifest directory')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--artifacts', help='comma-separated kinds, overriding the spec '
+                        f"({', '.join(ARTIFACTS)})")
+    parser.add_argument('--chunk-entries', type=int, default=1,
+                        help='entries per worker task (raise for many tiny maps)')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore the existing manifest and render everything again')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    def progress(finished, total):
+        print(f"\r{finished}/{total} entries", end='', file=sys.stderr, flush=True)
+
+    summary = run_batch(args.spec, args.output, workers=args.workers,
+                        artifacts=args.artifacts.split(',') if args.artifacts else None,
+                        chunk_entries=args.chunk_entries, restart=args.restart,
+                        progress=None if args.quiet else progress)
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['failed'] else 0
+
+
+def _render_entries(entries, output, artifacts, render):
+    """Render a chunk of entries in a worker process"""
+    return [render_entry(entry, output, artifacts, render) for entry in entries]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""Benchmarks for RecursiveQKOVMapper construction, memory use and rendering."""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from qkov_recursive_map import RecursiveQKOVMapper
+
+
+# Import budget for qkov_recursive_map; NumPy accounts for most of it
+IMPORT_BUDGET_MS = 300
+
+# Modules that must stay out of a bare import of qkov_recursive_map
+LAZY_IMPORTS = ('matplotlib', 'networkx', 'PIL', 'IPython')
+
+# Suite grid of (depth, nodes_per_level): the default map up to about 100k nodes
+SUITE_GRID = ((5, 8), (5, 200), (5, 2000), (5, 20000))
+
+# Suite stages, in pipeline order
+SUITE_STAGES = ('construction', 'construction_networkx', 'layout', 'render',
+                'render_artists', 'thumbnail', 'animation', 'html')
+
+# Largest map (in nodes) each stage runs on; bigger grid points are recorded as skipped
+SUITE_LIMITS = {'construction_networkx': 20000, 'render_artists': 10000,
+                'animation': 20000, 'html': 20000}
+
+# Frames rendered by the animation and html stages
+SUITE_FRAMES = 10
+
+
+def measure_import(module='qkov_recursive_map'):
+    """Return (cumulative import ms, top-level packages imported) in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if not line.startswith('import time:') or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        cumulative[fields[2].strip()] = int(fields[1])
+    packages = {name.split('.')[0] for name in cumulative}
+    return cumulative[module] / 1000, packages
+
+
+def check_import_time(budget_ms=IMPORT_BUDGET_MS):
+    """Fail if importing qkov_recursive_map is over budget or pulls in rendering packages"""
+    elapsed, packages = measure_import()
+    eager = sorted(packages.intersection(LAZY_IMPORTS))
+    print(f"import qkov_recursive_map: {elapsed:.1f} ms (budget {budget_ms} ms)")
+    assert not eager, f"imported eagerly: {', '.join(eager)}"
+    assert elapsed <= budget_ms, f"import took {elapsed:.1f} ms, over the {budget_ms} ms budget"
+
+
+def measure_construction(depth, nodes_per_level, array_core, repeats=2):
+    """Return (best construction seconds, retained bytes, node count) for one configuration"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        mapper = RecursiveQKOVMapper(depth=depth, nodes_per_level=nodes_per_level,
+                                     array_core=array_core)
+        best = min(best, time.perf_counter() - start)
+    del mapper
+
+    # Measure memory retained by a fresh mapper (positions included for both paths)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    mapper = RecursiveQKOVMapper(depth=depth, nodes_per_level=nodes_per_level,
+                                 array_core=array_core)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    num_nodes = mapper.core.num_nodes if array_core else mapper.graph.number_of_nodes()
+    return best, retained, num_nodes
+
+
+def bench_construction(sizes=((5, 8), (5, 1000), (5, 10000))):
+    """Compare construction time and bytes per node for the networkx and array-core paths"""
+    print(f"{'depth':>5} {'npl':>6} {'nodes':>8} | {'networkx s':>10} {'B/node':>8} | "
+          f"{'array s':>9} {'B/node':>8} | {'speedup':>7}")
+    for depth, nodes_per_level in sizes:
+        nx_time, nx_bytes, num_nodes = measure_construction(depth, nodes_per_level, False)
+        arr_time, arr_bytes, _ = measure_construction(depth, nodes_per_level, True)
+        print(f"{depth:>5} {nodes_per_level:>6} {num_nodes:>8} | {nx_time:>10.4f} "
+              f"{nx_bytes / num_nodes:>8.0f} | {arr_time:>9.4f} {arr_bytes / num_nodes:>8.0f} | "
+              f"{nx_time / arr_time:>6.1f}x")
+
+
+def nodes_per_level_for(num_nodes, depth=5):
+    """Return the nodes_per_level that gives roughly num_nodes nodes at this depth"""
+    # Level L holds nodes_per_level - L nodes (for nodes_per_level >= depth + 2)
+    return (num_nodes + depth * (depth - 1) // 2) // depth
+
+
+def measure_node_render(mapper, render_mode, figsize=(14, 14), dpi=100):
+    """Return seconds to draw the node layer and rasterize it, plus the artist count"""
+    import matplotlib.pyplot as plt
+
+    xy = mapper.position_array()
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.set_xlim(xy[:, 0].min() - 1, xy[:, 0].max() + 1)
+    ax.set_ylim(xy[:, 1].min() - 1, xy[:, 1].max() + 1)
+    if render_mode == 'batched':
+        mapper.draw_nodes_batched(ax)
+        mapper.overlay_classifier_nodes_batched(ax)
+    else:
+        mapper.draw_nodes(ax)
+        mapper.overlay_classifier_nodes(ax)
+    fig.savefig(io.BytesIO(), format='png', dpi=dpi)
+    elapsed = time.perf_counter() - start
+    artists = len(ax.get_children())
+    plt.close(fig)
+    return elapsed, artists
+
+
+def bench_node_render(sizes=(1000, 10000, 100000), artist_limit=10000):
+    """Compare per-node artists against batched collections for the node layer"""
+    print(f"{'nodes':>8} | {'artists s':>9} {'count':>7} | {'batched s':>9} {'count':>7}")
+    for num_nodes in sizes:
+        mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=nodes_per_level_for(num_nodes),
+                                     array_core=True)
+        if num_nodes <= artist_limit:
+            artist_time, artist_count = measure_node_render(mapper, 'artists')
+            artist_col = f"{artist_time:>9.2f} {artist_count:>7}"
+        else:
+            artist_col = f"{'skipped':>9} {'':>7}"
+        batched_time, batched_count = measure_node_render(mapper, 'batched')
+        print(f"{mapper.core.num_nodes:>8} | {artist_col} | {batched_time:>9.2f} {batched_count:>7}")
+
+
+def measure_edge_render(mapper, arrow_fraction, figsize=(14, 14), dpi=100, edge_mode='lines'):
+    """Return seconds to draw the edge layer and rasterize it"""
+    import matplotlib.pyplot as plt
+
+    xy = mapper.position_array()
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=figsize)
+    ax.set_xlim(xy[:, 0].min() - 1, xy[:, 0].max() + 1)
+    ax.set_ylim(xy[:, 1].min() - 1, xy[:, 1].max() + 1)
+    if edge_mode == 'density':
+        mapper.draw_edge_density(ax, dpi=dpi)
+    else:
+        mapper.draw_edges(ax, arrow_fraction=arrow_fraction)
+    fig.savefig(io.BytesIO(), format='png', dpi=dpi)
+    elapsed = time.perf_counter() - start
+    plt.close(fig)
+    return elapsed
+
+
+def bench_edge_render(sizes=(1000, 10000, 100000)):
+    """Compare the edge LineCollection alone, lines plus arrows, and the density raster"""
+    print(f"{'nodes':>8} {'edges':>8} | {'lines s':>8} | {'+arrows s':>9} | {'density s':>9}")
+    for num_nodes in sizes:
+        mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=nodes_per_level_for(num_nodes),
+                                     array_core=True)
+        lines_time = measure_edge_render(mapper, 0.0)
+        arrows_time = measure_edge_render(mapper, 0.7)
+        density_time = measure_edge_render(mapper, 0.0, edge_mode='density')
+        print(f"{mapper.core.num_nodes:>8} {mapper.core.num_edges:>8} | {lines_time:>8.2f} | "
+              f"{arrows_time:>9.2f} | {density_time:>9.2f}")
+
+
+def bench_animation(edge_counts=(1000, 10000, 50000), frames=60, workers=None):
+    """Report setup, per-frame and total time for a GIF animation"""
+    from qkov_recursive_map import PulseFrameRenderer
+
+    print(f"{'edges':>8} | {'setup s':>8} {'frame ms':>9} | {'gif s':>7}")
+    for num_edges in edge_counts:
+        # Each source node has two targets on average
+        mapper = RecursiveQKOVMapper(depth=5, array_core=True,
+                                     nodes_per_level=nodes_per_level_for(num_edges // 2 * 5 // 4))
+        start = time.perf_counter()
+        renderer = PulseFrameRenderer(mapper, frames, render_mode='batched')
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        for frame in range(5):
+            renderer.render(frame)
+        frame_ms = (time.perf_counter() - start) / 5 * 1000
+
+        start = time.perf_counter()
+        mapper.create_animation(io.BytesIO(), frames=frames, render_mode='batched',
+                                workers=workers)
+        total = time.perf_counter() - start
+        print(f"{mapper.core.num_edges:>8} | {setup:>8.2f} {frame_ms:>9.1f} | {total:>7.1f}")
+
+
+def bench_layout(sizes=(1000, 10000, 100000), force_limit=10000, iterations=50):
+    """Time the radial layout, the force layout and a layout cache hit"""
+    from qkov_layout import LayoutCache
+
+    print(f"{'nodes':>8} | {'radial s':>8} | {'force s':>8} | {'cached ms':>9}")
+    for num_nodes in sizes:
+        mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=nodes_per_level_for(num_nodes),
+                                     array_core=True)
+        mapper.layout_cache = None
+        start = time.perf_counter()
+        mapper.position_array()
+        radial = time.perf_counter() - start
+
+        if num_nodes <= force_limit:
+            mapper.layout_cache = LayoutCache()
+            mapper.set_layout('force', iterations=iterations)
+            start = time.perf_counter()
+            mapper.position_array()
+            force_col = f"{time.perf_counter() - start:>8.2f}"
+            mapper.set_layout('force', iterations=iterations)
+            start = time.perf_counter()
+            mapper.position_array()
+            cached_col = f"{(time.perf_counter() - start) * 1000:>9.2f}"
+        else:
+            force_col, cached_col = f"{'skipped':>8}", f"{'':>9}"
+        print(f"{mapper.core.num_nodes:>8} | {radial:>8.4f} | {force_col} | {cached_col}")
+
+
+def reset_peak_rss():
+    """Reset this process's peak RSS (Linux clear_refs); return whether it worked"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    """Peak RSS of this process since start (or since reset_peak_rss)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_stage(stage, depth, nodes_per_level, frames=SUITE_FRAMES):
+    """
+    Run one suite stage in this process and return its measurements
+
+    Every stage but construction starts from a seeded array-core map with
+    its layout already computed, so it times only its own work; peak RSS is
+    reset just before the timed section where the kernel allows it.
+    """
+    mapper = None
+    if not stage.startswith('construction'):
+        mapper = RecursiveQKOVMapper(depth=depth, nodes_per_level=nodes_per_level,
+                                     array_core=True, seed=0)
+        mapper.layout_cache = None
+        if stage != 'layout':
+            mapper.position_array()
+    if stage in ('render', 'render_artists'):
+        # Import outside the timed section; the other stages import lazily as users would
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+    result = {'rss_reset': reset_peak_rss()}
+    artists = None
+    start = time.perf_counter()
+    if stage == 'construction':
+        mapper = RecursiveQKOVMapper(depth=depth, nodes_per_level=nodes_per_level,
+                                     array_core=True, seed=0)
+    elif stage == 'construction_networkx':
+        mapper = RecursiveQKOVMapper(depth=depth, nodes_per_level=nodes_per_level, seed=0)
+    elif stage == 'layout':
+        mapper.position_array()
+    elif stage in ('render', 'render_artists'):
+        fig = Figure(figsize=(14, 14), facecolor='#f9f9fe')
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        mapper.draw_map(ax, render_mode='batched' if stage == 'render' else 'artists')
+        fig.savefig(io.BytesIO(), format='png', dpi=100)
+        artists = len(ax.get_children())
+    elif stage == 'thumbnail':
+        mapper.thumbnail_png(size=256)
+    elif stage == 'animation':
+        mapper.create_animation(io.BytesIO(), frames=frames, render_mode='batched')
+    elif stage == 'html':
+        mapper.generate_html_output(render_mode='batched', frames=frames)
+    else:
+        raise ValueError(f"Unknown benchmark stage: {stage!r}")
+    result['wall_s'] = time.perf_counter() - start
+    result['peak_rss_mb'] = peak_rss_bytes() / 2 ** 20
+
+    arrays = mapper.map_arrays()
+    result.update(nodes=int(arrays.num_nodes), edges=int(arrays.num_edges), artists=artists)
+    return result
+
+
+def measure_stage(stage, depth, nodes_per_level, timeout=1800, frames=SUITE_FRAMES):
+    """Run one stage in a fresh headless interpreter and return its measurements"""
+    env = dict(os.environ, MPLBACKEND='Agg')
+    command = [sys.executable, os.path.abspath(__file__), '--stage', stage,
+               '--depth', str(depth), '--nodes-per-level', str(nodes_per_level),
+               '--frames', str(frames)]
+    try:
+        completed = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': f"timed out after {timeout} s"}
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        return {'error': lines[-1] if lines else f"exit code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def suite_metadata():
+    """Describe the machine and code a suite ran on"""
+    from importlib import metadata
+
+    versions = {}
+    for package in ('numpy', 'matplotlib', 'networkx', 'pillow'):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def run_suite(grid=SUITE_GRID, stages=SUITE_STAGES, repeats=1, limits=None, timeout=1800,
+              frames=SUITE_FRAMES, output=None):
+    """
+    Run every stage over the (depth, nodes_per_level) grid and return the results
+
+    Each measurement runs in its own interpreter, so peak RSS and import
+    costs are per stage; with repeats > 1 the fastest run is kept (all wall
+    times are recorded). Stages are skipped on maps larger than their limit
+    (SUITE_LIMITS by default). Results are printed as they arrive and, with
+    output, written as JSON.
+    """
+    limits = SUITE_LIMITS if limits is None else limits
+    results = []
+    print(f"{'stage':<22} {'depth':>5} {'npl':>6} {'nodes':>8} | {'wall s':>8} "
+          f"{'peak MB':>8} {'artists':>8}")
+    for stage in stages:
+        for depth, nodes_per_level in grid:
+            entry = {'stage': stage, 'depth': depth, 'nodes_per_level': nodes_per_level}
+            approx_nodes = sum(max(3, nodes_per_level - level) for level in range(depth))
+            if approx_nodes > limits.get(stage, float('inf')):
+                entry['skipped'] = f"over the {limits[stage]}-node limit"
+            else:
+                runs = [measure_stage(stage, depth, nodes_per_level, timeout, frames)
+                        for _ in range(repeats)]
+                good = [run for run in runs if 'error' not in run]
+                if good:
+                    entry.update(min(good, key=lambda run: run['wall_s']))
+                    entry['wall_s_runs'] = [run['wall_s'] for run in good]
+                else:
+                    entry['error'] = runs[-1]['error']
+            results.append(entry)
+
+            if 'wall_s' in entry:
+                artists = entry['artists'] if entry['artists'] is not None else '-'
+                print(f"{stage:<22} {depth:>5} {nodes_per_level:>6} {entry['nodes']:>8} | "
+                      f"{entry['wall_s']:>8.3f} {entry['peak_rss_mb']:>8.1f} {artists:>8}")
+            else:
+                print(f"{stage:<22} {depth:>5} {nodes_per_level:>6} {'':>8} | "
+                      f"{entry.get('skipped') or entry.get('error')}")
+
+    suite = {'metadata': suite_metadata(), 'results': results}
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(suite, f, indent=2)
+    return suite
+
+
+def compare_results(suite, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Return the regressions of suite against a baseline suite: measurements
+    whose wall time or peak RSS grew by more than tolerance (wall times under
+    min_seconds in both are treated as noise), and measurements that the
+    baseline has but that now fail or time out (metric 'error')
+    """
+    def key(entry):
+        return entry['stage'], entry['depth'], entry['nodes_per_level']
+
+    before = {key(entry): entry for entry in baseline['results'] if 'wall_s' in entry}
+    regressions = []
+    for entry in suite['results']:
+        old = before.get(key(entry))
+        if old is None:
+            continue
+        if 'error' in entry:
+            regressions.append({'stage': entry['stage'], 'depth': entry['depth'],
+                                'nodes_per_level': entry['nodes_per_level'],
+                                'metric': 'error', 'baseline': old['wall_s'],
+                                'current': None, 'error': entry['error']})
+            continue
+        if 'wall_s' not in entry:
+            continue
+        for metric in ('wall_s', 'peak_rss_mb'):
+            if metric == 'wall_s' and max(entry[metric], old[metric]) < min_seconds:
+                continue
+            ratio = entry[metric] / max(old[metric], 1e-12)
+            if ratio > 1 + tolerance:
+                regressions.append({'stage': entry['stage'], 'depth': entry['depth'],
+                                    'nodes_per_level': entry['nodes_per_level'],
+                                    'metric': metric, 'baseline': old[metric],
+                                    'current': entry[metric], 'ratio': ratio})
+    return regressions
+
+
+def parse_grid(text):
+    """Parse 'DEPTHxNPL,...' (e.g. 5x8,5x2000) into a grid"""
+    return tuple(tuple(int(value) for value in point.split('x')) for point in text.split(','))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--suite', action='store_true',
+                        help="run the stage x size suite instead of the micro-benchmark tables")
+    parser.add_argument('--grid', type=parse_grid, default=SUITE_GRID,
+                        help="comma-separated DEPTHxNODES_PER_LEVEL points, e.g. 5x8,5x2000")
+    parser.add_argument('--stages', default=','.join(SUITE_STAGES),
+                        help="comma-separated suite stages")
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=1800, help="seconds per measurement")
+    parser.add_argument('--frames', type=int, default=SUITE_FRAMES)
+    parser.add_argument('--output', help="write suite results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a stored suite JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative growth before a result counts as a regression")
+    # Internal: run a single stage and print its measurements as JSON
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--depth', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--nodes-per-level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.stage is not None:
+        print(json.dumps(run_stage(args.stage, args.depth, args.nodes_per_level, args.frames)))
+        return 0
+
+    if not args.suite:
+        check_import_time()
+        bench_construction()
+        bench_layout()
+        bench_node_render()
+        bench_edge_render()
+        bench_animation()
+        return 0
+
+    suite = run_suite(args.grid, tuple(args.stages.split(',')), args.repeats,
+                      timeout=args.timeout, frames=args.frames, output=args.output)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_results(suite, baseline, args.tolerance)
+    for item in regressions:
+        if item['metric'] == 'error':
+            print(f"REGRESSION {item['stage']} {item['depth']}x{item['nodes_per_level']} "
+                  f"failed (baseline {item['baseline']:.3f} s): {item['error']}")
+            continue
+        print(f"REGRESSION {item['stage']} {item['depth']}x{item['nodes_per_level']} "
+              f"{item['metric']}: {item['baseline']:.3f} -> {item['current']:.3f} "
+              f"({item['ratio']:.2f}x)")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Helpers for work shared between processes: bounded pool submission and atomic files."""
+import contextlib
+import itertools
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# Tasks kept submitted per pool worker: one running and one queued behind it
+IN_FLIGHT_PER_WORKER = 2
+
+
+def bounded_map(pool, fn, tasks, workers, ordered=True):
+    """
+    Yield fn(*task) for each task, computed in pool with at most
+    IN_FLIGHT_PER_WORKER tasks per worker submitted at once, so results
+    (and the tasks behind them) never pile up in memory
+
+    Results come in task order, or as they finish when ordered is False.
+    Tasks are drawn from the iterable only as slots free up.
+    """
+    tasks = iter(tasks)
+    limit = IN_FLIGHT_PER_WORKER * max(1, workers)
+    pending = deque()
+    while True:
+        for task in itertools.islice(tasks, limit - len(pending)):
+            pending.append(pool.submit(fn, *task))
+        if not pending:
+            return
+        if ordered:
+            yield pending.popleft().result()
+            continue
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        pending = deque(future for future in pending if future not in done)
+        for future in done:
+            yield future.result()
+
+
+@contextlib.contextmanager
+def atomic_file(path, mode='wb'):
+    """
+    Open a temporary file next to path that replaces path when the block
+    exits cleanly (and is removed otherwise), so readers never see a
+    partial file; the result is readable by every user, like a cache entry
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.fspath(path)) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def write_atomic(path, data):
+    """Write bytes (or text) to path through atomic_file"""
+    with atomic_file(path, 'w' if isinstance(data, str) else 'wb') as f:
+        f.write(data)
@@ -0,0 +1,218 @@
+"""Render-free aggregate statistics over many drift maps."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qkov_concurrency import bounded_map
+from qkov_recursive_map import GLYPH_KEYS, RecursiveQKOVMapper
+
+
+def combine_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Merge (count, mean, sum of squared deviations) of two samples (Chan et al.)"""
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        mean = np.where(n > 0, mean_a + delta * n_b / n, 0.0)
+        m2 = np.where(n > 0, m2_a + m2_b + delta ** 2 * n_a * n_b / n, 0.0)
+    return n, mean, m2
+
+
+class DriftEnsemble:
+    """
+    Online accumulator of drift map statistics.
+
+    Maps are folded in one at a time or as a stacked batch and only running
+    aggregates are kept, so memory does not grow with the number of maps.
+    Two ensembles built from disjoint maps (e.g. in different processes)
+    can be combined with merge. Tracked per map set:
+
+    - node drift mean/std per level
+    - classifier lock rate, overall and per level
+    - glyph frequencies
+    - Pearson correlation between loopback_density and attribution entropy
+    - a fixed-bin histogram of edge drift on [0, 1]
+    """
+
+    def __init__(self, bins=20):
+        self.bins = bins
+        self.num_maps = 0
+        self.num_nodes = 0
+        self.num_edges = 0
+
+        # Per-level drift moments and classifier counts (grown to the deepest map seen)
+        self.level_count = np.zeros(0, dtype=np.int64)
+        self.level_drift_mean = np.zeros(0)
+        self.level_drift_m2 = np.zeros(0)
+        self.level_classifiers = np.zeros(0, dtype=np.int64)
+
+        self.glyph_counts = np.zeros(len(GLYPH_KEYS), dtype=np.int64)
+        self.edge_drift_counts = np.zeros(bins, dtype=np.int64)
+
+        # Moments and co-moment of (loopback_density, entropy)
+        self.num_pairs = 0
+        self.loopback_mean = 0.0
+        self.loopback_m2 = 0.0
+        self.entropy_mean = 0.0
+        self.entropy_m2 = 0.0
+        self.comoment = 0.0
+
+    def add(self, arrays):
+        """Fold one DriftMapArrays (or mapper) into the ensemble"""
+        return self.add_many([arrays])
+
+    def add_many(self, maps):
+        """Fold a batch of DriftMapArrays (or mappers) in with one set of reductions"""
+        cores = [m.map_arrays() if hasattr(m, 'map_arrays') else m for m in maps]
+        if not cores:
+            return self
+
+        # Stack the batch into flat node and edge arrays
+        level = np.concatenate([core.level for core in cores])
+        drift = np.concatenate([core.drift for core in cores])
+        is_classifier = np.concatenate([core.is_classifier for core in cores])
+        glyph_code = np.concatenate([core.glyph_code for core in cores])
+        loopback = np.concatenate([core.loopback_density for core in cores])
+        entropy = np.concatenate([core.entropy for core in cores])
+        edge_drift = np.concatenate([core.edge_drift for core in cores])
+
+        self.num_maps += len(cores)
+        self.num_nodes += len(level)
+        self.num_edges += len(edge_drift)
+
+        # Per-level drift moments of the batch
+        depth = max(int(level.max()) + 1 if len(level) else 0, len(self.level_count))
+        count = np.bincount(level, minlength=depth)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, np.bincount(level, drift, depth) / count, 0.0)
+        m2 = np.bincount(level, (drift - mean[level]) ** 2, depth)
+        self.fold_levels(count, mean, m2, np.bincount(level, is_classifier, depth).astype(np.int64))
+
+        self.glyph_counts += np.bincount(glyph_code, minlength=len(GLYPH_KEYS))[:len(GLYPH_KEYS)]
+        self.edge_drift_counts += self.histogram(edge_drift)
+
+        # Loopback/entropy moments of the batch
+        n = len(loopback)
+        if n:
+            loopback_mean, entropy_mean = loopback.mean(), entropy.mean()
+            self.fold_pair(n, loopback_mean, ((loopback - loopback_mean) ** 2).sum(),
+                           entropy_mean, ((entropy - entropy_mean) ** 2).sum(),
+                           ((loopback - loopback_mean) * (entropy - entropy_mean)).sum())
+        return self
+
+    def histogram(self, edge_drift):
+        """Counts of edge drift values in the ensemble's bins"""
+        index = np.minimum((np.asarray(edge_drift) * self.bins).astype(np.int64), self.bins - 1)
+        return np.bincount(index, minlength=self.bins)
+
+    def fold_levels(self, count, mean, m2, classifiers):
+        """Merge per-level drift moments and classifier counts into the running totals"""
+        depth = max(len(count), len(self.level_count))
+
+        def pad(values):
+            return np.pad(values, (0, depth - len(values)))
+
+        self.level_count, self.level_drift_mean, self.level_drift_m2 = combine_moments(
+            pad(self.level_count), pad(self.level_drift_mean), pad(self.level_drift_m2),
+            pad(count), pad(mean), pad(m2))
+        self.level_classifiers = pad(self.level_classifiers) + pad(classifiers)
+
+    def fold_pair(self, n, loopback_mean, loopback_m2, entropy_mean, entropy_m2, comoment):
+        """Merge loopback/entropy moments of n nodes into the running totals"""
+        n_a = self.num_pairs
+        total = n_a + n
+        delta_loopback = loopback_mean - self.loopback_mean
+        delta_entropy = entropy_mean - self.entropy_mean
+        self.comoment += comoment + delta_loopback * delta_entropy * n_a * n / total
+        _, self.loopback_mean, self.loopback_m2 = combine_moments(
+            n_a, self.loopback_mean, self.loopback_m2, n, loopback_mean, loopback_m2)
+        _, self.entropy_mean, self.entropy_m2 = combine_moments(
+            n_a, self.entropy_mean, self.entropy_m2, n, entropy_mean, entropy_m2)
+        self.num_pairs = total
+
+    def merge(self, other):
+        """Fold another ensemble (built from disjoint maps) into this one"""
+        if other.bins != self.bins:
+            raise ValueError(f"Cannot merge ensembles with {self.bins} and {other.bins} bins")
+        self.num_maps += other.num_maps
+        self.num_nodes += other.num_nodes
+        self.num_edges += other.num_edges
+        self.fold_levels(other.level_count, other.level_drift_mean, other.level_drift_m2,
+                         other.level_classifiers)
+        self.glyph_counts += other.glyph_counts
+        self.edge_drift_counts += other.edge_drift_counts
+        if other.num_pairs:
+            self.fold_pair(other.num_pairs, other.loopback_mean, other.loopback_m2,
+                           other.entropy_mean, other.entropy_m2, other.comoment)
+        return self
+
+    def summary(self):
+        """Return the aggregates as plain Python values"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            level_std = np.sqrt(self.level_drift_m2 / self.level_count)
+            level_lock_rate = self.level_classifiers / self.level_count
+            correlation = self.comoment / np.sqrt(self.loopback_m2 * self.entropy_m2)
+        glyph_total = max(int(self.glyph_counts.sum()), 1)
+        return {
+            'num_maps': self.num_maps,
+            'num_nodes': self.num_nodes,
+            'num_edges': self.num_edges,
+            'drift_mean_by_level': self.level_drift_mean.tolist(),
+            'drift_std_by_level': level_std.tolist(),
+            'classifier_lock_rate': int(self.level_classifiers.sum()) / max(self.num_nodes, 1),
+            'classifier_lock_rate_by_level': level_lock_rate.tolist(),
+            'glyph_frequency': {key: int(count) / glyph_total
+                                for key, count in zip(GLYPH_KEYS, self.glyph_counts)},
+            'loopback_entropy_correlation': float(correlation),
+            'edge_drift_histogram': {
+                'bin_edges': np.linspace(0, 1, self.bins + 1).tolist(),
+                'counts': self.edge_drift_counts.tolist(),
+            },
+        }
+
+
+def child_seeds(root, start, stop):
+    """Seeds start..stop-1 of root.spawn(), without spawning the whole range"""
+    return [np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (i,),
+                                   pool_size=root.pool_size)
+            for i in range(start, stop)]
+
+
+def _ensemble_chunk(root, start, stop, bins, batch_maps, params):
+    """Build maps start..stop-1 in a worker process and return their partial ensemble"""
+    ensemble = DriftEnsemble(bins)
+    for batch_start in range(start, stop, batch_maps):
+        seeds = child_seeds(root, batch_start, min(batch_start + batch_maps, stop))
+        ensemble.add_many([RecursiveQKOVMapper(seed=seed, array_core=True, **params).core
+                           for seed in seeds])
+    return ensemble
+
+
+def ensemble_statistics(count, seed=None, workers=None, chunk_maps=None, batch_maps=256,
+                        bins=20, **params):
+    """
+    Generate count array-core maps and accumulate their DriftEnsemble
+
+    Map i uses the same seed as map i of RecursiveQKOVMapper.generate_batch.
+    Workers build chunk_maps maps per task, reduce them batch_maps at a time
+    and return only the partial ensemble, with a bounded number of tasks in
+    flight, so memory stays flat however many maps are generated. No node
+    layout or rendering is done.
+    """
+    root = np.random.SeedSequence(seed)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return _ensemble_chunk(root, 0, count, bins, batch_maps, params)
+
+    if chunk_maps is None:
+        chunk_maps = max(1, min(16 * batch_maps, -(-count // (4 * workers))))
+    chunks = [(start, min(start + chunk_maps, count)) for start in range(0, count, chunk_maps)]
+
+    ensemble = DriftEnsemble(bins)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in bounded_map(pool, _ensemble_chunk,
+                                  ((root, start, stop, bins, batch_maps, params)
+                                   for start, stop in chunks), workers):
+            ensemble.merge(result)
+    return ensemble
@@ -0,0 +1,291 @@
+"""Streaming ingestion of per-layer QK/OV attribution tensors into drift maps."""
+import os
+import re
+import struct
+import zipfile
+
+import numpy as np
+
+from qkov_recursive_map import DriftMapArrays
+
+# Default size of one row block of attribution mass; peak memory stays near a few blocks
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+class AttributionTensor:
+    """
+    One per-layer attribution tensor of shape (rows, cols) or (heads, rows,
+    cols), read in row blocks without loading the whole tensor.
+
+    A source is a path to an .npy file, a (path, key) pair naming a member of
+    an .npz archive, or an array already in memory. .npy files and members of
+    uncompressed archives (np.savez) are memory-mapped. Members of compressed
+    archives (np.savez_compressed) are decompressed in one sequential pass,
+    so they must be C-ordered, and one with a head axis must fit in a single
+    row block (its heads follow each other in the stream).
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.array = None
+        self.member = None
+
+        if isinstance(source, np.ndarray):
+            self.array = source
+        elif isinstance(source, (str, os.PathLike)):
+            self.array = np.load(source, mmap_mode='r')
+        else:
+            path, key = source
+            self.open_member(os.fspath(path), key if key.endswith('.npy') else key + '.npy')
+
+        if self.array is not None:
+            self.shape, self.dtype = self.array.shape, self.array.dtype
+        if len(self.shape) not in (2, 3):
+            raise ValueError(f"Attribution tensors must be 2-D or 3-D, got shape {self.shape}")
+
+    def open_member(self, path, name):
+        """Memory-map a stored .npz member, or record how to stream a compressed one"""
+        with zipfile.ZipFile(path) as archive:
+            info = archive.getinfo(name)
+            with archive.open(info) as member:
+                shape, fortran, dtype = read_npy_header(member, f"{path}:{name}")
+                data_offset = member.tell()
+        self.shape, self.dtype = shape, dtype
+
+        if info.compress_type == zipfile.ZIP_STORED:
+            # The member's bytes sit uncompressed in the archive after its local header
+            with open(path, 'rb') as f:
+                f.seek(info.header_offset + 26)
+                name_length, extra_length = struct.unpack('<HH', f.read(4))
+            offset = info.header_offset + 30 + name_length + extra_length + data_offset
+            self.array = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape,
+                                   order='F' if fortran else 'C')
+        elif fortran:
+            raise ValueError(f"Cannot stream Fortran-ordered compressed member {path}:{name}")
+        else:
+            self.member = (path, info, data_offset)
+
+    @property
+    def heads(self):
+        return self.shape[0] if len(self.shape) == 3 else 1
+
+    @property
+    def rows(self):
+        return self.shape[-2]
+
+    @property
+    def cols(self):
+        return self.shape[-1]
+
+    def block_rows(self, block_bytes=BLOCK_BYTES):
+        """Rows per block so one float64 block of mass fits in block_bytes"""
+        return max(1, block_bytes // (8 * max(self.cols, 1)))
+
+    def mass_blocks(self, block_bytes=BLOCK_BYTES):
+        """Yield (start row, |attribution| summed over heads) for consecutive row blocks"""
+        step = self.block_rows(block_bytes)
+        if self.member is not None:
+            yield from self.stream_mass_blocks(step)
+            return
+
+        for start in range(0, self.rows, step):
+            stop = min(start + step, self.rows)
+            if self.array.ndim == 2:
+                yield start, np.abs(self.array[start:stop], dtype=np.float64)
+                continue
+            mass = np.zeros((stop - start, self.cols))
+            for head in range(self.heads):
+                mass += np.abs(self.array[head, start:stop])
+            yield start, mass
+
+    def stream_mass_blocks(self, step):
+        """mass_blocks for a compressed member, decompressing it once from start to end"""
+        path, info, data_offset = self.member
+        if self.heads > 1 and step < self.rows:
+            raise ValueError(
+                f"{path}:{info.filename} is a compressed {self.heads}-head tensor larger than "
+                f"one row block; save it with np.savez or as .npy files so it can be "
+                f"memory-mapped, or raise block_bytes")
+        row_bytes = self.cols * self.dtype.itemsize
+        with zipfile.ZipFile(path) as archive, archive.open(info) as stream:
+            stream.seek(data_offset)
+            for start in range(0, self.rows, step):
+                stop = min(start + step, self.rows)
+                mass = np.zeros((stop - start, self.cols))
+                # With several heads this is the only block, so heads follow in the stream
+                for _ in range(self.heads):
+                    data = stream.read((stop - start) * row_bytes)
+                    mass += np.abs(np.frombuffer(data, dtype=self.dtype)
+                                   .reshape(stop - start, self.cols))
+                yield start, mass
+
+
+def read_npy_header(stream, name):
+    """Read an .npy header from stream: (shape, fortran order, dtype)"""
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(stream)
+    if version == (2, 0):
+        return np.lib.format.read_array_header_2_0(stream)
+    raise ValueError(f"Unsupported .npy format version {version} in {name}")
+
+
+def row_shares(mass):
+    """Normalize each row of attribution mass to shares summing to 1 (zero rows stay 0)"""
+    total = mass.sum(axis=1)
+    return mass / np.where(total > 0, total, 1)[:, None], total
+
+
+def row_entropy(shares):
+    """Shannon entropy of each row of shares, normalized to [0, 1] by log(cols)"""
+    log_shares = np.log(shares, out=np.zeros_like(shares), where=shares > 0)
+    entropy = -(shares * log_shares).sum(axis=1)
+    return entropy / np.log(shares.shape[1]) if shares.shape[1] > 1 else np.zeros(len(shares))
+
+
+def sparsify_rows(shares, top_k=None, min_weight=None, max_drift=None, src_drift=None,
+                  dst_drift=None):
+    """
+    Select edges from a block of dense row shares
+
+    An entry is a candidate if its share is nonzero and at least min_weight,
+    and its edge drift (the mean of src_drift[row] and dst_drift[col]) is at
+    most max_drift or it is the row's strongest entry (as drift_pruned keeps
+    each source's strongest edge); each row then keeps its top_k strongest
+    candidates (all of them if top_k is None). Selection is argpartition per
+    row, O(cols). Returns (row, col, share) of the kept entries in row-major
+    order.
+    """
+    keep = shares > 0
+    if min_weight is not None:
+        keep &= shares >= min_weight
+    if max_drift is not None:
+        strongest = np.zeros_like(keep)
+        strongest[np.arange(len(shares)), shares.argmax(axis=1)] = True
+        keep &= (dst_drift[None, :] <= 2 * max_drift - src_drift[:, None]) | strongest
+
+    if top_k is None or top_k >= shares.shape[1]:
+        rows, cols = np.nonzero(keep)
+        return rows, cols, shares[rows, cols]
+
+    # Rank candidates only; the rest sort below every share
+    score = np.where(keep, shares, -1.0)
+    picks = np.argpartition(score, -top_k, axis=1)[:, -top_k:]
+    picks.sort(axis=1)
+    rows = np.repeat(np.arange(len(shares)), top_k)
+    cols = picks.ravel()
+    kept = keep[rows, cols]
+    rows, cols = rows[kept], cols[kept]
+    return rows, cols, shares[rows, cols]
+
+
+def attribution_sources(path, qk_key='qk_{layer}', ov_key='ov_{layer}'):
+    """
+    Find per-layer QK and OV sources in a directory of .npy files or an .npz
+    archive, named by qk_key/ov_key with {layer} the layer index
+    """
+    path = os.fspath(path)
+    if os.path.isdir(path):
+        names = [name[:-4] for name in os.listdir(path) if name.endswith('.npy')]
+
+        def source(name):
+            return os.path.join(path, name + '.npy')
+    else:
+        with zipfile.ZipFile(path) as archive:
+            names = [name[:-4] for name in archive.namelist() if name.endswith('.npy')]
+
+        def source(name):
+            return (path, name)
+
+    def find(key):
+        pattern = re.compile(re.escape(key).replace(re.escape('{layer}'), r'(\d+)') + '$')
+        layers = {int(match.group(1)): name for name in names
+                  for match in [pattern.match(name)] if match}
+        if sorted(layers) != list(range(len(layers))):
+            raise ValueError(f"{key} layers in {path} are not numbered 0..N-1: {sorted(layers)}")
+        return [source(layers[layer]) for layer in range(len(layers))]
+
+    return find(qk_key), find(ov_key)
+
+
+def ingest_attributions(qk, ov, top_k=3, min_weight=None, max_drift=None,
+                        block_bytes=BLOCK_BYTES):
+    """
+    Stream per-layer QK and OV attribution tensors into a DriftMapArrays core
+
+    qk[L] is layer L's query/key attribution (N_L x N_L) and ov[L] its
+    output/value attribution onto layer L+1 (N_L x N_L+1); either may have a
+    leading head axis, which is summed in absolute value. Tensors are read
+    one row block at a time (see AttributionTensor), so peak memory stays at a
+    few times block_bytes plus the per-node and per-edge outputs. Per node:
+
+    - entropy: normalized Shannon entropy of its QK attribution row
+    - loopback_density: share of its QK attribution on itself
+    - classifier_inertia: share of its OV attribution on its strongest target
+      (from the QK row for a last layer without an OV tensor)
+
+    The OV tensors are then sparsified block by block with sparsify_rows:
+    each node keeps edges to its top_k strongest targets in the next layer
+    with a share of at least min_weight and an edge drift (from the entropy
+    of both ends, as in DriftMapArrays.compute_drift) of at most max_drift,
+    plus its strongest target whatever its drift.
+    Edges are weighted by their share of the row. Glyph codes are left
+    unassigned (-1) for the mapper to fill in, and edge noise is zero.
+    """
+    qk = [source if isinstance(source, AttributionTensor) else AttributionTensor(source)
+          for source in qk]
+    ov = [source if isinstance(source, AttributionTensor) else AttributionTensor(source)
+          for source in ov]
+    if len(ov) < len(qk) - 1:
+        raise ValueError(f"{len(qk)} QK layers need at least {len(qk) - 1} OV tensors, got {len(ov)}")
+
+    level_sizes = [tensor.rows for tensor in qk]
+    level_offsets = np.concatenate([[0], np.cumsum(level_sizes)]).astype(np.int64)
+    for level, tensor in enumerate(qk):
+        if tensor.cols != tensor.rows:
+            raise ValueError(f"QK layer {level} is not square: {tensor.shape}")
+    for level, tensor in enumerate(ov[:len(qk)]):
+        cols = level_sizes[level + 1] if level + 1 < len(qk) else tensor.cols
+        if tensor.rows != level_sizes[level] or tensor.cols != cols:
+            raise ValueError(f"OV layer {level} has shape {tensor.shape}, "
+                             f"expected ({level_sizes[level]}, {cols})")
+
+    num_nodes = int(level_offsets[-1])
+    entropy = np.zeros(num_nodes)
+    loopback_density = np.zeros(num_nodes)
+    classifier_inertia = np.zeros(num_nodes)
+    out_degree = np.zeros(num_nodes, dtype=np.int64)
+    targets, weights = [], []
+
+    # Node metrics from QK first, so edge drift is known when sparsifying OV
+    for level, tensor in enumerate(qk):
+        offset = level_offsets[level]
+        for start, mass in tensor.mass_blocks(block_bytes):
+            nodes = offset + start + np.arange(len(mass))
+            shares, _ = row_shares(mass)
+            entropy[nodes] = row_entropy(shares)
+            loopback_density[nodes] = shares[np.arange(len(mass)), start + np.arange(len(mass))]
+            classifier_inertia[nodes] = shares.max(axis=1)
+    drift = DriftMapArrays.node_drift(entropy, np.repeat(np.arange(len(qk)), level_sizes), len(qk))
+
+    for level, tensor in enumerate(ov[:len(qk)]):
+        offset = level_offsets[level]
+        for start, mass in tensor.mass_blocks(block_bytes):
+            nodes = offset + start + np.arange(len(mass))
+            shares, _ = row_shares(mass)
+            classifier_inertia[nodes] = shares.max(axis=1)
+            if level + 1 < len(qk):
+                rows, cols, picked = sparsify_rows(
+                    shares, top_k, min_weight, max_drift, drift[nodes],
+                    drift[level_offsets[level + 1]:level_offsets[level + 2]])
+                out_degree[nodes] = np.bincount(rows, minlength=len(mass))
+                targets.append(cols + level_offsets[level + 1])
+                weights.append(picked)
+
+    indptr = np.concatenate([[0], np.cumsum(out_degree)])
+    indices = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+    edge_weight = np.concatenate(weights) if weights else np.zeros(0)
+    core = DriftMapArrays(level_offsets, entropy, loopback_density, classifier_inertia,
+                          np.full(num_nodes, -1, dtype=np.int8), indptr, indices, edge_weight)
+    core.edge_noise = np.zeros(core.num_edges)
+    return core
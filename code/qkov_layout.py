@@ -0,0 +1,223 @@
+"""Force-directed layout and a layout cache for drift maps."""
+import collections
+import contextlib
+import os
+import threading
+
+import numpy as np
+
+from qkov_concurrency import atomic_file
+
+
+def near_pairs(cell, cells_per_side):
+    """
+    (i, j) pairs of distinct points whose grid cells are equal or adjacent,
+    given each point's (cx, cy) cell
+    """
+    cell_id = cell[:, 0] * cells_per_side + cell[:, 1]
+    order = np.argsort(cell_id, kind='stable')
+    counts = np.bincount(cell_id, minlength=cells_per_side ** 2)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    pairs_i, pairs_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            nx, ny = cell[:, 0] + dx, cell[:, 1] + dy
+            valid = (nx >= 0) & (nx < cells_per_side) & (ny >= 0) & (ny < cells_per_side)
+            points = np.flatnonzero(valid)
+            neighbour = nx[points] * cells_per_side + ny[points]
+            size = counts[neighbour]
+
+            # Every point paired with every member of its neighbouring cell
+            i = np.repeat(points, size)
+            first = np.repeat(starts[neighbour] - np.cumsum(size) + size, size)
+            j = order[first + np.arange(len(i))]
+            distinct = i != j
+            pairs_i.append(i[distinct])
+            pairs_j.append(j[distinct])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def repulsion(xy, k, leaf_size=4, max_levels=10):
+    """
+    Fruchterman-Reingold repulsion (k^2 / d) on every point, Barnes-Hut style
+
+    Points are binned into a quadtree of uniform grids. Each point feels the
+    points in its own and adjacent leaf cells exactly, and at every coarser
+    level the centre of mass of the cells that are not adjacent to its own
+    but whose parents are adjacent to its parent (at most 27 per level), so
+    every other point is counted exactly once at O(N log N) cost.
+    """
+    n = len(xy)
+    force = np.zeros_like(xy)
+    if n < 2:
+        return force
+
+    low = xy.min(axis=0)
+    size = max(float((xy.max(axis=0) - low).max()), 1e-9) * (1 + 1e-9)
+    levels = int(np.clip(np.ceil(np.log(max(n / leaf_size, 1)) / np.log(4)), 1, max_levels))
+    leaf = np.minimum(((xy - low) / size * 2 ** levels).astype(np.int64), 2 ** levels - 1)
+
+    def pull(delta, mass):
+        # mass * k^2 * delta / |delta|^2
+        dist2 = np.maximum(np.einsum('ij,ij->i', delta, delta), 1e-12)
+        return delta * (mass * k * k / dist2)[:, None]
+
+    # Near field: exact pairs in the 3x3 leaf neighbourhood
+    i, j = near_pairs(leaf, 2 ** levels)
+    near = pull(xy[i] - xy[j], 1.0)
+    force[:, 0] += np.bincount(i, near[:, 0], n)
+    force[:, 1] += np.bincount(i, near[:, 1], n)
+
+    # Far field, finest level first: cells in the interaction list, via their centres of mass
+    points = np.arange(n)
+    for level in range(levels, 1, -1):
+        side = 2 ** level
+        cell = leaf >> (levels - level)
+        cell_id = cell[:, 0] * side + cell[:, 1]
+        mass = np.bincount(cell_id, minlength=side * side).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center = np.stack([np.bincount(cell_id, xy[:, 0], side * side),
+                               np.bincount(cell_id, xy[:, 1], side * side)], axis=1) / mass[:, None]
+
+        parent = cell >> 1
+        for a in range(6):
+            for b in range(6):
+                cx, cy = 2 * parent[:, 0] - 2 + a, 2 * parent[:, 1] - 2 + b
+                far = (np.abs(cx - cell[:, 0]) > 1) | (np.abs(cy - cell[:, 1]) > 1)
+                inside = (cx >= 0) & (cx < side) & (cy >= 0) & (cy < side) & far
+                target = cx[inside] * side + cy[inside]
+                occupied = mass[target] > 0
+                i = points[inside][occupied]
+                target = target[occupied]
+                # Each point meets a given (a, b) cell once, so plain indexing accumulates
+                force[i] += pull(xy[i] - center[target], mass[target])
+    return force
+
+
+def force_layout(xy, src, dst, weight=None, iterations=50, gravity=1.0, leaf_size=4):
+    """
+    Refine an (N, 2) layout with Fruchterman-Reingold forces
+
+    Repulsion between all points uses the O(N log N) grid quadtree in
+    repulsion; attraction (d^2 / k, scaled by weight) acts along the edges
+    src -> dst in both directions, and gravity towards the centre keeps
+    unconnected points near the starting extent (at about extent /
+    sqrt(gravity)). Moves are capped by a linearly cooling temperature. The
+    result is rescaled to the extent of the starting layout, so labels and
+    marker offsets drawn in data units keep their proportions.
+    """
+    xy = np.array(xy, dtype=np.float64)
+    n = len(xy)
+    if n < 2:
+        return xy
+    center = xy.mean(axis=0)
+    extent = max(float(np.abs(xy - center).max()), 1e-9)
+    k = 2 * extent / np.sqrt(n)
+    weight = np.ones(len(src)) if weight is None else np.asarray(weight, dtype=np.float64)
+
+    for step in range(iterations):
+        force = repulsion(xy, k, leaf_size)
+
+        # Springs along edges
+        delta = xy[dst] - xy[src]
+        pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k * weight)[:, None]
+        for axis in (0, 1):
+            force[:, axis] += (np.bincount(src, pull[:, axis], n) -
+                               np.bincount(dst, pull[:, axis], n))
+
+        # Gravity towards the starting centre, balancing the repulsion of n points
+        force += gravity * n * k * k / extent ** 2 * (center - xy)
+
+        # Move at most the current temperature
+        temperature = 0.1 * extent * (1 - step / iterations)
+        length = np.maximum(np.sqrt((force ** 2).sum(axis=1)), 1e-12)
+        xy += force * (np.minimum(length, temperature) / length)[:, None]
+
+    xy -= xy.mean(axis=0)
+    return center + xy * (extent / max(float(np.abs(xy).max()), 1e-9))
+
+
+class LayoutCache:
+    """
+    Node layouts keyed by a hash of the graph and layout options
+
+    The max_entries most recently used layouts are kept in memory; with a
+    directory, every layout is also stored there as an .npy file (written
+    atomically), so other processes and later runs reuse it. Returned arrays
+    are read-only, since they are shared by every map with the same key.
+    The cache is safe to share between threads.
+    """
+
+    def __init__(self, directory=None, max_entries=32):
+        self.directory = os.path.abspath(directory) if directory is not None else None
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def get(self, key):
+        """Return the cached layout for key or None"""
+        with self.lock:
+            xy = self.entries.get(key)
+            if xy is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return xy
+
+        # Read from disk without holding the lock
+        if self.directory is not None:
+            with contextlib.suppress(FileNotFoundError):
+                xy = np.load(self.path(key))
+                xy.flags.writeable = False
+        with self.lock:
+            if xy is None:
+                self.misses += 1
+                return None
+            self._remember(key, xy)
+            self.hits += 1
+        return xy
+
+    def put(self, key, xy):
+        """Store a layout under key and return the shared read-only copy"""
+        xy = np.array(xy, dtype=np.float64)
+        xy.flags.writeable = False
+        with self.lock:
+            self._remember(key, xy)
+        if self.directory is not None:
+            with atomic_file(self.path(key)) as f:
+                np.save(f, xy)
+        return xy
+
+    def _remember(self, key, xy):
+        # Callers hold self.lock
+        self.entries[key] = xy
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every layout in memory (files in directory are kept)"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def __getstate__(self):
+        # Locks do not pickle; copies (e.g. in workers) get their own
+        state = dict(self.__dict__)
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+# Layout cache shared by every mapper in the process unless one is given its own
+LAYOUT_CACHE = LayoutCache()
@@ -0,0 +1,162 @@
+"""Opt-in per-stage timing and allocation spans for drift map pipelines."""
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class StageProfiler:
+    """
+    Records nested timing spans with allocation counts
+
+    Attach one to a mapper (RecursiveQKOVMapper(profiler=...) or
+    mapper.profiler = ...) and every instrumented stage records a span: its
+    wall time, the time spent in it outside nested spans (self time), the
+    net change in allocated memory blocks and, with memory=True, the net
+    change in bytes traced by tracemalloc (which slows Python allocation
+    down noticeably while on). Spans from several threads are kept apart.
+    Frames rendered in worker processes are not recorded.
+
+    Stats are running aggregates over every span, while only the last
+    max_events spans are kept for the Chrome trace, so a profiler can stay
+    attached to a long-running process.
+
+    Without a profiler an instrumented call costs one attribute check.
+    """
+
+    def __init__(self, memory=False, max_events=100_000):
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.origin = time.perf_counter_ns()
+        self.events = collections.deque(maxlen=max_events)
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def span(self, name, **args):
+        """Context manager recording one span named name with optional args"""
+        return _Span(self, name, args)
+
+    def clear(self):
+        """Drop every recorded span and aggregate"""
+        with self.lock:
+            self.events.clear()
+            self.totals = {}
+
+    def record(self, event):
+        """Add a finished span to the trace ring and the per-stage aggregates"""
+        with self.lock:
+            self.events.append(event)
+            entry = self.totals.get(event['name'])
+            if entry is None:
+                entry = self.totals[event['name']] = {
+                    'count': 0, 'total_s': 0.0, 'self_s': 0.0, 'max_s': 0.0, 'alloc_blocks': 0}
+            duration = event['duration_ns'] / 1e9
+            entry['count'] += 1
+            entry['total_s'] += duration
+            entry['self_s'] += event['self_ns'] / 1e9
+            entry['max_s'] = max(entry['max_s'], duration)
+            entry['alloc_blocks'] += event['alloc_blocks']
+            if 'alloc_bytes' in event:
+                entry['alloc_bytes'] = entry.get('alloc_bytes', 0) + event['alloc_bytes']
+
+    def stats(self):
+        """
+        Per-stage aggregates over every span: count, total/self/mean/max
+        seconds and net allocated blocks (and bytes with memory=True), by name
+        """
+        with self.lock:
+            stats = {name: dict(entry) for name, entry in self.totals.items()}
+        for entry in stats.values():
+            entry['mean_s'] = entry['total_s'] / entry['count']
+        return stats
+
+    def report(self):
+        """The stats as a text table, most self time first"""
+        stats = self.stats()
+        lines = [f"{'stage':<52} {'count':>6} {'total s':>9} {'self s':>9} {'max ms':>9} "
+                 f"{'blocks':>9}"]
+        for name, entry in sorted(stats.items(), key=lambda item: -item[1]['self_s']):
+            lines.append(f"{name:<52} {entry['count']:>6} {entry['total_s']:>9.3f} "
+                         f"{entry['self_s']:>9.3f} {entry['max_s'] * 1000:>9.1f} "
+                         f"{entry['alloc_blocks']:>9}")
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """The last max_events spans as a Chrome trace (chrome://tracing, Perfetto) JSON object"""
+        pid = os.getpid()
+        events = []
+        with self.lock:
+            recorded = list(self.events)
+        for event in recorded:
+            args = dict(event['args'], alloc_blocks=event['alloc_blocks'])
+            if 'alloc_bytes' in event:
+                args['alloc_bytes'] = event['alloc_bytes']
+            events.append({
+                'name': event['name'], 'cat': 'qkov', 'ph': 'X', 'pid': pid,
+                'tid': event['thread'], 'ts': (event['start_ns'] - self.origin) / 1000,
+                'dur': event['duration_ns'] / 1000,
+                'args': {key: value if isinstance(value, (int, float, str, bool)) else repr(value)
+                         for key, value in args.items()},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        """Write chrome_trace to path"""
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def __getstate__(self):
+        # Locks and thread-local span stacks do not pickle; copies (e.g. in workers) start empty
+        state = dict(self.__dict__)
+        state['events'] = collections.deque(maxlen=self.events.maxlen)
+        state['totals'] = {}
+        del state['local'], state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+
+class _Span:
+    """One open span of a StageProfiler"""
+
+    __slots__ = ('profiler', 'name', 'args', 'start', 'blocks', 'bytes', 'child_ns')
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        stack = self.profiler.local.__dict__.setdefault('stack', [])
+        stack.append(self)
+        self.child_ns = 0
+        self.blocks = sys.getallocatedblocks()
+        if self.profiler.memory:
+            self.bytes = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        profiler = self.profiler
+        event = {'name': self.name, 'start_ns': self.start, 'duration_ns': duration,
+                 'self_ns': duration - self.child_ns, 'thread': threading.get_ident(),
+                 'alloc_blocks': sys.getallocatedblocks() - self.blocks, 'args': self.args}
+        if profiler.memory:
+            event['alloc_bytes'] = tracemalloc.get_traced_memory()[0] - self.bytes
+        profiler.record(event)
+
+        stack = profiler.local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += duration
+        return False
@@ -0,0 +1,139 @@
+"""Cumulative attribution propagation across levels, batched over many drift maps."""
+import numpy as np
+
+
+class DriftPropagator:
+    """
+    Sparse level-to-level transitions of one or many drift maps
+
+    The transition from level L to L+1 carries, along every edge, the
+    fraction weight * (1 - drift) of the signal at its source (with
+    normalize, weights are first scaled to sum to 1 over each node's
+    outgoing edges). Chaining the transitions gives the cumulative
+    attribution decay: how much of each top-level node's signal survives
+    at each deeper node, summed over all paths.
+
+    Maps sharing a depth are stacked into one batch: each level's
+    transition holds the edges of every map (a block-diagonal matrix,
+    stored as edges sorted by (map, target) so a product is one gather and
+    one np.add.reduceat), built once. Levels are padded to the largest map,
+    so a whole sweep of maps is propagated in depth - 1 array passes.
+    """
+
+    def __init__(self, maps, normalize=False):
+        self.single = hasattr(maps, 'map_arrays') or hasattr(maps, 'level_offsets')
+        if self.single:
+            maps = [maps]
+        cores = [m.map_arrays() if hasattr(m, 'map_arrays') else m for m in maps]
+        if not cores:
+            raise ValueError("No maps to propagate")
+        depths = {core.depth for core in cores}
+        if len(depths) != 1:
+            raise ValueError(f"Maps must share a depth to be batched, got depths {sorted(depths)}")
+        self.depth = depths.pop()
+        self.num_maps = len(cores)
+
+        # Node count of every level in every map, and the padded size per level
+        self.level_sizes = np.stack([np.diff(core.level_offsets) for core in cores])
+        self.width = self.level_sizes.max(axis=0)
+
+        # Every edge of every map, in map-local terms: (map, level, in-level source and target)
+        num_edges = [core.num_edges for core in cores]
+        edge_map = np.repeat(np.arange(len(cores)), num_edges)
+        sources = [core.edge_src for core in cores]
+        edge_src = np.concatenate(sources)
+        node_offset = np.repeat(np.cumsum([0] + [core.num_nodes for core in cores])[:-1], num_edges)
+        level = np.concatenate([core.level[source] for core, source in zip(cores, sources)])
+        src = np.concatenate([core.position[source] for core, source in zip(cores, sources)])
+        dst = np.concatenate([core.position[core.indices] for core in cores])
+        if np.any(np.concatenate([core.level[core.indices] for core in cores]) != level + 1):
+            raise ValueError("Propagation needs every edge to run from level L to level L+1")
+
+        # Signal carried along each edge
+        weight = np.concatenate([core.edge_weight for core in cores])
+        if normalize:
+            total = np.bincount(node_offset + edge_src, weight)
+            weight = weight / np.where(total > 0, total, 1)[node_offset + edge_src]
+        value = weight * (1.0 - np.concatenate([core.edge_drift for core in cores]))
+
+        # Per level: edges sorted by (map, target), with each target group's start
+        self.transitions = []
+        order = np.lexsort((dst, edge_map, level))
+        bounds = np.searchsorted(level[order], np.arange(self.depth))
+        for current in range(self.depth - 1):
+            edges = order[bounds[current]:bounds[current + 1]]
+            key = edge_map[edges] * self.width[current + 1] + dst[edges]
+            first = np.ones(len(key), dtype=bool)
+            first[1:] = key[1:] != key[:-1]
+            starts = np.flatnonzero(first)
+            self.transitions.append((edge_map[edges], src[edges], value[edges], starts,
+                                     edge_map[edges[starts]], dst[edges[starts]]))
+
+    def step(self, level, state):
+        """Apply the level -> level + 1 transition to a (maps, width[level], ...) state"""
+        maps, src, value, starts, group_map, group_dst = self.transitions[level]
+        result = np.zeros((self.num_maps, self.width[level + 1]) + state.shape[2:])
+        if len(starts):
+            value = value.reshape((-1,) + (1,) * (state.ndim - 2))
+            result[group_map, group_dst] = np.add.reduceat(state[maps, src] * value, starts, axis=0)
+        return result
+
+    def attribution(self, sink_level=None, source_level=0, all_levels=False):
+        """
+        Signal surviving from every source_level node at every sink_level
+        node (the deepest level by default), summed over all paths
+
+        Returns a (maps, sources, sinks) array, zero-padded to the largest
+        map in the batch ((sources, sinks) for a single map), or with
+        all_levels a list of them for source_level..sink_level. Memory is
+        maps * sources * nodes per level; use survival for per-node totals.
+        """
+        sink_level = self.depth - 1 if sink_level is None else sink_level
+        num_sources = self.width[source_level]
+        state = np.zeros((self.num_maps, num_sources, num_sources))
+        state[:, np.arange(num_sources), np.arange(num_sources)] = \
+            np.arange(num_sources) < self.level_sizes[:, source_level, None]
+        levels = [state]
+        for level in range(source_level, sink_level):
+            levels.append(self.step(level, levels[-1]))
+
+        # States are (maps, nodes, sources); report (maps, sources, nodes)
+        levels = [state.transpose(0, 2, 1) for state in levels]
+        if self.single:
+            levels = [state[0] for state in levels]
+        return levels if all_levels else levels[-1]
+
+    def survival(self, source_level=0):
+        """
+        Total signal surviving at every node from all source_level nodes
+        (each starting at 1), as a list of (maps, width) arrays per level
+        from source_level down ((width,) arrays for a single map)
+        """
+        state = (np.arange(self.width[source_level]) <
+                 self.level_sizes[:, source_level, None]).astype(np.float64)
+        levels = [state]
+        for level in range(source_level, self.depth - 1):
+            levels.append(self.step(level, levels[-1]))
+        return [state[0] for state in levels] if self.single else levels
+
+
+def propagation_sweep(count, seed=None, batch_maps=1000, normalize=False, **params):
+    """
+    Generate count array-core maps and return the mean and std over maps of
+    the total signal surviving at each level from the top level
+
+    Map i uses the same seed as map i of RecursiveQKOVMapper.generate_batch;
+    each batch of batch_maps maps is propagated in one DriftPropagator pass.
+    """
+    from qkov_ensemble import child_seeds
+    from qkov_recursive_map import RecursiveQKOVMapper
+
+    root = np.random.SeedSequence(seed)
+    totals = []
+    for start in range(0, count, batch_maps):
+        cores = [RecursiveQKOVMapper(seed=child, array_core=True, **params).core
+                 for child in child_seeds(root, start, min(start + batch_maps, count))]
+        survival = DriftPropagator(cores, normalize).survival()
+        totals.append(np.stack([level.sum(axis=1) for level in survival], axis=1))
+    totals = np.concatenate(totals)
+    return totals.mean(axis=0), totals.std(axis=0)
@@ -1,32 +1,480 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patheffects as path_effects
-import networkx as nx
-from matplotlib.colors import LinearSegmentedColormap, Normalize
-from matplotlib.collections import LineCollection
-import matplotlib.animation as animation
-from matplotlib.patches import FancyArrowPatch, Circle
-from matplotlib.transforms import Affine2D
-import matplotlib.cm as cm
-import math
 import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import base64
-from IPython.display import HTML
+import contextlib
+import copy
+import functools
+import hashlib
+
+from qkov_concurrency import bounded_map
+from qkov_layout import LAYOUT_CACHE, force_layout
+
+# matplotlib, networkx and Pillow are imported inside the methods that use
+# them, so importing this module (e.g. in a worker that only needs the graph
+# arrays) has no side effects and stays cheap. Renders that go through
+# render_png, create_animation or the HTML output draw on an Agg canvas and
+# never import pyplot, so they work headless without selecting a backend.
+
+# Glyph keys in code order; glyph_code i refers to GLYPH_KEYS[i]
+GLYPH_KEYS = ('decay', 'feedback', 'contradiction', 'classifier')
+
+# Attribution classes in code order; attribution_class_code i refers to ATTRIBUTION_CLASSES[i]
+ATTRIBUTION_CLASSES = ('strong', 'moderate', 'weak')
+
+# Random stages of map generation; each draws from its own stream spawned from the mapper seed
+RNG_STAGES = ('structure', 'metadata', 'glyph', 'layout', 'edge_drift', 'arrows')
+
+# Colormap stops (position, colour) of the mapper's path, node and edge colormaps
+COLORMAP_STOPS = {
+    # Path colormap: bright to dim based on drift
+    'drift': ((0, '#4285F4'),    # Low drift - bright blue
+              (0.5, '#5E35B1'),  # Medium drift - purple
+              (1, '#1A237E')),   # High drift - dim blue
+    # Node colormap: for recursive entropy
+    'entropy': ((0, '#4CAF50'),    # Low entropy - green
+                (0.5, '#FFC107'),  # Medium entropy - amber
+                (1, '#F44336')),   # High entropy - red
+    # Edge colormap: for flow density
+    'flow': ((0, '#00C853'),     # Strong flow - bright green
+             (0.5, '#FFAB00'),   # Medium flow - amber
+             (1, '#DD2C00')),    # Weak flow - dim red
+}
+
+
+def colormap_lut(stops, n=256):
+    """
+    (n, 4) RGBA lookup table of a colormap given as COLORMAP_STOPS, equal to
+    LinearSegmentedColormap.from_list(name, stops, N=n) without matplotlib;
+    value v maps to row min(int(v * n), n - 1)
+    """
+    positions = np.array([position for position, _ in stops], dtype=np.float64)
+    colors = np.array([[int(color[i:i + 2], 16) / 255 for i in (1, 3, 5)] + [1.0]
+                       for _, color in stops])
+    x = np.linspace(0, 1, n)
+    return np.stack([np.interp(x, positions, colors[:, channel]) for channel in range(4)], axis=1)
+
+
+# Shared no-op span returned by RecursiveQKOVMapper.span when profiling is off
+_NO_SPAN = contextlib.nullcontext()
+
+
+def _profiled(method):
+    """Record calls to method as spans of self.profiler (a StageProfiler) when one is attached"""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.profiler is None:
+            return method(self, *args, **kwargs)
+        with self.profiler.span(name):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class DriftMapArrays:
+    """
+    Structure-of-arrays storage for a drift map: one NumPy array per node
+    and edge attribute instead of one networkx attribute dict per element.
+
+    Nodes are stored contiguously per level, so level L holds node ids
+    level_offsets[L]:level_offsets[L+1]. Edges are stored in CSR form: the
+    targets of node u are indices[indptr[u]:indptr[u+1]], with edge_weight
+    and edge_drift aligned to indices.
+    """
+
+    def __init__(self, level_offsets, entropy, loopback_density, classifier_inertia,
+                 glyph_code, indptr, indices, edge_weight):
+        # Level index: node ids of level L are level_offsets[L]:level_offsets[L+1]
+        self.level_offsets = np.asarray(level_offsets, dtype=np.int64)
+        self.index_levels()
+
+        # Node attributes, indexed by node id
+        self.entropy = np.asarray(entropy, dtype=np.float64)
+        self.loopback_density = np.asarray(loopback_density, dtype=np.float64)
+        self.classifier_inertia = np.asarray(classifier_inertia, dtype=np.float64)
+        self.glyph_code = np.asarray(glyph_code, dtype=np.int8)
+        self.attribution_class_code = self.classify_entropy(self.entropy)
+
+        # Edge attributes in CSR order
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.edge_weight = np.asarray(edge_weight, dtype=np.float64)
+
+        # Filled in by compute_drift
+        self.drift = None
+        self.is_classifier = None
+        self.edge_drift = None
+        self.edge_noise = None
+
+        # Incoming-edge index, built on demand by in_edges
+        self._in_order = None
+        self._in_indptr = None
+
+    def index_levels(self):
+        """Derive per-node level and in-level position from level_offsets"""
+        level_sizes = np.diff(self.level_offsets)
+        self.level = np.repeat(np.arange(len(level_sizes), dtype=np.int32), level_sizes)
+        self.position = (np.arange(len(self.level)) -
+                         self.level_offsets[self.level]).astype(np.int32)
+
+    @property
+    def num_nodes(self):
+        return len(self.level)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def depth(self):
+        return len(self.level_offsets) - 1
+
+    def level_slice(self, level):
+        """Return the slice of node ids belonging to a level"""
+        return slice(self.level_offsets[level], self.level_offsets[level + 1])
+
+    @property
+    def edge_src(self):
+        """Source node of every edge, expanded from indptr"""
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    @property
+    def edge_dst(self):
+        """Target node of every edge"""
+        return self.indices
+
+    @staticmethod
+    def classify_entropy(entropy):
+        """Map entropy values to attribution class codes (strong/moderate/weak)"""
+        return np.digitize(entropy, [0.3, 0.7]).astype(np.int8)
+
+    @staticmethod
+    def node_drift(entropy, level, depth):
+        """Drift increases with entropy and depth, normalized to [0,1]"""
+        return np.minimum(1.0, entropy * (1 + level / depth))
+
+    @staticmethod
+    def drift_pruned(src, edge_weight, edge_drift, threshold):
+        """
+        Mask of the edges drift_threshold prunes: drift above threshold, except
+        the strongest edge of each source, so no node loses all its out-edges
+        """
+        pruned = edge_drift > threshold
+        if len(src):
+            order = np.lexsort((-edge_weight, src))
+            first = np.concatenate([[True], src[order][1:] != src[order][:-1]])
+            pruned[order[first]] = False
+        return pruned
+
+    def compute_drift(self, depth, edge_noise):
+        """Compute node drift, classifier flags and edge drift in one vectorized pass"""
+        self.drift = self.node_drift(self.entropy, self.level, depth)
+
+        # Classifier inertia nodes carry the classifier glyph or high inertia
+        self.is_classifier = ((self.glyph_code == GLYPH_KEYS.index('classifier')) |
+                              (self.classifier_inertia > 0.7))
+
+        # Edge drift is the endpoint average plus the supplied variation, which
+        # is kept so incremental updates reproduce the same edge drift
+        self.edge_noise = np.array(np.broadcast_to(edge_noise, (self.num_edges,)), dtype=np.float64)
+        edge_drift = (self.drift[self.edge_src] + self.drift[self.indices]) / 2
+        self.edge_drift = np.clip(edge_drift + self.edge_noise, 0, 1)
+
+    @staticmethod
+    def ranges(starts, stops):
+        """Concatenate arange(start, stop) for every (start, stop) pair"""
+        lengths = np.maximum(np.asarray(stops) - starts, 0)
+        offsets = np.repeat(np.asarray(starts) - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def in_edges(self, nodes):
+        """Return the ids of the edges pointing at nodes"""
+        if self._in_order is None:
+            self._in_order = np.argsort(self.indices, kind='stable')
+            self._in_indptr = np.concatenate(
+                [[0], np.cumsum(np.bincount(self.indices, minlength=self.num_nodes))])
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return self._in_order[self.ranges(self._in_indptr[nodes], self._in_indptr[nodes + 1])]
+
+    def incident_edges(self, nodes):
+        """Return the sorted ids of all edges entering or leaving nodes"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        out_edges = self.ranges(self.indptr[nodes], self.indptr[nodes + 1])
+        return np.unique(np.concatenate([out_edges, self.in_edges(nodes)]))
+
+    def edge_sources(self, edges):
+        """Source node of each given edge id (edge_src without expanding all edges)"""
+        return np.searchsorted(self.indptr, edges, side='right') - 1
+
+    def update_drift(self, nodes, depth):
+        """
+        Recompute drift, classifier flags and attribution class for nodes and
+        edge drift for their incident edges only; return (nodes, edges)
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        entropy = self.entropy[nodes]
+        self.drift[nodes] = self.node_drift(entropy, self.level[nodes], depth)
+        self.is_classifier[nodes] = ((self.glyph_code[nodes] == GLYPH_KEYS.index('classifier')) |
+                                     (self.classifier_inertia[nodes] > 0.7))
+        self.attribution_class_code[nodes] = self.classify_entropy(entropy)
+        return nodes, self.update_edge_drift(self.incident_edges(nodes))
+
+    def update_edge_drift(self, edges):
+        """Recompute edge drift for the given edge ids from their endpoints; return edges"""
+        edges = np.asarray(edges, dtype=np.int64)
+        edge_drift = (self.drift[self.edge_sources(edges)] + self.drift[self.indices[edges]]) / 2
+        self.edge_drift[edges] = np.clip(edge_drift + self.edge_noise[edges], 0, 1)
+        return edges
+
+    def insert_nodes(self, level, entropy, loopback_density, classifier_inertia, glyph_code,
+                     depth):
+        """
+        Append nodes without edges to the end of a level and return their ids
+
+        Node ids are contiguous per level, so the ids of every node in deeper
+        levels shift up by the number of inserted nodes.
+        """
+        levels = len(self.level_offsets) - 1
+        if not 0 <= level < levels:
+            raise ValueError(f"Level must be in [0, {levels}), got {level}")
+        count = len(entropy)
+        at = int(self.level_offsets[level + 1])
+        self.level_offsets[level + 1:] += count
+        self.index_levels()
+
+        for name, values in (('entropy', entropy), ('loopback_density', loopback_density),
+                             ('classifier_inertia', classifier_inertia),
+                             ('glyph_code', glyph_code)):
+            array = getattr(self, name)
+            setattr(self, name, np.insert(array, at, np.asarray(values, dtype=array.dtype)))
+        self.attribution_class_code = np.insert(self.attribution_class_code, at,
+                                                self.classify_entropy(np.asarray(entropy)))
+        self.drift = np.insert(self.drift, at, np.zeros(count))
+        self.is_classifier = np.insert(self.is_classifier, at, np.zeros(count, dtype=bool))
+
+        # New nodes have no out-edges; edges into shifted nodes are renumbered
+        self.indptr = np.insert(self.indptr, at, np.full(count, self.indptr[at]))
+        self.indices[self.indices >= at] += count
+        self._in_order = None
+
+        nodes = np.arange(at, at + count)
+        self.update_drift(nodes, depth)
+        return nodes
+
+    def remove_nodes(self, nodes):
+        """
+        Remove nodes and their incident edges; return the old -> new node id
+        map, with -1 for removed nodes
+        """
+        keep = np.ones(self.num_nodes, dtype=bool)
+        keep[np.asarray(nodes, dtype=np.int64)] = False
+        remap = np.where(keep, np.cumsum(keep) - 1, -1)
+        self.remove_edges_by_id(np.flatnonzero(~keep[self.edge_src] | ~keep[self.indices]))
+
+        out_degree = np.diff(self.indptr)[keep]
+        self.level_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(self.level[keep], minlength=self.depth))]).astype(np.int64)
+        for name in ('entropy', 'loopback_density', 'classifier_inertia', 'glyph_code',
+                     'attribution_class_code', 'drift', 'is_classifier'):
+            setattr(self, name, getattr(self, name)[keep])
+        self.index_levels()
+        self.indptr = np.concatenate([[0], np.cumsum(out_degree)])
+        self.indices = remap[self.indices]
+        self._in_order = None
+        return remap
+
+    def find_edges(self, src, dst):
+        """Return the edge id of each (src, dst) pair, or -1 where there is no such edge"""
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        found = np.full(len(src), -1, dtype=np.int64)
+        row_edges = self.ranges(self.indptr[src], self.indptr[src + 1])
+        if len(row_edges) == 0:
+            return found
+
+        # Match (src, dst) keys against the keys of the edges in those rows
+        row_keys = self.edge_sources(row_edges) * self.num_nodes + self.indices[row_edges]
+        order = np.argsort(row_keys, kind='stable')
+        row_keys, row_edges = row_keys[order], row_edges[order]
+        keys = src * self.num_nodes + dst
+        pos = np.minimum(np.searchsorted(row_keys, keys), len(row_keys) - 1)
+        hit = row_keys[pos] == keys
+        found[hit] = row_edges[pos[hit]]
+        return found
+
+    def insert_edges(self, src, dst, edge_weight, edge_noise):
+        """
+        Add edges (skipping ones that already exist) and return their ids
+
+        Edges are appended to the end of their source's CSR row, so the ids of
+        later edges shift up. Every edge must run from level L to level L+1.
+        """
+        src, dst = np.broadcast_arrays(np.asarray(src, dtype=np.int64),
+                                       np.asarray(dst, dtype=np.int64))
+        if len(src) and (min(src.min(), dst.min()) < 0 or
+                         max(src.max(), dst.max()) >= self.num_nodes):
+            raise ValueError(f"Edge endpoints must be node ids in [0, {self.num_nodes})")
+        if np.any(self.level[dst] != self.level[src] + 1):
+            raise ValueError("Edges must run from level L to level L+1")
+        keys = src * self.num_nodes + dst
+        _, first = np.unique(keys, return_index=True)
+        new = np.zeros(len(src), dtype=bool)
+        new[first] = True
+        new &= self.find_edges(src, dst) < 0
+        src, dst = src[new], dst[new]
+        edge_weight = np.broadcast_to(edge_weight, new.shape)[new]
+        edge_noise = np.broadcast_to(edge_noise, new.shape)[new]
+
+        at = self.indptr[src + 1]
+        self.indices = np.insert(self.indices, at, dst)
+        self.edge_weight = np.insert(self.edge_weight, at, edge_weight)
+        self.edge_noise = np.insert(self.edge_noise, at, edge_noise)
+        self.edge_drift = np.insert(self.edge_drift, at, np.zeros(len(src)))
+        self.indptr = self.indptr + np.concatenate(
+            [[0], np.cumsum(np.bincount(src, minlength=self.num_nodes))])
+        self._in_order = None
+
+        # np.insert places values stably in order of their insertion point
+        order = np.argsort(at, kind='stable')
+        edges = np.empty(len(src), dtype=np.int64)
+        edges[order] = at[order] + np.arange(len(src))
+        return self.update_edge_drift(edges)
+
+    def remove_edges_by_id(self, edges):
+        """Remove edges by id"""
+        keep = np.ones(self.num_edges, dtype=bool)
+        keep[np.asarray(edges, dtype=np.int64)] = False
+        removed_per_node = np.bincount(self.edge_src[~keep], minlength=self.num_nodes)
+        self.indptr = self.indptr - np.concatenate([[0], np.cumsum(removed_per_node)])
+        for name in ('indices', 'edge_weight', 'edge_noise', 'edge_drift'):
+            setattr(self, name, getattr(self, name)[keep])
+        self._in_order = None
+
+    @property
+    def nbytes(self):
+        """Total bytes held by the node and edge arrays"""
+        return sum(value.nbytes for value in vars(self).values()
+                   if isinstance(value, np.ndarray))
+
+    def node_metadata(self, node, glyphs):
+        """Build the legacy metadata dict for a single node"""
+        return {
+            "recursion_depth": int(self.level[node]) + 1,
+            "attribution_entropy": float(self.entropy[node]),
+            "loopback_density": float(self.loopback_density[node]),
+            "classifier_inertia": float(self.classifier_inertia[node]),
+            "attribution_class": ATTRIBUTION_CLASSES[self.attribution_class_code[node]],
+            "glyph": glyphs[GLYPH_KEYS[self.glyph_code[node]]]
+        }
+
+    def to_networkx(self, glyphs):
+        """Build a networkx DiGraph view with the same attributes as the legacy path"""
+        import networkx as nx
+
+        graph = nx.DiGraph()
+        graph.add_nodes_from(
+            (node, {'level': int(self.level[node]),
+                    'position': int(self.position[node]),
+                    'metadata': self.node_metadata(node, glyphs),
+                    'drift': float(self.drift[node]),
+                    'is_classifier': bool(self.is_classifier[node])})
+            for node in range(self.num_nodes))
+        graph.add_edges_from(
+            (int(u), int(v), {'weight': float(w), 'drift': float(d)})
+            for u, v, w, d in zip(self.edge_src, self.edge_dst,
+                                  self.edge_weight, self.edge_drift))
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph, glyphs):
+        """Build arrays from a legacy graph whose node ids are contiguous per level"""
+        glyph_codes = {glyphs[key]: code for code, key in enumerate(GLYPH_KEYS)}
+        nodes = sorted(graph.nodes())
+        attrs = [graph.nodes[n] for n in nodes]
+        level = np.array([attr['level'] for attr in attrs], dtype=np.int64)
+        level_offsets = np.concatenate([[0], np.cumsum(np.bincount(level))])
+
+        arrays = cls(level_offsets,
+                     [attr['metadata']['attribution_entropy'] for attr in attrs],
+                     [attr['metadata']['loopback_density'] for attr in attrs],
+                     [attr['metadata']['classifier_inertia'] for attr in attrs],
+                     [glyph_codes[attr['metadata']['glyph']] for attr in attrs],
+                     np.zeros(len(nodes) + 1), [], [])
+        arrays.drift = np.array([attr['drift'] for attr in attrs], dtype=np.float64)
+        arrays.is_classifier = np.array([attr['is_classifier'] for attr in attrs], dtype=bool)
+
+        # Edges in CSR order (sorted by source, stable within a source)
+        edges = list(graph.edges(data=True))
+        src = np.array([u for u, _, _ in edges], dtype=np.int64)
+        order = np.argsort(src, kind='stable')
+        arrays.indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=len(nodes)))])
+        arrays.indices = np.array([v for _, v, _ in edges], dtype=np.int64)[order]
+        arrays.edge_weight = np.array([d['weight'] for _, _, d in edges])[order]
+        arrays.edge_drift = np.array([d['drift'] for _, _, d in edges])[order]
+
+        # Recover the per-edge variation so incremental updates reproduce edge drift
+        arrays.edge_noise = arrays.edge_drift - (arrays.drift[arrays.edge_src] +
+                                                 arrays.drift[arrays.indices]) / 2
+        return arrays
 
-# Set the random seed for reproducibility
-np.random.seed(42)
 
 class RecursiveQKOVMapper:
     """
     Recursive QKOV Attribution Drift Map generator that visualizes
     symbolic loopback density and attribution patterns with GEBH-based backtracing.
+
+    With array_core=True, node and edge attributes are held in a DriftMapArrays
+    instance (self.core) and the networkx graph is only built when first accessed.
+    The two paths draw their random numbers in a different order, so the same
+    seed gives a different map with and without array_core (same level sizes,
+    other metrics and edges); each is reproducible on its own.
+
+    Edges whose drift exceeds drift_threshold are pruned once drift is
+    assigned, except each node's strongest out-edge (see prune_drift_edges),
+    so every node keeps a path to the next level; None keeps every edge.
+
+    All randomness comes from per-instance generators spawned from seed (an
+    int, a np.random.SeedSequence, or None for fresh entropy), one per stage
+    in RNG_STAGES, so the same seed always gives the same map regardless of
+    other mappers, threads or processes.
+
+    A prebuilt DriftMapArrays can be passed as core (see from_attributions);
+    depth and nodes_per_level are then taken from it.
+
+    Node positions are an (N, 2) array from the layout named by layout
+    ('radial' or 'force', see set_layout), computed on first use and shared
+    through layout_cache by every map with the same structure and seed.
+
+    A qkov_profiling.StageProfiler passed as profiler (or assigned to
+    self.profiler later) records a timing span for every generation,
+    layout, drawing, animation and HTML stage; with none attached the
+    instrumentation is a single attribute check per stage.
     """
-    
-    def __init__(self, depth=4, nodes_per_level=7, drift_threshold=0.65):
+
+    # Stage profiler, off unless one is attached
+    profiler = None
+
+    def __init__(self, depth=4, nodes_per_level=7, drift_threshold=0.65, array_core=False,
+                 seed=None, core=None, layout='radial', profiler=None):
+        self.profiler = profiler
+        if core is not None:
+            depth = core.depth
+            nodes_per_level = int(np.diff(core.level_offsets).max(initial=0))
         self.depth = depth
         self.nodes_per_level = nodes_per_level
         self.drift_threshold = drift_threshold
-        
+
+        # Independent random streams per generation stage
+        sequence = (seed if isinstance(seed, np.random.SeedSequence)
+                    else np.random.SeedSequence(seed))
+        self.seed = seed if seed is not None else sequence.entropy
+        self.seed_sequences = dict(zip(RNG_STAGES, sequence.spawn(len(RNG_STAGES))))
+        self.rngs = {stage: np.random.default_rng(child)
+                     for stage, child in self.seed_sequences.items()}
+
         # Define the glyphs used in the visualization
         self.glyphs = {
             'decay': '∴',           # decayed attribution
@@ -34,44 +482,106 @@ class RecursiveQKOVMapper:
             'contradiction': '☍',   # recursive contradiction
             'classifier': '⧖'       # classifier inertia
         }
-        
-        # Create custom colormaps for different elements
-        self.create_colormaps()
-        
-        # Initialize graph structure
-        self.graph = nx.DiGraph()
-        self.generate_recursive_structure()
-        
-        # Calculate node positions with a spiral-like layout
-        self.positions = self.calculate_node_positions()
-        
-        # Assign attribution drift values to nodes and edges
+
+        # Custom colormaps for different elements, created on first use
+        self._path_cmap = self._node_cmap = self._edge_cmap = None
+        self._backtracer = None
+
+        if core is not None:
+            # Supplied arrays; glyphs left unassigned (-1) get the usual rules
+            self.core = core
+            self._graph = None
+            unassigned = core.glyph_code < 0
+            if unassigned.any():
+                core.glyph_code[unassigned] = self.assign_glyph_codes(
+                    core.entropy, core.level, core.position)[unassigned]
+        elif array_core:
+            # Generate nodes and edges straight into arrays; the graph is built lazily
+            self.core = self.generate_array_core()
+            self._graph = None
+        else:
+            import networkx as nx
+
+            # Initialize graph structure
+            self.core = None
+            self._graph = nx.DiGraph()
+            self.generate_recursive_structure()
+
+        # Node positions (spiral-like layout) are calculated on first use, so
+        # statistics-only callers never pay for the layout
+        self.layout_cache = LAYOUT_CACHE
+        self.set_layout(layout)
+
+        # Assign attribution drift values to nodes and edges, then drop the
+        # high-drift ones
         self.assign_drift_values()
-        
+        self.prune_drift_edges()
+
+    def span(self, name, **args):
+        """A profiler span named name, or a shared no-op context when no profiler is attached"""
+        if self.profiler is None:
+            return _NO_SPAN
+        return self.profiler.span(name, **args)
+
+    @property
+    def graph(self):
+        """networkx view of the map, built on first access when using the array core"""
+        if self._graph is None:
+            self._graph = self.core.to_networkx(self.glyphs)
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    @property
+    def positions(self):
+        """(N, 2) array of node positions, computed (or fetched from layout_cache) on first use"""
+        if self._positions is None:
+            self._positions = self.compute_layout()
+        return self._positions
+
+    @positions.setter
+    def positions(self, positions):
+        # Legacy node -> (x, y) dicts are converted to the array form
+        if isinstance(positions, dict):
+            positions = np.array([positions[n] for n in range(len(positions))],
+                                 dtype=np.float64).reshape(-1, 2)
+        self._positions = positions
+
+    @property
+    def path_cmap(self):
+        if self._path_cmap is None:
+            self.create_colormaps()
+        return self._path_cmap
+
+    @property
+    def node_cmap(self):
+        if self._node_cmap is None:
+            self.create_colormaps()
+        return self._node_cmap
+
+    @property
+    def edge_cmap(self):
+        if self._edge_cmap is None:
+            self.create_colormaps()
+        return self._edge_cmap
+
+    @_profiled
     def create_colormaps(self):
         """Create custom colormaps for different visualization elements"""
-        # Path colormap: bright to dim based on drift
-        self.path_cmap = LinearSegmentedColormap.from_list('drift', 
-                                                          [(0, '#4285F4'),    # Low drift - bright blue
-                                                           (0.5, '#5E35B1'),  # Medium drift - purple
-                                                           (1, '#1A237E')])   # High drift - dim blue
-        
-        # Node colormap: for recursive entropy
-        self.node_cmap = LinearSegmentedColormap.from_list('entropy', 
-                                                          [(0, '#4CAF50'),    # Low entropy - green
-                                                           (0.5, '#FFC107'),  # Medium entropy - amber
-                                                           (1, '#F44336')])   # High entropy - red
-                                                           
-        # Edge colormap: for flow density
-        self.edge_cmap = LinearSegmentedColormap.from_list('flow', 
-                                                         [(0, '#00C853'),     # Strong flow - bright green
-                                                          (0.5, '#FFAB00'),   # Medium flow - amber
-                                                          (1, '#DD2C00')])    # Weak flow - dim red
+        from matplotlib.colors import LinearSegmentedColormap
+
+        self._path_cmap = LinearSegmentedColormap.from_list('drift', COLORMAP_STOPS['drift'])
+        self._node_cmap = LinearSegmentedColormap.from_list('entropy', COLORMAP_STOPS['entropy'])
+        self._edge_cmap = LinearSegmentedColormap.from_list('flow', COLORMAP_STOPS['flow'])
     
+    @_profiled
     def generate_recursive_structure(self):
         """Generate the recursive graph structure with nodes and connections"""
-        # Create nodes for each level
+        # Create nodes for each level, remembering which nodes belong to each one
         node_id = 0
+        level_nodes = []
         for level in range(self.depth):
             # Nodes per level can decrease with depth to create a more focused structure
             actual_nodes = max(3, self.nodes_per_level - level)
@@ -86,6 +596,7 @@ class RecursiveQKOVMapper:
                                     position=i, 
                                     metadata=metadata)
                 node_id += 1
+            level_nodes.append(list(range(node_id - actual_nodes, node_id)))
         
         # Create connections between nodes across levels
         for node in list(self.graph.nodes()):
@@ -96,16 +607,16 @@ class RecursiveQKOVMapper:
                 continue
                 
             # Get nodes from the next level
-            next_level_nodes = [n for n, attr in self.graph.nodes(data=True) 
-                               if attr['level'] == node_level + 1]
+            next_level_nodes = level_nodes[node_level + 1]
             
             # Create 1-3 connections to the next level
-            num_connections = np.random.randint(1, min(4, len(next_level_nodes) + 1))
-            targets = np.random.choice(next_level_nodes, size=num_connections, replace=False)
+            num_connections = self.rngs['structure'].integers(1, min(4, len(next_level_nodes) + 1))
+            targets = self.rngs['structure'].choice(next_level_nodes, size=num_connections,
+                                                    replace=False)
             
             for target in targets:
                 # Add an edge with random weight
-                self.graph.add_edge(node, target, weight=np.random.random())
+                self.graph.add_edge(node, int(target), weight=self.rngs['structure'].random())
     
     def generate_node_metadata(self, level, position):
         """Generate metadata for a node based on its level and position"""
@@ -114,7 +625,7 @@ class RecursiveQKOVMapper:
         base_entropy = min(1.0, base_entropy)
         
         # Add some random variation
-        entropy = min(1.0, base_entropy + np.random.normal(0, 0.1))
+        entropy = min(1.0, base_entropy + self.rngs['metadata'].normal(0, 0.1))
         
         # Assign attribution class based on entropy level
         if entropy < 0.3:
@@ -128,8 +639,8 @@ class RecursiveQKOVMapper:
         shell_metadata = {
             "recursion_depth": level + 1,
             "attribution_entropy": entropy,
-            "loopback_density": max(0, min(1, np.random.normal(0.5, 0.2))),
-            "classifier_inertia": max(0, min(1, np.random.normal(0.4, 0.25))),
+            "loopback_density": max(0, min(1, self.rngs['metadata'].normal(0.5, 0.2))),
+            "classifier_inertia": max(0, min(1, self.rngs['metadata'].normal(0.4, 0.25))),
             "attribution_class": attribution_class,
             # Glyph assignment is based on entropy and other factors
             "glyph": self.assign_glyph(entropy, level, position)
@@ -158,46 +669,171 @@ class RecursiveQKOVMapper:
         # Default with probability
         glyphs = list(self.glyphs.values())
         probs = [0.4, 0.3, 0.2, 0.1]  # Probability for each glyph type
-        return np.random.choice(glyphs, p=probs)
-    
+        return glyphs[self.rngs['glyph'].choice(len(glyphs), p=probs)]
+
+    @_profiled
+    def generate_array_core(self):
+        """Generate nodes, metadata and edges directly into a DriftMapArrays core"""
+        # Same per-level node counts as generate_recursive_structure, stored contiguously
+        level_sizes = [max(3, self.nodes_per_level - level) for level in range(self.depth)]
+        level_offsets = np.concatenate([[0], np.cumsum(level_sizes)]).astype(np.int64)
+        num_nodes = int(level_offsets[-1])
+        level = np.repeat(np.arange(self.depth), level_sizes)
+        position = np.arange(num_nodes) - level_offsets[level]
+
+        # Metadata drawn for all nodes at once (see generate_node_metadata)
+        base_entropy = np.minimum(1.0, position / self.nodes_per_level + level / self.depth)
+        metadata_rng = self.rngs['metadata']
+        entropy = np.minimum(1.0, base_entropy + metadata_rng.normal(0, 0.1, num_nodes))
+        loopback_density = np.clip(metadata_rng.normal(0.5, 0.2, num_nodes), 0, 1)
+        classifier_inertia = np.clip(metadata_rng.normal(0.4, 0.25, num_nodes), 0, 1)
+        glyph_code = self.assign_glyph_codes(entropy, level, position)
+
+        # Create 1-3 connections from each node to the next level, one batch per level
+        structure_rng = self.rngs['structure']
+        out_degree = np.zeros(num_nodes, dtype=np.int64)
+        targets = []
+        for lvl in range(self.depth - 1):
+            num_sources, num_targets = level_sizes[lvl], level_sizes[lvl + 1]
+            num_connections = structure_rng.integers(1, min(4, num_targets + 1), size=num_sources)
+            picks = self.sample_targets(num_sources, num_targets, num_connections.max(),
+                                        structure_rng)
+
+            # Keep the first num_connections picks of each row, sorted for CSR order
+            keep = np.arange(picks.shape[1]) < num_connections[:, None]
+            picks = np.sort(np.where(keep, picks, num_targets), axis=1)
+            targets.append(picks[keep] + level_offsets[lvl + 1])
+            out_degree[level_offsets[lvl]:level_offsets[lvl + 1]] = num_connections
+
+        indptr = np.concatenate([[0], np.cumsum(out_degree)])
+        indices = np.concatenate(targets) if targets else np.zeros(0, dtype=np.int64)
+        edge_weight = structure_rng.random(len(indices))
+
+        return DriftMapArrays(level_offsets, entropy, loopback_density, classifier_inertia,
+                              glyph_code, indptr, indices, edge_weight)
+
+    @staticmethod
+    def sample_targets(num_sources, num_targets, num_picks, rng):
+        """Draw num_picks distinct targets in [0, num_targets) for every source at once"""
+        picks = np.empty((num_sources, num_picks), dtype=np.int64)
+        for j in range(num_picks):
+            # Draw among the targets not yet taken, then shift past the taken ones
+            # in ascending order so each row stays uniform and without replacement
+            choice = rng.integers(0, num_targets - j, size=num_sources)
+            taken = np.sort(picks[:, :j], axis=1)
+            for k in range(j):
+                choice += choice >= taken[:, k]
+            picks[:, j] = choice
+        return picks
+
+    def assign_glyph_codes(self, entropy, level, position):
+        """Vectorized assign_glyph: return a glyph code for every node"""
+        codes = np.full(len(entropy), -1, dtype=np.int8)
+
+        # Apply the assign_glyph rules in priority order to still-unassigned nodes
+        rules = [
+            ('decay', entropy > 0.7),
+            ('feedback', (level >= 1) & (level < self.depth - 1) &
+                         (entropy >= 0.3) & (entropy <= 0.7)),
+            ('contradiction', (position % 3 == 0) & (entropy > 0.4)),
+            ('classifier', (level == 1) & (position % 2 == 0)),
+        ]
+        for key, mask in rules:
+            codes[(codes < 0) & mask] = GLYPH_KEYS.index(key)
+
+        # Default with probability
+        unassigned = codes < 0
+        codes[unassigned] = self.rngs['glyph'].choice(len(GLYPH_KEYS), size=unassigned.sum(),
+                                                      p=[0.4, 0.3, 0.2, 0.1])
+        return codes
+
     def calculate_node_positions(self):
-        """Calculate positions for nodes in a spiral-like layout"""
-        positions = {}
-        
-        # Center node for the deepest level
-        center_x, center_y = 0, 0
-        
-        # Calculate positions for each level in reverse (deepest first)
-        for level in range(self.depth-1, -1, -1):
-            level_nodes = [n for n, attr in self.graph.nodes(data=True) 
-                          if attr['level'] == level]
-            
-            # Skip if no nodes at this level
-            if not level_nodes:
-                continue
-                
-            # Calculate radius for this level
-            radius = 2 + (self.depth - level) * 2
-            
-            # Distribute nodes evenly in a circle
-            node_count = len(level_nodes)
-            for i, node in enumerate(level_nodes):
-                # Calculate angle with some jitter for visual interest
-                angle = 2 * np.pi * i / node_count
-                angle += np.random.normal(0, 0.05)  # Small jitter
-                
-                # Calculate position with a spiral factor
-                spiral_factor = 0.2 * (self.depth - level)
-                x = center_x + radius * np.cos(angle + spiral_factor)
-                y = center_y + radius * np.sin(angle + spiral_factor)
-                
-                # Store position
-                positions[node] = (x, y)
-        
-        return positions
-    
+        """Calculate positions for nodes in a spiral-like layout, as an (N, 2) array"""
+        # Level and in-level index of every node
+        if self.core is not None:
+            level, index = self.core.level, self.core.position
+        else:
+            nodes, level = np.array([(n, attr['level']) for n, attr in self.graph.nodes(data=True)],
+                                    dtype=np.int64).reshape(-1, 2).T
+            order = np.argsort(level, kind='stable')
+            index = np.empty(len(nodes), dtype=np.int64)
+            index[order] = np.arange(len(nodes)) - np.searchsorted(level[order], level[order])
+            inverse = np.empty(len(nodes), dtype=np.int64)
+            inverse[nodes] = np.arange(len(nodes))
+            level, index = level[inverse], index[inverse]
+        count = np.bincount(level, minlength=self.depth)[level]
+
+        # Jitter is drawn level by level, deepest first, from the seed's layout stream
+        jitter = np.empty(len(level))
+        draw_order = np.lexsort((index, -level))
+        jitter[draw_order] = np.random.default_rng(self.seed_sequences['layout']).normal(
+            0, 0.05, len(level))
+
+        # Nodes evenly spaced on a ring per level (with jitter) and a spiral twist
+        radius = 2 + (self.depth - level) * 2
+        angle = 2 * np.pi * index / count + jitter + 0.2 * (self.depth - level)
+        return np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+
+    def set_layout(self, layout='radial', **options):
+        """
+        Choose the node layout: 'radial' (the spiral-like rings) or 'force'
+        (the rings refined by qkov_layout.force_layout with these options);
+        positions are recomputed or fetched from layout_cache on next use
+        """
+        if layout not in ('radial', 'force'):
+            raise ValueError(f"Unknown layout {layout!r}")
+        self.layout = layout
+        self.layout_options = options
+        self._positions = None
+
+    def layout_key(self):
+        """Hash of everything the layout depends on: structure, layout seed and options"""
+        arrays = self.map_arrays()
+        layout_seed = self.seed_sequences['layout']
+        digest = hashlib.sha256(json.dumps({
+            'layout': self.layout,
+            'options': {name: repr(value) for name, value in sorted(self.layout_options.items())},
+            'depth': self.depth,
+            'seed': [repr(layout_seed.entropy), list(layout_seed.spawn_key)],
+        }, sort_keys=True).encode('utf-8'))
+        names = ('level_offsets', 'position', 'indptr', 'indices')
+        if self.layout == 'force':
+            names += ('edge_weight',)
+        for name in names:
+            digest.update(name.encode('ascii'))
+            digest.update(np.ascontiguousarray(getattr(arrays, name)).tobytes())
+        return digest.hexdigest()
+
+    @_profiled
+    def compute_layout(self):
+        """Compute the (N, 2) node positions for the current layout, through layout_cache"""
+        key = self.layout_key() if self.layout_cache is not None else None
+        if key is not None:
+            xy = self.layout_cache.get(key)
+            if xy is not None:
+                return xy
+
+        xy = self.calculate_node_positions()
+        if self.layout == 'force':
+            arrays = self.map_arrays()
+            xy = force_layout(xy, arrays.edge_src, arrays.indices, arrays.edge_weight,
+                              **self.layout_options)
+        if key is not None:
+            xy = self.layout_cache.put(key, xy)
+        return xy
+
+    @_profiled
     def assign_drift_values(self):
         """Assign drift values to nodes and edges based on metadata"""
+        if self.core is not None:
+            # Same drift model as below, computed over the whole core at once; a
+            # core that carries its own edge noise (e.g. measured data) keeps it
+            edge_noise = self.core.edge_noise
+            if edge_noise is None:
+                edge_noise = self.rngs['edge_drift'].normal(0, 0.1, self.core.num_edges)
+            self.core.compute_drift(self.depth, edge_noise)
+            return
+
         # Calculate drift for each node
         for node in self.graph.nodes():
             metadata = self.graph.nodes[node]['metadata']
@@ -225,33 +861,313 @@ class RecursiveQKOVMapper:
             # Edge drift is influenced by both endpoint nodes
             edge_drift = (source_drift + target_drift) / 2
             # Add some random variation
-            edge_drift += np.random.normal(0, 0.1)
+            edge_drift += self.rngs['edge_drift'].normal(0, 0.1)
             edge_drift = max(0, min(1, edge_drift))
             
             # Store drift value
             self.graph.edges[u, v]['drift'] = edge_drift
     
-    def visualize(self, figsize=(14, 14), save_path=None, show_legend=True):
-        """Create the visualization of the QKOV attribution drift map"""
+    def map_arrays(self):
+        """Return the map as DriftMapArrays, converting the legacy graph if needed"""
+        if self.core is not None:
+            return self.core
+        return DriftMapArrays.from_networkx(self.graph, self.glyphs)
+
+    def position_array(self):
+        """Return node positions as an (N, 2) array indexed by node id"""
+        return self.positions
+
+    @classmethod
+    def generate_batch(cls, count, seed=None, workers=None, return_cores=False,
+                       chunk_maps=None, **params):
+        """
+        Build count maps with the given constructor params across a process pool
+
+        Map i is seeded with the i-th child of np.random.SeedSequence(seed), so
+        the batch is the same for any worker count or chunking. Returns the
+        mappers, or only their DriftMapArrays when return_cores is set (much
+        cheaper to send back from the workers). Chunks of chunk_maps maps are
+        submitted as workers free up (see qkov_concurrency.bounded_map), so
+        finished maps do not pile up; workers <= 1 builds in-process.
+        """
+        seeds = np.random.SeedSequence(seed).spawn(count)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1 or count <= 1:
+            return _build_maps(cls, params, seeds, return_cores)
+
+        if chunk_maps is None:
+            chunk_maps = max(1, -(-count // (4 * workers)))
+        chunks = [seeds[start:start + chunk_maps] for start in range(0, count, chunk_maps)]
+        workers = min(workers, len(chunks))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            batches = bounded_map(pool, _build_maps,
+                                  ((cls, params, chunk, return_cores) for chunk in chunks), workers)
+            return [result for results in batches for result in results]
+
+    @classmethod
+    def from_attributions(cls, qk, ov=None, drift_threshold=0.65, seed=None, top_k=3,
+                          min_weight=None, block_bytes=None):
+        """
+        Build a map from real per-layer QK/OV attribution tensors
+
+        qk and ov are per-layer sources (.npy paths, (npz path, key) pairs or
+        arrays), or qk is a directory / .npz archive holding qk_<L> and ov_<L>
+        tensors. The tensors are memory-mapped or streamed one row block at a
+        time (see qkov_ingest.ingest_attributions), never loaded whole.
+
+        Each node keeps edges to its top_k strongest OV targets (all of them if
+        None) whose share of its attribution is at least min_weight and whose
+        edge drift is at most drift_threshold (no drift pruning if None); its
+        strongest target is kept whatever its drift, as in prune_drift_edges.
+        """
+        from qkov_ingest import BLOCK_BYTES, attribution_sources, ingest_attributions
+
+        if ov is None:
+            qk, ov = attribution_sources(qk)
+        core = ingest_attributions(qk, ov, top_k=top_k, min_weight=min_weight,
+                                   max_drift=drift_threshold,
+                                   block_bytes=block_bytes or BLOCK_BYTES)
+        return cls(drift_threshold=drift_threshold, seed=seed, core=core)
+
+    def prune_drift_edges(self, threshold=None):
+        """
+        Remove edges whose drift exceeds threshold (drift_threshold by default),
+        keeping each node's strongest out-edge, and return how many were
+        removed; node ids are unchanged. Nothing is removed when both are None.
+        """
+        threshold = self.drift_threshold if threshold is None else threshold
+        if threshold is None:
+            return 0
+        if self.core is None:
+            # Legacy graph: prune in place, without converting to the array core
+            edges = list(self.graph.edges(data=True))
+            if not edges:
+                return 0
+            pruned = DriftMapArrays.drift_pruned(
+                np.array([u for u, _, _ in edges]), np.array([d['weight'] for _, _, d in edges]),
+                np.array([d['drift'] for _, _, d in edges]), threshold)
+            self.graph.remove_edges_from([edges[i][:2] for i in np.flatnonzero(pruned)])
+            self._backtracer = None
+            return int(pruned.sum())
+
+        core = self.core
+        edges = np.flatnonzero(DriftMapArrays.drift_pruned(core.edge_src, core.edge_weight,
+                                                           core.edge_drift, threshold))
+        if len(edges):
+            core.remove_edges_by_id(edges)
+            self._graph = None
+            self._backtracer = None
+        return len(edges)
+
+    def live_core(self):
+        """
+        Return the array core for in-place updates, converting a networkx-built
+        map first; the networkx view and backtracer are rebuilt lazily after
+        every update
+        """
+        # Lay out before any node ids change
+        self.position_array()
+        if self.core is None:
+            self.core = DriftMapArrays.from_networkx(self.graph, self.glyphs)
+        self._graph = None
+        self._backtracer = None
+        return self.core
+
+    def backtracer(self):
+        """Return the map's DriftBacktracer (GEBH path queries), kept until the map changes"""
+        if self._backtracer is None:
+            from qkov_backtrace import DriftBacktracer
+
+            self._backtracer = DriftBacktracer(self.map_arrays())
+        return self._backtracer
+
+    def update_node_metrics(self, nodes, entropy=None, loopback_density=None,
+                            classifier_inertia=None):
+        """
+        Set new metric values for nodes and recompute drift, classifier flags
+        and edge drift for them and their incident edges only
+
+        Returns the (nodes, edges) whose values changed.
+        """
+        core = self.live_core()
+        nodes = np.atleast_1d(np.asarray(nodes, dtype=np.int64))
+        for name, values in (('entropy', entropy), ('loopback_density', loopback_density),
+                             ('classifier_inertia', classifier_inertia)):
+            if values is not None:
+                getattr(core, name)[nodes] = values
+        return core.update_drift(nodes, self.depth)
+
+    def add_nodes(self, level, entropy, loopback_density=None, classifier_inertia=None):
+        """
+        Add nodes (without edges) to the end of a level and return their ids
+
+        Metrics that are not given are drawn as in generation, glyphs follow
+        the assign_glyph rules and the nodes are placed on their level's ring.
+        Ids of nodes in deeper levels shift up by the number of new nodes.
+        """
+        if not 0 <= level < self.depth:
+            raise ValueError(f"Level must be in [0, {self.depth}), got {level}")
+        core = self.live_core()
+        entropy = np.atleast_1d(np.asarray(entropy, dtype=np.float64))
+        count = len(entropy)
+        if loopback_density is None:
+            loopback_density = np.clip(self.rngs['metadata'].normal(0.5, 0.2, count), 0, 1)
+        if classifier_inertia is None:
+            classifier_inertia = np.clip(self.rngs['metadata'].normal(0.4, 0.25, count), 0, 1)
+        first = int(core.level_offsets[level + 1] - core.level_offsets[level])
+        position = np.arange(first, first + count)
+        glyph_code = self.assign_glyph_codes(entropy, np.full(count, level), position)
+        nodes = core.insert_nodes(level, entropy, loopback_density, classifier_inertia,
+                                  glyph_code, self.depth)
+
+        # Place the new nodes on their level's ring, shifting renumbered nodes along
+        radius = 2 + (self.depth - level) * 2
+        angle = (self.rngs['layout'].uniform(0, 2 * np.pi, count) +
+                 0.2 * (self.depth - level))
+        self.positions = np.insert(self.positions, nodes[0],
+                                   np.stack([radius * np.cos(angle), radius * np.sin(angle)],
+                                            axis=1), axis=0)
+        return nodes
+
+    def remove_nodes(self, nodes):
+        """
+        Remove nodes and their incident edges
+
+        Returns the old -> new node id map (-1 for removed nodes).
+        """
+        core = self.live_core()
+        remap = core.remove_nodes(np.atleast_1d(nodes))
+        self.positions = self.positions[remap >= 0]
+        return remap
+
+    def add_edges(self, src, dst, weight=None):
+        """Add edges (existing ones are skipped) and return their ids; later edge ids shift up"""
+        core = self.live_core()
+        src = np.atleast_1d(np.asarray(src, dtype=np.int64))
+        if weight is None:
+            weight = self.rngs['structure'].random(len(src))
+        noise = self.rngs['edge_drift'].normal(0, 0.1, len(src))
+        return core.insert_edges(src, dst, weight, noise)
+
+    def remove_edges(self, src, dst):
+        """Remove the (src, dst) edges that exist and return how many were removed"""
+        core = self.live_core()
+        edges = core.find_edges(np.atleast_1d(src), np.atleast_1d(dst))
+        edges = np.unique(edges[edges >= 0])
+        core.remove_edges_by_id(edges)
+        return len(edges)
+
+    @_profiled
+    def visualize(self, figsize=(14, 14), save_path=None, show_legend=True,
+                  render_mode='artists', label_budget=None, edge_mode='lines', cache=None):
+        """
+        Create the visualization of the QKOV attribution drift map
+
+        render_mode='batched' draws nodes, glyphs and classifier rings as a few
+        scatter collections sized in points and culls text labels to the
+        available pixel area (capped at label_budget labels); 'artists' draws
+        one set of artists per node. edge_mode='density' draws edges as a
+        density raster (for maps with too many edges to draw as lines).
+
+        With a RenderCache and a save_path, a cached render is copied to
+        save_path without drawing anything and None is returned; otherwise the
+        figure is drawn and returned, and the saved file is stored in the cache.
+        """
+        import matplotlib.pyplot as plt
+
+        options = dict(figsize=figsize, show_legend=show_legend, render_mode=render_mode,
+                       label_budget=label_budget, edge_mode=edge_mode)
+        if save_path and cache is not None and cache.load_figure(self, save_path, dpi=300,
+                                                                 **options):
+            return None
+
         fig, ax = plt.subplots(figsize=figsize, facecolor='#f9f9fe')
+        self.draw_map(ax, show_legend=show_legend, render_mode=render_mode,
+                      label_budget=label_budget, edge_mode=edge_mode,
+                      raster_dpi=300 if save_path else None)
         
-        # Set axis limits with some padding
-        all_xs = [pos[0] for pos in self.positions.values()]
-        all_ys = [pos[1] for pos in self.positions.values()]
-        x_margin = (max(all_xs) - min(all_xs)) * 0.15
-        y_margin = (max(all_ys) - min(all_ys)) * 0.15
+        plt.tight_layout()
         
-        ax.set_xlim(min(all_xs) - x_margin, max(all_xs) + x_margin)
-        ax.set_ylim(min(all_ys) - y_margin, max(all_ys) + y_margin)
+        # Save if path provided
+        if save_path:
+            with self.span('savefig', dpi=300):
+                if cache is not None:
+                    cache.savefig(self, fig, save_path, dpi=300, **options)
+                else:
+                    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            
+        return fig
+
+    @_profiled
+    def render_png(self, figsize=(14, 14), dpi=300, show_legend=True, render_mode='artists',
+                   label_budget=None, edge_mode='lines'):
+        """Render the static map to PNG bytes on a headless figure (dpi=None: figure dpi)"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure(figsize=figsize, facecolor='#f9f9fe')
+        FigureCanvasAgg(fig)
+        self.draw_map(fig.add_subplot(), show_legend=show_legend, render_mode=render_mode,
+                      label_budget=label_budget, edge_mode=edge_mode, raster_dpi=dpi)
+        fig.tight_layout()
+        png = io.BytesIO()
+        with self.span('savefig', dpi=dpi):
+            fig.savefig(png, format='png', dpi=dpi if dpi is not None else 'figure',
+                        bbox_inches='tight')
+        return png.getvalue()
+
+    def thumbnail_png(self, size=256, format='PNG', **params):
+        """
+        Encode a size x size preview drawn without matplotlib (see
+        qkov_thumbnail.ThumbnailRasterizer); Pillow params go to Image.save
+        """
+        from qkov_thumbnail import ThumbnailRasterizer
+
+        return ThumbnailRasterizer(size).png(self, format=format, **params)
+
+    def tile_pyramid(self, tile_size=256, max_zoom=None, cache=None, **options):
+        """
+        Return a TilePyramid over this map: fixed-size tiles at several zooms,
+        rendered lazily (and cached in a RenderCache if given) per request
+        """
+        from qkov_tiles import TilePyramid
+
+        return TilePyramid(self, tile_size=tile_size, max_zoom=max_zoom, cache=cache, **options)
+
+    @_profiled
+    def draw_map(self, ax, show_legend=True, render_mode='artists', label_budget=None,
+                 edge_mode='lines', raster_dpi=None):
+        """
+        Draw the complete static drift map onto an existing axes
+
+        edge_mode='density' draws the edges as one density raster (see
+        draw_edge_density) at raster_dpi (default: the figure dpi) instead of
+        one line per edge. Returns the data-layer artists by name (edges,
+        plus nodes and classifier overlays in batched mode) so they can be
+        updated in place.
+        """
+        # Set axis limits with some padding
+        self.set_map_limits(ax, self.position_array())
         
         # Draw edges with color based on drift
-        self.draw_edges(ax)
-        
-        # Draw nodes with glyphs
-        self.draw_nodes(ax)
+        if edge_mode == 'density':
+            artists = self.draw_edge_density(ax, dpi=raster_dpi)
+        elif edge_mode == 'lines':
+            artists = self.draw_edges(ax)
+        else:
+            raise ValueError(f"Unknown edge_mode: {edge_mode!r}")
         
-        # Overlay classifier inertia nodes
-        self.overlay_classifier_nodes(ax)
+        if render_mode == 'batched':
+            # Draw nodes, glyphs and classifier overlays as collections
+            artists.update(self.draw_nodes_batched(ax, label_budget=label_budget))
+            artists.update(self.overlay_classifier_nodes_batched(ax, label_budget=label_budget))
+        else:
+            # Draw nodes with glyphs
+            self.draw_nodes(ax)
+
+            # Overlay classifier inertia nodes
+            self.overlay_classifier_nodes(ax)
         
         # Add title and labels
         ax.set_title('Recursive QKOV Attribution Drift Map\nSymbolic Loopback Density Analysis', 
@@ -265,68 +1181,222 @@ class RecursiveQKOVMapper:
                 transform=ax.transAxes)
         
         # Make it look clean
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_aspect('equal')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
+        self.clean_axes(ax)
         
         # Add legend if requested
         if show_legend:
             self.add_legend(ax)
-        
-        plt.tight_layout()
-        
-        # Save if path provided
-        if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
-            
-        return fig
-    
-    def draw_edges(self, ax):
-        """Draw edges with colors based on drift values"""
+        return artists
+
+    @staticmethod
+    def set_map_limits(ax, xy):
+        """Set axis limits to the node positions with 15% padding"""
+        x_margin = np.ptp(xy[:, 0]) * 0.15
+        y_margin = np.ptp(xy[:, 1]) * 0.15
+        ax.set_xlim(xy[:, 0].min() - x_margin, xy[:, 0].max() + x_margin)
+        ax.set_ylim(xy[:, 1].min() - y_margin, xy[:, 1].max() + y_margin)
+
+    @staticmethod
+    def clean_axes(ax):
+        """Hide ticks and spines and use an equal aspect ratio"""
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_aspect('equal')
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+    @_profiled
+    def draw_edges(self, ax, arrow_fraction=0.7, arrow_rule='drift', arrow_seed=None):
+        """
+        Draw edges with colors based on drift values
+
+        Arrow heads are drawn on arrow_fraction of the edges, chosen by
+        arrow_rule: 'drift' keeps the lowest-drift (most stable) edges,
+        'stride' keeps evenly spaced edges, and 'random' draws a subset
+        from a generator seeded with arrow_seed (default: the mapper's
+        'arrows' stream, so repeated draws pick the same edges).
+
+        Returns the 'edges' LineCollection, the 'arrows' PolyCollection (or
+        None) and the 'arrow_edges' ids it is drawn for.
+        """
+        from matplotlib.collections import LineCollection
+
+        arrays = self.map_arrays()
+        xy = self.position_array()
+        edge_drift = arrays.edge_drift
+
         # Prepare edge data for LineCollection
-        edge_pos = [(self.positions[u], self.positions[v]) for u, v in self.graph.edges()]
-        edge_colors = [self.edge_cmap(1.0 - self.graph.edges[u, v]['drift']) 
-                      for u, v in self.graph.edges()]
-        
+        edge_pos = np.stack([xy[arrays.edge_src], xy[arrays.edge_dst]], axis=1)
+        edge_colors = self.edge_cmap(1.0 - edge_drift)
+
         # Create line collection with variable width based on drift
-        edge_widths = [1.5 * (1.0 - self.graph.edges[u, v]['drift']) + 0.5 
-                      for u, v in self.graph.edges()]
-        
-        line_segments = LineCollection(edge_pos, linewidths=edge_widths, 
+        edge_widths = 1.5 * (1.0 - edge_drift) + 0.5
+
+        line_segments = LineCollection(edge_pos, linewidths=edge_widths,
                                       colors=edge_colors, zorder=1, alpha=0.7)
         ax.add_collection(line_segments)
-        
-        # Add arrows to show direction
-        for i, (u, v) in enumerate(self.graph.edges()):
-            # Only add arrows to some edges to avoid clutter
-            if np.random.random() > 0.7:
-                continue
-                
-            # Get positions
-            pos_u = self.positions[u]
-            pos_v = self.positions[v]
-            
-            # Calculate arrow position (70% along the edge)
-            arrow_pos = (0.7 * pos_v[0] + 0.3 * pos_u[0], 
-                         0.7 * pos_v[1] + 0.3 * pos_u[1])
-            
-            # Calculate direction vector
-            dx = pos_v[0] - pos_u[0]
-            dy = pos_v[1] - pos_u[1]
-            length = np.sqrt(dx*dx + dy*dy)
-            dx, dy = dx/length, dy/length
-            
-            # Add arrow
-            arrow = ax.arrow(arrow_pos[0], arrow_pos[1], dx*0.2, dy*0.2,
-                            head_width=0.15, head_length=0.2, fc=edge_colors[i], 
-                            ec=edge_colors[i], alpha=0.7, zorder=2)
-    
+
+        # Add arrows to some edges to show direction without clutter
+        if arrow_seed is None:
+            arrow_seed = self.seed_sequences['arrows']
+        arrows = self.select_arrow_edges(edge_drift, arrow_fraction, arrow_rule, arrow_seed)
+        return {'edges': line_segments, 'arrow_edges': arrows,
+                'arrows': self.draw_arrows(ax, edge_pos[arrows], edge_colors[arrows])}
+
+    @_profiled
+    def draw_edge_density(self, ax, dpi=None, max_samples=1 << 22):
+        """
+        Draw edges as a density raster instead of one line per edge
+
+        Every edge is rasterized into a pixel grid covering the axes limits
+        at dpi (see rasterize_segments), adding (1 - drift) to each pixel it
+        crosses. Pixels are coloured by edge_cmap at the weighted mean flow of
+        the edges through them, with opacity growing with log density, so
+        bundles of stable edges stand out where lines would only overdraw.
+        The image sits under the node layer. Time and memory are linear in
+        the number of edges (and their length in pixels), with no artist per
+        edge. Returns the 'edge_density' image.
+        """
+        arrays = self.map_arrays()
+        xy = self.position_array()
+        flow = 1.0 - arrays.edge_drift
+
+        # Square pixels of the requested dpi over the current limits
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+        bbox = ax.get_window_extent()
+        scale = (dpi if dpi is not None else ax.figure.dpi) / ax.figure.dpi
+        units_per_pixel = max((x1 - x0) / max(bbox.width * scale, 1),
+                              (y1 - y0) / max(bbox.height * scale, 1))
+        shape = (max(1, int(np.ceil((y1 - y0) / units_per_pixel))),
+                 max(1, int(np.ceil((x1 - x0) / units_per_pixel))))
+
+        # Accumulate flow and flow-weighted flow, so each pixel keeps its mean flow
+        origin = np.array([x0, y0])
+        density, weighted = self.rasterize_segments(
+            (xy[arrays.edge_src] - origin) / units_per_pixel,
+            (xy[arrays.edge_dst] - origin) / units_per_pixel,
+            np.stack([flow, flow * flow]), shape, max_samples)
+
+        image = np.zeros(shape + (4,))
+        covered = density > 0
+        image[covered] = self.edge_cmap(1.0 - weighted[covered] / density[covered])
+        if covered.any():
+            image[..., 3] = 0.9 * np.log1p(density) / np.log1p(density.max())
+        artist = ax.imshow(image, extent=(x0, x0 + shape[1] * units_per_pixel,
+                                          y0, y0 + shape[0] * units_per_pixel),
+                           origin='lower', interpolation='antialiased', aspect='auto', zorder=1)
+        ax.set_xlim(x0, x1)
+        ax.set_ylim(y0, y1)
+        return {'edge_density': artist}
+
+    @staticmethod
+    def rasterize_segments(start, end, weights, shape, max_samples=1 << 22):
+        """
+        Accumulate weights along line segments into (len(weights), H, W) grids
+
+        start and end are (E, 2) pixel coordinates (x right, y up from the
+        grid's first row); weights is (K, E). Each segment adds its weight
+        once to each pixel it crosses (see segment_samples).
+        """
+        height, width = shape
+        weights = np.asarray(weights, dtype=np.float64)
+        grids = np.zeros((len(weights), height * width))
+        for pixel, segment in RecursiveQKOVMapper.segment_samples(start, end, shape, max_samples):
+            for grid, weight in zip(grids, weights):
+                grid += np.bincount(pixel, weight[segment], height * width)
+        return grids.reshape(len(weights), height, width)
+
+    @staticmethod
+    def segment_samples(start, end, shape, max_samples=1 << 22):
+        """
+        Yield (flat pixel index, segment index) arrays of the pixels that line
+        segments cross inside an (H, W) grid
+
+        Segments are walked DDA-style, one sample per pixel along their major
+        axis. Samples are generated in chunks of at most max_samples (one
+        segment may exceed it), keeping memory flat.
+        """
+        height, width = shape
+        delta = end - start
+        steps = np.ceil(np.abs(delta).max(axis=1, initial=0)).astype(np.int64) + 1
+
+        # Split the segments so each chunk holds about max_samples samples
+        bounds = np.searchsorted(np.cumsum(steps), np.arange(max_samples, steps.sum(), max_samples),
+                                 side='right')
+        bounds = np.unique(np.concatenate([[0], bounds, [len(steps)]]))
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            chunk_steps = steps[first:last]
+
+            # Position along each segment and the per-step increment, repeated per sample
+            segment = np.repeat(np.arange(first, last), chunk_steps)
+            along = np.arange(len(segment)) - np.repeat(np.cumsum(chunk_steps) - chunk_steps,
+                                                        chunk_steps)
+            increment = delta[first:last] / np.maximum(chunk_steps - 1, 1)[:, None]
+            col = np.repeat(start[first:last, 0], chunk_steps) + \
+                  along * np.repeat(increment[:, 0], chunk_steps)
+            row = np.repeat(start[first:last, 1], chunk_steps) + \
+                  along * np.repeat(increment[:, 1], chunk_steps)
+            col = np.floor(col, out=col).astype(np.int64)
+            row = np.floor(row, out=row).astype(np.int64)
+            pixel = row * width + col
+            inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+            if not inside.all():
+                pixel, segment = pixel[inside], segment[inside]
+            yield pixel, segment
+
+    def draw_arrows(self, ax, edge_pos, edge_colors):
+        """Draw arrow heads for the given edge segments as one collection (None if empty)"""
+        from matplotlib.collections import PolyCollection
+
+        if len(edge_pos) == 0:
+            return None
+        return ax.add_collection(PolyCollection(self.arrow_heads(edge_pos),
+                                                facecolors=edge_colors, edgecolors=edge_colors,
+                                                alpha=0.7, zorder=2))
+
+    @staticmethod
+    def select_arrow_edges(edge_drift, arrow_fraction=0.7, arrow_rule='drift', arrow_seed=None):
+        """Return the indices of the edges that get an arrow head"""
+        num_edges = len(edge_drift)
+        if arrow_rule == 'drift':
+            keep = np.argsort(edge_drift, kind='stable')[:int(round(arrow_fraction * num_edges))]
+            return np.sort(keep)
+        if arrow_rule == 'stride':
+            index = np.arange(num_edges)
+            return np.flatnonzero(np.floor((index + 1) * arrow_fraction) >
+                                  np.floor(index * arrow_fraction))
+        if arrow_rule == 'random':
+            rng = np.random.default_rng(arrow_seed)
+            return np.flatnonzero(rng.random(num_edges) < arrow_fraction)
+        raise ValueError(f"Unknown arrow_rule: {arrow_rule!r}")
+
+    @staticmethod
+    def arrow_heads(edge_pos, head_width=0.15, head_length=0.2, offset=0.2):
+        """
+        Return (E, 3, 2) triangles for arrow heads placed 70% along each edge,
+        matching ax.arrow(x, y, dx*offset, dy*offset, head_width, head_length)
+        """
+        start, end = edge_pos[:, 0], edge_pos[:, 1]
+        direction = end - start
+        length = np.hypot(direction[:, 0], direction[:, 1])[:, None]
+        direction = np.divide(direction, length, out=np.zeros_like(direction),
+                              where=length > 0)
+        normal = np.stack([-direction[:, 1], direction[:, 0]], axis=1)
+
+        # Arrow position 70% along the edge; the head sits past the short shaft
+        base = 0.7 * end + 0.3 * start + offset * direction
+        tip = base + head_length * direction
+        return np.stack([tip,
+                         base + 0.5 * head_width * normal,
+                         base - 0.5 * head_width * normal], axis=1)
+
+    @_profiled
     def draw_nodes(self, ax):
         """Draw nodes with glyphs and colors based on entropy"""
+        import matplotlib.patheffects as path_effects
+        from matplotlib.patches import Circle
+
         for node in self.graph.nodes():
             # Get position and metadata
             pos = self.positions[node]
@@ -341,7 +1411,7 @@ class RecursiveQKOVMapper:
             color = self.node_cmap(metadata['attribution_entropy'])
             
             # Draw node
-            node_circle = plt.Circle(pos, np.sqrt(size/np.pi), 
+            node_circle = Circle(pos, np.sqrt(size/np.pi), 
                                    facecolor=color, edgecolor='#333', 
                                    alpha=0.7, zorder=3, linewidth=1)
             ax.add_patch(node_circle)
@@ -366,14 +1436,18 @@ class RecursiveQKOVMapper:
                    color='black', fontsize=7, ha='center', va='center',
                    bbox=dict(facecolor='white', alpha=0.5, pad=1, boxstyle='round'))
     
+    @_profiled
     def overlay_classifier_nodes(self, ax):
         """Overlay classifier inertia nodes marked with ⧖ glyph"""
+        import matplotlib.patheffects as path_effects
+        from matplotlib.patches import Circle
+
         for node in self.graph.nodes():
             if self.graph.nodes[node]['is_classifier']:
                 pos = self.positions[node]
                 
                 # Draw a ring to highlight classifier nodes
-                ring = plt.Circle(pos, 0.5, facecolor='none', 
+                ring = Circle(pos, 0.5, facecolor='none', 
                                 edgecolor='#9C27B0', alpha=0.8, 
                                 linewidth=2, linestyle='--', zorder=5)
                 ax.add_patch(ring)
@@ -393,10 +1467,157 @@ class RecursiveQKOVMapper:
                        color='#9C27B0', fontsize=8, ha='center', va='center',
                        bbox=dict(facecolor='white', alpha=0.7, pad=1, boxstyle='round'))
     
+    # Glyph marker paths shared by all mappers, keyed by glyph character
+    _glyph_markers = {}
+
+    def glyph_marker(self, glyph):
+        """Return a glyph outline as a marker path centered on the origin"""
+        markers = RecursiveQKOVMapper._glyph_markers
+        if glyph not in markers:
+            from matplotlib.path import Path
+            from matplotlib.textpath import TextPath
+
+            text_path = TextPath((0, 0), glyph, size=1)
+            vertices = text_path.vertices.copy()
+            if len(vertices):
+                extents = text_path.get_extents()
+                vertices -= [(extents.x0 + extents.x1) / 2, (extents.y0 + extents.y1) / 2]
+            markers[glyph] = Path(vertices, text_path.codes)
+        return markers[glyph]
+
+    def label_subset(self, ax, xy, priority, label_size, label_budget=None):
+        """
+        Pick the nodes that get a text label: at most one per label-sized cell
+        of the axes pixel grid, highest priority first, capped at label_budget
+        """
+        if len(xy) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Data units per pixel, as the equal-aspect axes will be drawn
+        bbox = ax.get_window_extent()
+        x_range = np.ptp(ax.get_xlim())
+        y_range = np.ptp(ax.get_ylim())
+        units_per_pixel = max(x_range / max(bbox.width, 1), y_range / max(bbox.height, 1))
+
+        # Bin nodes into label-sized cells and keep the best node in each cell
+        cell = np.floor(xy / (np.asarray(label_size) * units_per_pixel)).astype(np.int64)
+        cell_id = (cell[:, 0] - cell[:, 0].min()) * (np.ptp(cell[:, 1]) + 1) + \
+                  (cell[:, 1] - cell[:, 1].min())
+        order = np.lexsort((-priority, cell_id))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = cell_id[order][1:] != cell_id[order][:-1]
+        chosen = order[first]
+
+        # Enforce the explicit budget, keeping the highest priority labels
+        if label_budget is not None and len(chosen) > label_budget:
+            chosen = chosen[np.argsort(-priority[chosen], kind='stable')[:label_budget]]
+        return np.sort(chosen)
+
+    @_profiled
+    def draw_nodes_batched(self, ax, label_budget=None):
+        """
+        Draw nodes, glyphs and entropy labels as collections (see draw_nodes)
+
+        Returns the 'nodes' collection, 'glyphs' as (collection, node ids)
+        per glyph code, and the entropy 'labels' by node id.
+        """
+        from matplotlib.colors import to_rgba
+
+        arrays = self.map_arrays()
+        xy = self.position_array()
+        entropy = arrays.entropy
+
+        # Node size based on level (deeper = smaller), colour based on entropy.
+        # Sizes are scatter-style points^2, so a node's pixel footprint stays
+        # fixed however many nodes share the axes
+        size = np.maximum(300 * (1 - 0.15 * arrays.level), 0)
+        artists = {'glyphs': {}, 'labels': {}}
+        artists['nodes'] = ax.scatter(xy[:, 0], xy[:, 1], s=size, c=self.node_cmap(entropy),
+                                      edgecolors='#333', alpha=0.7, zorder=3, linewidths=1)
+
+        # One marker collection per glyph; fontsize maps to marker size in points
+        glyph_size = 10 + size / 80
+        glyph_color = np.where(entropy[:, None] > 0.5, to_rgba('white'), to_rgba('black'))
+        for code, key in enumerate(GLYPH_KEYS):
+            members = np.flatnonzero(arrays.glyph_code == code)
+            if len(members) == 0:
+                continue
+            glyphs = ax.scatter(xy[members, 0], xy[members, 1], s=glyph_size[members] ** 2,
+                                marker=self.glyph_marker(self.glyphs[key]),
+                                c=glyph_color[members], edgecolors='black', linewidths=0.5,
+                                zorder=4)
+            artists['glyphs'][code] = (glyphs, members)
+
+        # Entropy labels only where there is room for them
+        for node in self.entropy_label_nodes(ax, label_budget):
+            artists['labels'][node] = self.draw_entropy_label(ax, node)
+        return artists
+
+    def entropy_label_nodes(self, ax, label_budget=None):
+        """Node ids that get an entropy label in the batched render mode"""
+        return self.label_subset(ax, self.position_array(), self.map_arrays().entropy,
+                                 (30, 14), label_budget)
+
+    def draw_entropy_label(self, ax, node):
+        """Draw one node's entropy label below it"""
+        x, y = self.position_array()[node]
+        return ax.text(x, y - 0.4, f"{self.map_arrays().entropy[node]:.2f}",
+                       color='black', fontsize=7, ha='center', va='center',
+                       bbox=dict(facecolor='white', alpha=0.5, pad=1, boxstyle='round'))
+
+    @_profiled
+    def overlay_classifier_nodes_batched(self, ax, label_budget=None):
+        """
+        Overlay classifier rings, glyphs and labels as collections (see overlay_classifier_nodes)
+
+        Returns the 'classifier' artists and the node ids of the
+        'classifier_labels'.
+        """
+        arrays = self.map_arrays()
+        classifier_nodes = np.flatnonzero(arrays.is_classifier)
+        artists = {'classifier': [], 'classifier_labels': np.zeros(0, dtype=np.int64)}
+        if len(classifier_nodes) == 0:
+            return artists
+        xy = self.position_array()[classifier_nodes]
+
+        # Draw rings just outside the node discs to highlight classifier nodes
+        size = np.maximum(300 * (1 - 0.15 * arrays.level[classifier_nodes]), 0)
+        artists['classifier'].append(ax.scatter(
+            xy[:, 0], xy[:, 1], s=(np.sqrt(size) + 8) ** 2, facecolors='none',
+            edgecolors='#9C27B0', alpha=0.8, linewidths=2, linestyles='--', zorder=5))
+
+        # Add classifier glyphs as overlay, outlined in white
+        artists['classifier'].append(ax.scatter(
+            xy[:, 0], xy[:, 1] + 0.7, s=14 ** 2,
+            marker=self.glyph_marker(self.glyphs['classifier']), c='#9C27B0',
+            edgecolors='white', linewidths=0.75, zorder=6))
+
+        # Add "Classifier Lock" labels where there is room for them
+        labeled = self.classifier_label_nodes(ax, label_budget)
+        for x, y in self.position_array()[labeled]:
+            artists['classifier'].append(ax.text(
+                x, y + 1.1, "Classifier Lock",
+                color='#9C27B0', fontsize=8, ha='center', va='center',
+                bbox=dict(facecolor='white', alpha=0.7, pad=1, boxstyle='round')))
+        artists['classifier_labels'] = labeled
+        return artists
+
+    def classifier_label_nodes(self, ax, label_budget=None):
+        """Node ids that get a "Classifier Lock" label in the batched render mode"""
+        arrays = self.map_arrays()
+        classifier_nodes = np.flatnonzero(arrays.is_classifier)
+        labeled = self.label_subset(ax, self.position_array()[classifier_nodes],
+                                    arrays.classifier_inertia[classifier_nodes], (80, 40),
+                                    label_budget)
+        return classifier_nodes[labeled]
+
+    @_profiled
     def add_legend(self, ax):
         """Add a legend explaining the visualization elements"""
+        from matplotlib.patches import Rectangle
+
         # Create a legend box
-        legend_box = plt.Rectangle((min(ax.get_xlim())+0.5, max(ax.get_ylim())-5.5), 
+        legend_box = Rectangle((min(ax.get_xlim())+0.5, max(ax.get_ylim())-5.5), 
                                   5, 5, facecolor='white', alpha=0.8, 
                                   edgecolor='#333', linewidth=1, zorder=10)
         ax.add_patch(legend_box)
@@ -461,124 +1682,756 @@ class RecursiveQKOVMapper:
                fontsize=8, ha='center', va='center', 
                bbox=dict(facecolor='#f9f9fe', alpha=0.9, pad=3, boxstyle='round'))
     
-    def create_animation(self, filename='qkov_drift_animation.gif', frames=60, interval=100):
-        """Create an animation showing the pulse of attribution flow"""
-        fig, ax = plt.subplots(figsize=(14, 14), facecolor='#f9f9fe')
-        
+    @_profiled
+    def create_animation(self, filename='qkov_drift_animation.gif', frames=60, interval=100,
+                         render_mode='artists', workers=None, chunk_frames=None, cache=None):
+        """
+        Create an animation showing the pulse of attribution flow
+
+        With workers > 1, frames are rasterized in a process pool, chunk_frames
+        frames per task, and streamed back in order to a single encoder; only
+        a bounded number of chunks is in flight at once. The output is
+        byte-identical to the serial path.
+
+        With a RenderCache, the GIF is served from or stored in the cache.
+        """
+        if frames < 1:
+            raise ValueError("frames must be >= 1")
+        if cache is not None:
+            data = cache.gif(self, frames=frames, interval=interval, render_mode=render_mode,
+                             workers=workers)
+            if hasattr(filename, 'write'):
+                filename.write(data)
+            else:
+                with open(filename, 'wb') as f:
+                    f.write(data)
+            return filename
+
+        if workers is not None and workers > 1:
+            images = self.parallel_animation_frames(frames, render_mode, workers, chunk_frames)
+        else:
+            images = self.animation_frames(frames, render_mode)
+
+        # Encode frames in order as they arrive; each is shown for interval ms
+        # (frames are produced lazily, so their spans nest inside the encode span)
+        with self.span('encode_gif', frames=frames):
+            first = next(images)
+            first.save(filename, format='GIF', save_all=True, append_images=images,
+                       duration=interval, loop=0)
+        return filename
+
+    def animation_frames(self, frames, render_mode='artists'):
+        """Yield palette-quantized animation frames rendered in this process"""
+        with self.span('PulseFrameRenderer.__init__', frames=frames):
+            renderer = PulseFrameRenderer(self, frames, render_mode=render_mode)
+        palette = renderer.palette()
+        for frame in range(frames):
+            with self.span('animation_frame', frame=frame):
+                image = renderer.quantize(renderer.render(frame), palette)
+            yield image
+
+    def parallel_animation_frames(self, frames, render_mode='artists', workers=2,
+                                  chunk_frames=None):
+        """Yield palette-quantized animation frames rendered by a process pool"""
+        if chunk_frames is None:
+            chunk_frames = max(1, frames // (4 * workers))
+        chunks = [(start, min(start + chunk_frames, frames))
+                  for start in range(0, frames, chunk_frames)]
+
+        # Lay out once here so the workers receive the positions with the mapper
+        self.position_array()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_frame_worker,
+                                 initargs=(self, frames, render_mode)) as pool:
+            # The palette comes from the same sample frames the serial path uses
+            samples = pool.submit(_render_frames, PulseFrameRenderer.palette_frames(frames))
+            palette = PulseFrameRenderer.palette_from_frames(samples.result())
+
+            for images in bounded_map(pool, _quantize_frames,
+                                      ((start, stop, palette) for start, stop in chunks), workers):
+                yield from images
+
+    @_profiled
+    def canvas_map_data(self, frames=60, interval=100):
+        """Pack the map into base64 little-endian typed arrays for the canvas renderer"""
+        arrays = self.map_arrays()
+        lut = np.linspace(0, 1, 256)
+
+        def pack(values, dtype):
+            return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+        return {
+            'positions': pack(self.position_array(), '<f4'),
+            'level': pack(arrays.level, '<u2'),
+            'entropy': pack(arrays.entropy, '<f4'),
+            'glyph': pack(arrays.glyph_code, 'u1'),
+            'classifier': pack(arrays.is_classifier, 'u1'),
+            'inertia': pack(arrays.classifier_inertia, '<f4'),
+            'edge_src': pack(arrays.edge_src, '<u4'),
+            'edge_dst': pack(arrays.edge_dst, '<u4'),
+            'edge_drift': pack(arrays.edge_drift, '<f4'),
+            'edge_phase': pack(self.edge_phase(arrays), '<f4'),
+            'arrow': pack(np.isin(np.arange(arrays.num_edges),
+                                  self.select_arrow_edges(arrays.edge_drift)), 'u1'),
+            'node_lut': pack(np.rint(self.node_cmap(lut)[:, :3] * 255), 'u1'),
+            'edge_lut': pack(np.rint(self.edge_cmap(lut)[:, :3] * 255), 'u1'),
+            'glyphs': [self.glyphs[key] for key in GLYPH_KEYS],
+            'classifier_glyph': self.glyphs['classifier'],
+            'frames': frames,
+            'interval': interval,
+            'size': 1100,
+            'figsize': 14,
+        }
+
+    def canvas_map_script(self, frames=60, interval=100):
+        """Return the data block and renderer script for output_mode='canvas'"""
+        data = json.dumps(self.canvas_map_data(frames=frames, interval=interval))
+        return ('\n<script type="application/json" id="drift-map-data">' + data + '</script>\n' +
+                '<script>' + _CANVAS_RENDERER_JS + '</script>')
+
+    @staticmethod
+    def edge_phase(arrays):
+        """Pulse phase of every edge, based on its source node's level and position"""
+        src = arrays.edge_src
+        return (arrays.level[src] + arrays.position[src]) / 10
+
+    @staticmethod
+    def edge_pulse_alpha(phase, edge_drift, frame, frames):
+        """Edge alpha for one animation frame"""
+        # Alpha oscillates between 0.2 and 0.9 based on frame
+        alpha = 0.2 + 0.7 * (0.5 + 0.5 * np.sin(2 * np.pi * (frame / frames + phase)))
+
+        # Reduce alpha for high drift paths
+        return alpha * (1.0 - 0.7 * edge_drift)
+
+    @_profiled
+    def generate_html_output(self, render_mode='artists', workers=None, output_mode='images',
+                             frames=60, interval=100, cache=None):
+        """Generate HTML output with both static visualization and animation"""
+        if cache is not None:
+            return cache.html(self, render_mode=render_mode, workers=workers,
+                              output_mode=output_mode, frames=frames, interval=interval)
+
+        html = io.StringIO()
+        self.write_html_output(html, render_mode=render_mode, workers=workers,
+                               output_mode=output_mode, frames=frames, interval=interval)
+        return html.getvalue()
+
+    @_profiled
+    def write_html_output(self, stream, animation_buffer=None, render_mode='artists',
+                          workers=None, output_mode='images', frames=60, interval=100):
+        """
+        Write the HTML document to a text or binary file-like object in chunks
+
+        The static image and the animation are encoded into memory (or into
+        animation_buffer, any seekable binary stream such as a
+        SpooledTemporaryFile) and base64-encoded chunk by chunk, so no files
+        are written and concurrent calls do not share any state.
+
+        output_mode='canvas' embeds the map data as packed typed arrays and a
+        small canvas renderer instead of a PNG and a GIF; the browser draws
+        the map (nodes as in render_mode='batched') and runs the pulse
+        animation with the same formula as edge_pulse_alpha.
+        """
+        write = _chunk_writer(stream)
+        write(_HTML_HEAD)
+        if output_mode == 'canvas':
+            write('<canvas id="static-map" class="drift-map" width="1100" height="1100"></canvas>')
+            write(_HTML_BETWEEN_TABS)
+            write('<canvas id="animated-map" class="drift-map" width="1100" height="1100"></canvas>')
+            write(self.canvas_map_script(frames=frames, interval=interval))
+            write(_HTML_TAIL)
+            return stream
+
+        # Create static visualization on a headless figure and stream it as base64
+        static_img_data = io.BytesIO(self.render_png(figsize=(12, 12), dpi=None,
+                                                     render_mode=render_mode))
+        write('<img src="data:image/png;base64,')
+        with self.span('base64', image='png'):
+            _write_base64(write, static_img_data)
+        write('" alt="Recursive QKOV Attribution Map" style="max-width:100%;">')
+        del static_img_data
+
+        write(_HTML_BETWEEN_TABS)
+
+        # Create animation and stream it as base64
+        if animation_buffer is None:
+            animation_buffer = io.BytesIO()
+        self.create_animation(filename=animation_buffer, frames=frames, interval=interval,
+                              render_mode=render_mode, workers=workers)
+        write('<img src="data:image/gif;base64,')
+        with self.span('base64', image='gif'):
+            _write_base64(write, animation_buffer)
+        write('" alt="QKOV Attribution Animation" style="max-width:100%;">')
+
+        write(_HTML_TAIL)
+        return stream
+
+
+class PulseFrameRenderer:
+    """
+    Renders create_animation frames at a constant cost per frame: everything
+    except the edges is rasterized once into a background and an overlay
+    layer, and each frame only redraws one LineCollection whose alpha
+    channel is updated in place.
+    """
+
+    def __init__(self, mapper, frames, render_mode='artists', figsize=(14, 14), dpi=100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+
+        # Spans of the mapper's profiler, if any, cover frame rendering too
+        self.profiler = mapper.profiler
+        self.frames = frames
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor='#f9f9fe')
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+
         # Set up initial plot similar to the static visualization
-        all_xs = [pos[0] for pos in self.positions.values()]
-        all_ys = [pos[1] for pos in self.positions.values()]
-        x_margin = (max(all_xs) - min(all_xs)) * 0.15
-        y_margin = (max(all_ys) - min(all_ys)) * 0.15
-        
-        ax.set_xlim(min(all_xs) - x_margin, max(all_xs) + x_margin)
-        ax.set_ylim(min(all_ys) - y_margin, max(all_ys) + y_margin)
-        
-        # Make it look clean
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.set_aspect('equal')
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        
+        xy = mapper.position_array()
+        mapper.set_map_limits(ax, xy)
+        mapper.clean_axes(ax)
+
         # Add title
-        ax.set_title('Recursive QKOV Attribution Drift Map\nSymbolic Loopback Density Animation', 
+        ax.set_title('Recursive QKOV Attribution Drift Map\nSymbolic Loopback Density Animation',
                      fontsize=16, fontweight='bold', pad=20)
-        
+
         # Plot static elements
-        self.draw_nodes(ax)
-        self.overlay_classifier_nodes(ax)
-        self.add_legend(ax)
-        
-        # Create line segments for animation
-        edge_pos = [(self.positions[u], self.positions[v]) for u, v in self.graph.edges()]
-        lines = []
-        
-        for i, ((x1, y1), (x2, y2)) in enumerate(edge_pos):
-            u, v = list(self.graph.edges())[i]
-            drift = self.graph.edges[u, v]['drift']
-            color = self.edge_cmap(1.0 - drift)
-            width = 1.5 * (1.0 - drift) + 0.5
-            
-            line, = ax.plot([x1, x2], [y1, y2], color=color, linewidth=width, alpha=0)
-            lines.append(line)
-        
-        # Animation update function
-        def update(frame):
-            # Calculate phase for each line based on position in graph
-            for i, ((x1, y1), (x2, y2)) in enumerate(edge_pos):
-                u, v = list(self.graph.edges())[i]
-                drift = self.graph.edges[u, v]['drift']
-                
-                # Phase based on source node level and position
-                phase = (self.graph.nodes[u]['level'] + self.graph.nodes[u]['position']) / 10
-                
-                # Alpha oscillates between 0.2 and 0.9 based on frame
-                alpha = 0.2 + 0.7 * (0.5 + 0.5 * np.sin(2 * np.pi * (frame / frames + phase)))
-                
-                # Reduce alpha for high drift paths
-                alpha *= (1.0 - 0.7 * drift)
-                
-                lines[i].set_alpha(alpha)
-            
-            return lines
-        
-        # Create animation
-        anim = animation.FuncAnimation(fig, update, frames=frames, interval=interval, blit=True)
-        
-        # Save animation
-        anim.save(filename, writer='pillow', fps=10, dpi=100)
-        
-        plt.close(fig)
-        return filename
-        
-    def generate_html_output(self):
-        """Generate HTML output with both static visualization and animation"""
-        # Create static visualization
-        fig = self.visualize(figsize=(12, 12))
-        
-        # Save static visualization to base64
-        static_img_data = io.BytesIO()
-        fig.savefig(static_img_data, format='png', bbox_inches='tight')
-        static_img_data.seek(0)
-        static_img_b64 = base64.b64encode(static_img_data.read()).decode('utf-8')
-        
-        # Create animation and save to base64
-        animation_filename = 'qkov_drift_animation.gif'
-        self.create_animation(filename=animation_filename)
-        
-        with open(animation_filename, 'rb') as f:
-            animation_b64 = base64.b64encode(f.read()).decode('utf-8')
-        
-        # Create HTML with both visualizations
-        html = f"""
+        if render_mode == 'batched':
+            mapper.draw_nodes_batched(ax)
+            mapper.overlay_classifier_nodes_batched(ax)
+        else:
+            mapper.draw_nodes(ax)
+            mapper.overlay_classifier_nodes(ax)
+        mapper.add_legend(ax)
+
+        # Precompute everything the frames need: one collection, phase and drift arrays
+        arrays = mapper.map_arrays()
+        self.edge_drift = arrays.edge_drift
+        self.phase = mapper.edge_phase(arrays)
+        self.colors = mapper.edge_cmap(1.0 - self.edge_drift)
+        self.lines = LineCollection(np.stack([xy[arrays.edge_src], xy[arrays.edge_dst]], axis=1),
+                                    linewidths=1.5 * (1.0 - self.edge_drift) + 0.5,
+                                    colors=self.colors)
+        ax.add_collection(self.lines)
+        self.ax = ax
+        self.rasterize_static_layers()
+
+    @_profiled
+    def rasterize_static_layers(self):
+        """Draw the artists below and above the edge layer once"""
+        children = [artist for artist in self.ax.get_children() if artist is not self.lines]
+        above = [artist for artist in children
+                 if artist.get_zorder() > self.lines.get_zorder()]
+        visible = {artist: artist.get_visible() for artist in children}
+
+        # Everything under the edges (including the backgrounds) is restored every frame
+        self.lines.set_visible(False)
+        for artist in above:
+            artist.set_visible(False)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+        # Everything over the edges is composited on top as straight-alpha RGBA
+        for artist in children:
+            artist.set_visible(visible[artist] and artist in above)
+        self.figure.patch.set_visible(False)
+        self.canvas.draw()
+        overlay = np.asarray(self.canvas.buffer_rgba()).astype(np.float32) / 255
+        self.overlay_alpha = overlay[..., 3:]
+        self.overlay_rgb = overlay[..., :3] * self.overlay_alpha * 255
+
+        # Restore the figure for frame drawing
+        self.figure.patch.set_visible(True)
+        for artist, was_visible in visible.items():
+            artist.set_visible(was_visible)
+        self.lines.set_visible(True)
+
+    @staticmethod
+    def palette_frames(frames, samples=2):
+        """Frame numbers sampled to build the palette"""
+        return np.linspace(0, frames, samples, endpoint=False).astype(int).tolist()
+
+    @staticmethod
+    def palette_from_frames(rgb_frames):
+        """Build a 256-colour palette image from rendered frames"""
+        from PIL import Image
+
+        mosaic = Image.fromarray(np.concatenate(rgb_frames))
+        palette = Image.new('P', (1, 1))
+        palette.putpalette(mosaic.quantize(method=Image.Quantize.MAXCOVERAGE).getpalette())
+        return palette
+
+    @_profiled
+    def palette(self):
+        """Build the palette for this animation from evenly spaced frames"""
+        return self.palette_from_frames([self.render(frame)
+                                         for frame in self.palette_frames(self.frames)])
+
+    @staticmethod
+    def quantize(rgb, palette):
+        """Map an RGB frame onto the animation palette"""
+        from PIL import Image
+
+        return Image.fromarray(rgb).quantize(palette=palette, dither=Image.Dither.NONE)
+
+    @_profiled
+    def render(self, frame):
+        """Return frame as an (H, W, 3) uint8 RGB array"""
+        self.colors[:, 3] = RecursiveQKOVMapper.edge_pulse_alpha(
+            self.phase, self.edge_drift, frame, self.frames)
+        self.lines.set_color(self.colors)
+
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.lines)
+        rgb = np.asarray(self.canvas.buffer_rgba())[..., :3]
+        composited = rgb * (1 - self.overlay_alpha) + self.overlay_rgb
+        return np.rint(composited).astype(np.uint8)
+
+
+class LiveDriftView:
+    """
+    A batched drift map on a headless Agg canvas that follows live updates
+
+    The mutation methods mirror the mapper's. Metric updates change only the
+    colours, widths and labels of the affected nodes and edges and re-render
+    only the pixel tiles around them, giving the same pixels as a fresh
+    view of the updated map; adding or removing nodes or edges redraws the
+    whole map.
+    """
+
+    # Dirty-region tile size in pixels, and the most boxes re-rendered per update
+    tile = 64
+    max_boxes = 4
+
+    def __init__(self, mapper, figsize=(14, 14), dpi=100, show_legend=True, label_budget=None):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.mapper = mapper
+        self.show_legend = show_legend
+        self.label_budget = label_budget
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor='#f9f9fe')
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+
+        # Room around a changed node for its ring, glyph and labels
+        self.pad = 36 * dpi / 72
+        self.redraw()
+
+    def redraw(self):
+        """Draw the whole map and keep handles to its data artists"""
+        self.ax.clear()
+        self.artists = self.mapper.draw_map(self.ax, show_legend=self.show_legend,
+                                            render_mode='batched', label_budget=self.label_budget)
+        arrays = self.mapper.map_arrays()
+        self.xy = self.mapper.position_array()
+        self.is_classifier = arrays.is_classifier.copy()
+
+        # Colours and widths the collections were drawn with, updated per change
+        self.node_colors = self.mapper.node_cmap(arrays.entropy)
+        self.edge_colors = self.mapper.edge_cmap(1.0 - arrays.edge_drift)
+        self.edge_widths = 1.5 * (1.0 - arrays.edge_drift) + 0.5
+        self.glyph_colors = {code: collection.get_facecolor().copy()
+                             for code, (collection, _) in self.artists['glyphs'].items()}
+        self.arrow_slot = np.full(arrays.num_edges, -1, dtype=np.int64)
+        self.arrow_slot[self.artists['arrow_edges']] = np.arange(len(self.artists['arrow_edges']))
+
+        # Keep an empty background (figure and axes patches) to restore under dirty tiles
+        children = [artist for artist in self.ax.get_children() if artist is not self.ax.patch]
+        visible = [artist.get_visible() for artist in children]
+        for artist in children:
+            artist.set_visible(False)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for artist, was_visible in zip(children, visible):
+            artist.set_visible(was_visible)
+        self.canvas.draw()
+
+        # Draw order within a zorder; rebuilt overlays take the place of the ones they
+        # replace, and entropy labels share out the ranks between the glyphs and overlays
+        self.order = {artist: rank for rank, artist in enumerate(children)}
+        label_ranks = [self.order[label] for label in self.artists['labels'].values()]
+        if label_ranks:
+            self.label_ranks = (min(label_ranks), max(label_ranks) + 1)
+        else:
+            last = max([self.order[self.artists['nodes']]] +
+                       [self.order[glyphs] for glyphs, _ in self.artists['glyphs'].values()])
+            self.label_ranks = (last + 0.25, last + 0.75)
+
+        # Pixel extents of every text (updated as labels change) and of every
+        # element of the large collections
+        self.text_extents = {}
+        self.element_extents = {}
+        for artist in children:
+            self.index_text(artist)
+            self.index_collection(artist)
+
+    def index_text(self, artist):
+        """Record the pixel extent of a text, with its bbox patch and a margin"""
+        from matplotlib.text import Text
+        from matplotlib.transforms import Bbox
+
+        if not isinstance(artist, Text):
+            return
+        renderer = self.canvas.get_renderer()
+        extents = [artist.get_window_extent(renderer)]
+        margin = 2
+        patch = artist.get_bbox_patch()
+        if patch is not None:
+            # The patch follows the text only when drawn; the outline is
+            # stroked (and antialiased) outside its extent
+            artist.update_bbox_position_size(renderer)
+            extents.append(patch.get_window_extent(renderer))
+            margin += patch.get_linewidth() * self.figure.dpi / 72
+        self.text_extents[artist] = Bbox.union(extents).padded(margin)
+
+    def index_collection(self, artist):
+        """Record the pixel extents (x0, y0, x1, y1) of each element of a collection"""
+        from matplotlib.collections import Collection
+
+        if not isinstance(artist, Collection):
+            return
+        offsets = artist.get_offsets()
+        paths = artist.get_paths()
+        margin = np.max(artist.get_linewidth(), initial=0) * self.figure.dpi / 72 + 2
+        if len(offsets) > 1:
+            # Markers: centre plus half the marker size (sizes are points^2)
+            centers = artist.get_offset_transform().transform(offsets)
+            radius = (np.sqrt(np.broadcast_to(artist.get_sizes(), (len(offsets),))) / 2 *
+                      self.figure.dpi / 72 + margin)[:, None]
+            self.element_extents[artist] = np.hstack([centers - radius, centers + radius])
+        elif len(paths) > 1:
+            transform = artist.get_transform()
+            lengths = {len(path.vertices) for path in paths}
+            if len(lengths) == 1:
+                vertices = np.array([path.vertices for path in paths])
+                pixels = transform.transform(vertices.reshape(-1, 2)).reshape(vertices.shape)
+                low, high = pixels.min(axis=1), pixels.max(axis=1)
+            else:
+                pixels = [transform.transform(path.vertices) for path in paths]
+                low = np.array([p.min(axis=0) for p in pixels])
+                high = np.array([p.max(axis=0) for p in pixels])
+            self.element_extents[artist] = np.hstack([low - margin, high + margin])
+
+    @staticmethod
+    def collection_subset(collection, members):
+        """A copy of collection holding only the given elements, for clipped redraws"""
+        subset = copy.copy(collection)
+        count = max(len(collection.get_offsets()), len(collection.get_paths()))
+        if len(collection.get_offsets()) == count:
+            subset.set_offsets(collection.get_offsets()[members])
+        paths = collection.get_paths()
+        if len(paths) == count:
+            subset._paths = [paths[i] for i in members]
+        if hasattr(collection, 'get_sizes') and len(collection.get_sizes()) == count:
+            subset.set_sizes(collection.get_sizes()[members])
+        for getter, setter in (('get_facecolor', 'set_facecolor'),
+                               ('get_edgecolor', 'set_edgecolor'),
+                               ('get_linewidth', 'set_linewidth')):
+            values = np.asarray(getattr(collection, getter)())
+            if len(values) == count:
+                getattr(subset, setter)(values[members])
+        return subset
+
+    def refresh(self, nodes=(), edges=()):
+        """Update the artists of changed nodes and edges and re-render around them"""
+        from matplotlib.colors import to_rgba
+
+        arrays = self.mapper.map_arrays()
+        nodes = np.asarray(nodes, dtype=np.int64)
+        edges = np.asarray(edges, dtype=np.int64)
+
+        # Node colours, glyph colours and entropy labels
+        entropy = arrays.entropy[nodes]
+        self.node_colors[nodes] = self.mapper.node_cmap(entropy)
+        self.artists['nodes'].set_facecolor(self.node_colors)
+        glyph_color = np.where(entropy[:, None] > 0.5, to_rgba('white'), to_rgba('black'))
+        for code, (collection, members) in self.artists['glyphs'].items():
+            slot = np.minimum(np.searchsorted(members, nodes), len(members) - 1)
+            hit = members[slot] == nodes
+            if hit.any():
+                self.glyph_colors[code][slot[hit]] = glyph_color[hit]
+                collection.set_facecolor(self.glyph_colors[code])
+        labels = self.artists['labels']
+        for node in nodes:
+            label = labels.get(node)
+            if label is not None:
+                label.set_text(f"{arrays.entropy[node]:.2f}")
+                self.index_text(label)
+
+        # Each label cell shows its highest-entropy node, so a change can move a
+        # label to a neighbour; both nodes are redrawn
+        dirty_nodes = [nodes]
+        labeled = self.mapper.entropy_label_nodes(self.ax, self.label_budget)
+        moved = np.setxor1d(labeled, np.fromiter(labels, dtype=np.int64, count=len(labels)))
+        if len(moved):
+            for node in moved:
+                if node in labels:
+                    label = labels.pop(node)
+                    self.order.pop(label)
+                    self.text_extents.pop(label)
+                    label.remove()
+                else:
+                    labels[node] = self.mapper.draw_entropy_label(self.ax, node)
+                    self.index_text(labels[node])
+            low, high = self.label_ranks
+            for i, node in enumerate(labeled):
+                self.order[labels[node]] = low + i * (high - low) / len(labeled)
+            dirty_nodes.append(moved)
+
+        # Edge colours and widths, and the arrow heads drawn on those edges
+        edge_drift = arrays.edge_drift[edges]
+        self.edge_colors[edges] = self.mapper.edge_cmap(1.0 - edge_drift)
+        self.edge_widths[edges] = 1.5 * (1.0 - edge_drift) + 0.5
+        self.artists['edges'].set_color(self.edge_colors)
+        self.artists['edges'].set_linewidths(self.edge_widths)
+
+        # Arrows go to the lowest-drift edges, so a drift change can move a few
+        # arrows elsewhere; those edges are redrawn too
+        old_arrows = self.artists['arrow_edges']
+        arrow_edges = self.mapper.select_arrow_edges(
+            arrays.edge_drift, arrow_seed=self.mapper.seed_sequences['arrows'])
+        if not np.array_equal(arrow_edges, old_arrows):
+            rank = self.order.pop(self.artists['arrows'], None)
+            if self.artists['arrows'] is not None:
+                self.element_extents.pop(self.artists['arrows'], None)
+                self.artists['arrows'].remove()
+            edge_pos = np.stack([self.xy[arrays.edge_sources(arrow_edges)],
+                                 self.xy[arrays.indices[arrow_edges]]], axis=1)
+            self.artists['arrows'] = self.mapper.draw_arrows(self.ax, edge_pos,
+                                                             self.edge_colors[arrow_edges])
+            if self.artists['arrows'] is not None:
+                self.order[self.artists['arrows']] = len(self.order) if rank is None else rank
+                self.index_collection(self.artists['arrows'])
+            self.artists['arrow_edges'] = arrow_edges
+            self.arrow_slot[:] = -1
+            self.arrow_slot[arrow_edges] = np.arange(len(arrow_edges))
+            edges = np.union1d(edges, np.setxor1d(arrow_edges, old_arrows))
+        elif self.artists['arrows'] is not None and (self.arrow_slot[edges] >= 0).any():
+            slot = self.arrow_slot[edges]
+            arrow_colors = self.artists['arrows'].get_facecolor().copy()
+            arrow_colors[slot[slot >= 0]] = self.edge_colors[edges[slot >= 0]]
+            self.artists['arrows'].set_facecolor(arrow_colors)
+            self.artists['arrows'].set_edgecolor(arrow_colors)
+
+        # Classifier overlays follow the classifier flags and labels; labels that
+        # moved are dirty too
+        old_labels = self.artists['classifier_labels']
+        if ((arrays.is_classifier[nodes] != self.is_classifier[nodes]).any() or
+                not np.array_equal(self.mapper.classifier_label_nodes(self.ax, self.label_budget),
+                                   old_labels)):
+            rank = min((self.order.pop(artist) for artist in self.artists['classifier']),
+                       default=len(self.order))
+            for artist in self.artists['classifier']:
+                self.element_extents.pop(artist, None)
+                self.text_extents.pop(artist, None)
+                artist.remove()
+            self.artists.update(self.mapper.overlay_classifier_nodes_batched(
+                self.ax, label_budget=self.label_budget))
+            for offset, artist in enumerate(self.artists['classifier']):
+                self.order[artist] = rank + offset / len(self.artists['classifier'])
+                self.index_text(artist)
+                self.index_collection(artist)
+            self.is_classifier[nodes] = arrays.is_classifier[nodes]
+            dirty_nodes.append(np.setxor1d(old_labels, self.artists['classifier_labels']))
+
+        boxes = self.dirty_boxes(np.concatenate(dirty_nodes), edges)
+        self.redraw_region(boxes)
+        return boxes
+
+    def dirty_boxes(self, nodes, edges):
+        """
+        Pixel boxes (x0, y0, x1, y1) covering the changed nodes (with their
+        overlays and labels) and edges, as runs of dirty tiles per tile row
+        """
+        arrays = self.mapper.map_arrays()
+        points = [self.xy[nodes], self.xy[nodes] + (0, 1.1), self.xy[nodes] - (0, 0.4)]
+
+        # Sample edges at half-tile spacing so every tile they cross is hit
+        src = self.ax.transData.transform(self.xy[arrays.edge_sources(edges)])
+        dst = self.ax.transData.transform(self.xy[arrays.indices[edges]])
+        samples = np.ceil(np.hypot(*(dst - src).T) / (self.tile / 2)).astype(np.int64) + 1
+        edge_id = np.repeat(np.arange(len(edges)), samples)
+        t = (np.arange(samples.sum()) - np.repeat(np.cumsum(samples) - samples, samples)) / \
+            np.repeat(np.maximum(samples - 1, 1), samples)
+        pixels = np.concatenate([self.ax.transData.transform(np.concatenate(points)),
+                                 src[edge_id] + t[:, None] * (dst - src)[edge_id]])
+        if len(pixels) == 0:
+            return []
+
+        # Every tile within pad pixels of a changed point
+        low = np.floor((pixels - self.pad) / self.tile).astype(np.int64)
+        high = np.floor((pixels + self.pad) / self.tile).astype(np.int64)
+        span = int((high - low).max()) + 1
+        tiles = np.concatenate([np.stack([low[:, 0] + dx, low[:, 1] + dy], axis=1)
+                                [(low[:, 0] + dx <= high[:, 0]) & (low[:, 1] + dy <= high[:, 1])]
+                                for dx in range(span) for dy in range(span)])
+        width, height = self.figure.bbox.width, self.figure.bbox.height
+        columns = int(np.ceil(width / self.tile))
+        inside = ((tiles >= 0).all(axis=1) & (tiles[:, 0] < columns) &
+                  (tiles[:, 1] < np.ceil(height / self.tile)))
+        tile_id = np.unique(tiles[inside, 1] * columns + tiles[inside, 0])
+
+        # Merge horizontally adjacent tiles into runs, then stack runs that
+        # cover the same columns in consecutive rows
+        row, column = np.divmod(tile_id, columns)
+        starts = np.flatnonzero(np.diff(tile_id, prepend=-2) != 1)
+        ends = np.append(starts[1:], len(tile_id)) - 1
+        boxes = []
+        for x0, x1, y0 in sorted(zip(column[starts], column[ends] + 1, row[starts])):
+            if boxes and boxes[-1][0] == x0 and boxes[-1][2] == x1 and boxes[-1][3] == y0:
+                boxes[-1][3] = y0 + 1
+            else:
+                boxes.append([x0, y0, x1, y0 + 1])
+
+        # Every box re-renders every artist, so merge the pair of boxes whose
+        # union adds the least area until few enough are left
+        def area(box):
+            return (box[2] - box[0]) * (box[3] - box[1])
+
+        def union(a, b):
+            return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+        while len(boxes) > self.max_boxes:
+            _, i, j = min((area(union(a, b)) - area(a) - area(b), i, j)
+                          for i, a in enumerate(boxes) for j, b in enumerate(boxes) if i < j)
+            boxes[i] = union(boxes[i], boxes.pop(j))
+        return [(int(x0) * self.tile, int(y0) * self.tile,
+                 min(int(x1) * self.tile, width), min(int(y1) * self.tile, height))
+                for x0, y0, x1, y1 in boxes]
+
+    def redraw_region(self, boxes):
+        """
+        Re-render only the given pixel boxes, pixel for pixel as a full draw
+
+        The boxes get the background back, then every element that reaches
+        one is drawn with its usual clipping (a tighter clip box would clip
+        line geometry and shift antialiasing); pixels outside the boxes are
+        then put back from a copy of the canvas taken before.
+        """
+        from matplotlib.transforms import Bbox
+
+        if not len(boxes):
+            return
+        renderer = self.canvas.get_renderer()
+        artists = sorted((artist for artist in self.ax.get_children()
+                          if artist is not self.ax.patch and artist.get_visible()),
+                         key=lambda artist: (artist.get_zorder(), self.order.get(artist, 0)))
+        height = self.figure.bbox.height
+        saved = self.canvas.copy_from_bbox(self.figure.bbox)
+        for x0, y0, x1, y1 in boxes:
+            # restore_region takes inclusive buffer coordinates, rows counted from the top
+            self.canvas.restore_region(self.background, xy=(0, 0),
+                                       bbox=(x0, height - y1, x1 - 1, height - y0 - 1))
+        clips = [Bbox([[x0, y0], [x1, y1]]) for x0, y0, x1, y1 in boxes]
+        box_array = np.array(boxes, dtype=np.float64)
+
+        for artist in artists:
+            # Texts that reach no box are skipped
+            extent = self.text_extents.get(artist)
+            if extent is not None and not any(extent.overlaps(clip) for clip in clips):
+                continue
+
+            # Large collections only draw the elements that reach a box
+            extents = self.element_extents.get(artist)
+            if extents is not None:
+                reach = ((extents[:, None, 0] < box_array[None, :, 2]) &
+                         (extents[:, None, 2] > box_array[None, :, 0]) &
+                         (extents[:, None, 1] < box_array[None, :, 3]) &
+                         (extents[:, None, 3] > box_array[None, :, 1]))
+                members = np.flatnonzero(reach.any(axis=1))
+                if len(members) == 0:
+                    continue
+                if len(members) == 1:
+                    # A single element would be drawn by matplotlib's
+                    # single-marker path, which rasterizes slightly
+                    # differently; add a neighbour, whose pixels outside
+                    # the boxes are put back below
+                    members = np.array([members[0] - 1, members[0]]) if members[0] \
+                        else np.array([0, 1])
+                if len(members) < len(extents):
+                    artist = self.collection_subset(artist, members)
+            artist.draw(renderer)
+
+        # Keep the redrawn boxes, put everything else back
+        regions = [self.canvas.copy_from_bbox(clip) for clip in clips]
+        self.canvas.restore_region(saved)
+        for region in regions:
+            self.canvas.restore_region(region)
+
+    def rgb(self):
+        """Return the current canvas as an (H, W, 3) uint8 RGB array"""
+        return np.asarray(self.canvas.buffer_rgba())[..., :3].copy()
+
+    def png(self):
+        """Return the current canvas as PNG bytes"""
+        from PIL import Image
+
+        png = io.BytesIO()
+        Image.fromarray(np.asarray(self.canvas.buffer_rgba())).save(png, format='PNG')
+        return png.getvalue()
+
+    def update_node_metrics(self, nodes, entropy=None, loopback_density=None,
+                            classifier_inertia=None):
+        """RecursiveQKOVMapper.update_node_metrics, re-rendering only what changed"""
+        nodes, edges = self.mapper.update_node_metrics(nodes, entropy, loopback_density,
+                                                       classifier_inertia)
+        self.refresh(nodes, edges)
+        return nodes, edges
+
+    def add_nodes(self, level, entropy, loopback_density=None, classifier_inertia=None):
+        """RecursiveQKOVMapper.add_nodes, then a full redraw"""
+        nodes = self.mapper.add_nodes(level, entropy, loopback_density, classifier_inertia)
+        self.redraw()
+        return nodes
+
+    def remove_nodes(self, nodes):
+        """RecursiveQKOVMapper.remove_nodes, then a full redraw"""
+        remap = self.mapper.remove_nodes(nodes)
+        self.redraw()
+        return remap
+
+    def add_edges(self, src, dst, weight=None):
+        """RecursiveQKOVMapper.add_edges, then a full redraw"""
+        edges = self.mapper.add_edges(src, dst, weight)
+        self.redraw()
+        return edges
+
+    def remove_edges(self, src, dst):
+        """RecursiveQKOVMapper.remove_edges, then a full redraw"""
+        removed = self.mapper.remove_edges(src, dst)
+        self.redraw()
+        return removed
+
+
+# HTML document around the base64 static image and animation
+_HTML_HEAD = """
         <!DOCTYPE html>
         <html>
         <head>
             <title>Recursive QKOV Attribution Drift Map</title>
             <style>
-                body {{ font-family: 'Arial', sans-serif; background-color: #f9f9fe; margin: 0; padding: 20px; }}
-                .container {{ max-width: 1200px; margin: 0 auto; background-color: white; padding: 20px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }}
-                h1 {{ color: #333; text-align: center; margin-bottom: 30px; }}
-                .visualization {{ margin-bottom: 30px; text-align: center; }}
-                .code {{ font-family: 'Courier New', monospace; background: #f5f5f5; padding: 15px; border-radius: 5px; overflow-x: auto; }}
-                .glyph-legend {{ display: flex; justify-content: center; margin: 20px 0; }}
-                .glyph-item {{ margin: 0 15px; text-align: center; }}
-                .glyph {{ font-size: 24px; margin-bottom: 5px; }}
-                .description {{ font-size: 12px; color: #666; }}
-                .tabs {{ display: flex; margin-bottom: 20px; }}
-                .tab {{ padding: 10px 20px; cursor: pointer; background: #eee; margin-right: 5px; }}
-                .tab.active {{ background: #4285F4; color: white; }}
-                .tab-content {{ display: none; }}
-                .tab-content.active {{ display: block; }}
+                body { font-family: 'Arial', sans-serif; background-color: #f9f9fe; margin: 0; padding: 20px; }
+                .container { max-width: 1200px; margin: 0 auto; background-color: white; padding: 20px; box-shadow: 0 0 10px rgba(0,0,0,0.1); }
+                h1 { color: #333; text-align: center; margin-bottom: 30px; }
+                .visualization { margin-bottom: 30px; text-align: center; }
+                .code { font-family: 'Courier New', monospace; background: #f5f5f5; padding: 15px; border-radius: 5px; overflow-x: auto; }
+                .glyph-legend { display: flex; justify-content: center; margin: 20px 0; }
+                .glyph-item { margin: 0 15px; text-align: center; }
+                .glyph { font-size: 24px; margin-bottom: 5px; }
+                .description { font-size: 12px; color: #666; }
+                .tabs { display: flex; margin-bottom: 20px; }
+                .tab { padding: 10px 20px; cursor: pointer; background: #eee; margin-right: 5px; }
+                .tab.active { background: #4285F4; color: white; }
+                .tab-content { display: none; }
+                .tab-content.active { display: block; }
             </style>
         </head>
         <body>
             <div class="container">
                 <h1>Recursive QKOV Attribution Drift Map</h1>
-                <p class="code">.p/qkov.recursive.map{{drift_analysis=true, glyph_layer="∴⇌☍"}}</p>
+                <p class="code">.p/qkov.recursive.map{drift_analysis=true, glyph_layer="∴⇌☍"}</p>
                 
                 <div class="glyph-legend">
                     <div class="glyph-item">
@@ -606,38 +2459,266 @@ class RecursiveQKOVMapper:
                 
                 <div class="tab-content active" id="static">
                     <div class="visualization">
-                        <img src="data:image/png;base64,{static_img_b64}" alt="Recursive QKOV Attribution Map" style="max-width:100%;">
+                        """
+
+_HTML_BETWEEN_TABS = """
                     </div>
                 </div>
                 
                 <div class="tab-content" id="animated">
                     <div class="visualization">
-                        <img src="data:image/gif;base64,{animation_b64}" alt="QKOV Attribution Animation" style="max-width:100%;">
+                        """
+
+_HTML_TAIL = '''
                     </div>
                 </div>
                 
                 <script>
-                function switchTab(tabName) {{
+                function switchTab(tabName) {
                     // Hide all tabs
-                    document.querySelectorAll('.tab-content').forEach(tab => {{
+                    document.querySelectorAll('.tab-content').forEach(tab => {
                         tab.classList.remove('active');
-                    }});
-                    document.querySelectorAll('.tab').forEach(tab => {{
+                    });
+                    document.querySelectorAll('.tab').forEach(tab => {
                         tab.classList.remove('active');
-                    }});
+                    });
                     
                     // Show selected tab
                     document.getElementById(tabName).classList.add('active');
-                    document.querySelector(`.tab[onclick="switchTab('${{tabName}}')"]`).classList.add('active');
-                }}
+                    document.querySelector(`.tab[onclick="switchTab('${tabName}')"]`).classList.add('active');
+                }
                 </script>
             </div>
         </body>
         </html>
-        """
-        
-        return html
+        '''
+
+# Client-side renderer for write_html_output(output_mode='canvas')
+_CANVAS_RENDERER_JS = r'''
+(function () {
+    // Map data packed by RecursiveQKOVMapper.canvas_map_data
+    var data = JSON.parse(document.getElementById('drift-map-data').textContent);
+    function decode(b64, Type) {
+        var bin = atob(b64), bytes = new Uint8Array(bin.length);
+        for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+        return new Type(bytes.buffer);
+    }
+    var xy = decode(data.positions, Float32Array), level = decode(data.level, Uint16Array);
+    var entropy = decode(data.entropy, Float32Array), glyph = decode(data.glyph, Uint8Array);
+    var classifier = decode(data.classifier, Uint8Array), inertia = decode(data.inertia, Float32Array);
+    var src = decode(data.edge_src, Uint32Array), dst = decode(data.edge_dst, Uint32Array);
+    var drift = decode(data.edge_drift, Float32Array), phase = decode(data.edge_phase, Float32Array);
+    var arrow = decode(data.arrow, Uint8Array);
+    var nodeLut = decode(data.node_lut, Uint8Array), edgeLut = decode(data.edge_lut, Uint8Array);
+    var N = entropy.length, E = drift.length, SIZE = data.size;
+
+    // Data coordinates to canvas pixels: 15% padding, equal aspect (as set_map_limits)
+    var minX = Infinity, maxX = -Infinity, minY = Infinity, maxY = -Infinity;
+    for (var i = 0; i < N; i++) {
+        minX = Math.min(minX, xy[2 * i]); maxX = Math.max(maxX, xy[2 * i]);
+        minY = Math.min(minY, xy[2 * i + 1]); maxY = Math.max(maxY, xy[2 * i + 1]);
+    }
+    var scale = SIZE / Math.max(1.3 * (maxX - minX), 1.3 * (maxY - minY), 1e-9);
+    var cx = (minX + maxX) / 2, cy = (minY + maxY) / 2;
+    var pt = SIZE / (data.figsize * 72);
+    function X(x) { return (x - cx) * scale + SIZE / 2; }
+    function Y(y) { return SIZE / 2 - (y - cy) * scale; }
+    function color(lut, v) {
+        var k = 3 * Math.max(0, Math.min(255, Math.round(v * 255)));
+        return 'rgba(' + lut[k] + ',' + lut[k + 1] + ',' + lut[k + 2] + ',';
+    }
+    var edgeColor = new Array(E);
+    for (var e = 0; e < E; e++) edgeColor[e] = color(edgeLut, 1 - drift[e]);
+    function nodeSize(i) { return Math.max(300 * (1 - 0.15 * level[i]), 0); }
+
+    // Pick at most one label per cell, highest priority first (as label_subset)
+    function labelSubset(nodes, priority, w, h) {
+        var best = {};
+        nodes.forEach(function (i) {
+            var key = Math.floor(X(xy[2 * i]) / w) + ':' + Math.floor(Y(xy[2 * i + 1]) / h);
+            if (!(key in best) || priority[i] > priority[best[key]]) best[key] = i;
+        });
+        return Object.keys(best).map(function (key) { return best[key]; });
+    }
+    function label(ctx, text, x, y, size, fg, alpha) {
+        ctx.font = size * pt + 'px sans-serif';
+        var w = ctx.measureText(text).width + 4 * pt, h = size * pt * 1.6;
+        ctx.fillStyle = 'rgba(255,255,255,' + alpha + ')';
+        ctx.fillRect(x - w / 2, y - h / 2, w, h);
+        ctx.fillStyle = fg;
+        ctx.fillText(text, x, y);
+    }
+
+    function setup(canvas) {
+        var dpr = window.devicePixelRatio || 1;
+        canvas.width = SIZE * dpr; canvas.height = SIZE * dpr;
+        canvas.style.width = SIZE + 'px'; canvas.style.maxWidth = '100%'; canvas.style.height = 'auto';
+        var ctx = canvas.getContext('2d');
+        ctx.scale(dpr, dpr);
+        ctx.textAlign = 'center'; ctx.textBaseline = 'middle';
+        return ctx;
+    }
+    function clear(ctx) {
+        ctx.clearRect(0, 0, SIZE, SIZE);
+        ctx.fillStyle = '#ffffff';
+        ctx.fillRect(0, 0, SIZE, SIZE);
+    }
+    function drawEdges(ctx, alpha) {
+        for (var e = 0; e < E; e++) {
+            ctx.strokeStyle = edgeColor[e] + alpha(e) + ')';
+            ctx.lineWidth = (1.5 * (1 - drift[e]) + 0.5) * pt;
+            ctx.beginPath();
+            ctx.moveTo(X(xy[2 * src[e]]), Y(xy[2 * src[e] + 1]));
+            ctx.lineTo(X(xy[2 * dst[e]]), Y(xy[2 * dst[e] + 1]));
+            ctx.stroke();
+        }
+    }
+    function drawArrows(ctx) {
+        // Same geometry as RecursiveQKOVMapper.arrow_heads
+        for (var e = 0; e < E; e++) {
+            if (!arrow[e]) continue;
+            var x0 = xy[2 * src[e]], y0 = xy[2 * src[e] + 1], x1 = xy[2 * dst[e]], y1 = xy[2 * dst[e] + 1];
+            var len = Math.hypot(x1 - x0, y1 - y0);
+            if (len === 0) continue;
+            var dx = (x1 - x0) / len, dy = (y1 - y0) / len;
+            var bx = 0.7 * x1 + 0.3 * x0 + 0.2 * dx, by = 0.7 * y1 + 0.3 * y0 + 0.2 * dy;
+            ctx.fillStyle = edgeColor[e] + '0.7)';
+            ctx.beginPath();
+            ctx.moveTo(X(bx + 0.2 * dx), Y(by + 0.2 * dy));
+            ctx.lineTo(X(bx - 0.075 * dy), Y(by + 0.075 * dx));
+            ctx.lineTo(X(bx + 0.075 * dy), Y(by - 0.075 * dx));
+            ctx.fill();
+        }
+    }
+    function drawNodes(ctx) {
+        var all = [];
+        for (var i = 0; i < N; i++) {
+            var x = X(xy[2 * i]), y = Y(xy[2 * i + 1]), size = nodeSize(i);
+            ctx.fillStyle = color(nodeLut, entropy[i]) + '0.7)';
+            ctx.strokeStyle = '#333'; ctx.lineWidth = pt;
+            ctx.beginPath(); ctx.arc(x, y, Math.sqrt(size) / 2 * pt, 0, 2 * Math.PI);
+            ctx.fill(); ctx.stroke();
+            ctx.font = (10 + size / 80) * pt + 'px sans-serif';
+            ctx.lineWidth = 2 * pt; ctx.strokeStyle = 'black';
+            ctx.strokeText(data.glyphs[glyph[i]], x, y);
+            ctx.fillStyle = entropy[i] > 0.5 ? 'white' : 'black';
+            ctx.fillText(data.glyphs[glyph[i]], x, y);
+            all.push(i);
+        }
+        labelSubset(all, entropy, 30 * SIZE / 1400, 14 * SIZE / 1400).forEach(function (i) {
+            label(ctx, entropy[i].toFixed(2), X(xy[2 * i]), Y(xy[2 * i + 1] - 0.4), 7, 'black', 0.5);
+        });
+    }
+    function drawClassifiers(ctx) {
+        var nodes = [];
+        for (var i = 0; i < N; i++) if (classifier[i]) nodes.push(i);
+        ctx.setLineDash([6 * pt, 3 * pt]);
+        nodes.forEach(function (i) {
+            ctx.strokeStyle = 'rgba(156,39,176,0.8)'; ctx.lineWidth = 2 * pt;
+            ctx.beginPath();
+            ctx.arc(X(xy[2 * i]), Y(xy[2 * i + 1]), (Math.sqrt(nodeSize(i)) + 8) / 2 * pt, 0, 2 * Math.PI);
+            ctx.stroke();
+        });
+        ctx.setLineDash([]);
+        nodes.forEach(function (i) {
+            var x = X(xy[2 * i]), y = Y(xy[2 * i + 1] + 0.7);
+            ctx.font = 'bold ' + 14 * pt + 'px sans-serif';
+            ctx.lineWidth = 3 * pt; ctx.strokeStyle = 'white';
+            ctx.strokeText(data.classifier_glyph, x, y);
+            ctx.fillStyle = '#9C27B0';
+            ctx.fillText(data.classifier_glyph, x, y);
+        });
+        labelSubset(nodes, inertia, 80 * SIZE / 1400, 40 * SIZE / 1400).forEach(function (i) {
+            label(ctx, 'Classifier Lock', X(xy[2 * i]), Y(xy[2 * i + 1] + 1.1), 8, '#9C27B0', 0.7);
+        });
+    }
+
+    // Static map
+    var staticCtx = setup(document.getElementById('static-map'));
+    clear(staticCtx);
+    drawEdges(staticCtx, function () { return 0.7; });
+    drawArrows(staticCtx);
+    drawNodes(staticCtx);
+    drawClassifiers(staticCtx);
+
+    // Animation: nodes drawn once to a layer, edges redrawn with the pulse alpha
+    var animated = document.getElementById('animated-map'), animatedCtx = setup(animated);
+    var layer = document.createElement('canvas'), layerCtx = setup(layer);
+    drawNodes(layerCtx);
+    drawClassifiers(layerCtx);
+    var shown = -1;
+    function tick(now) {
+        var frame = Math.floor(now / data.interval) % data.frames;
+        if (frame !== shown && animated.offsetParent !== null) {
+            shown = frame;
+            clear(animatedCtx);
+            drawEdges(animatedCtx, function (e) {
+                // Same formula as RecursiveQKOVMapper.edge_pulse_alpha
+                var alpha = 0.2 + 0.7 * (0.5 + 0.5 * Math.sin(2 * Math.PI * (frame / data.frames + phase[e])));
+                return alpha * (1 - 0.7 * drift[e]);
+            });
+            animatedCtx.setTransform(1, 0, 0, 1, 0, 0);
+            animatedCtx.drawImage(layer, 0, 0);
+            animatedCtx.setTransform(window.devicePixelRatio || 1, 0, 0, window.devicePixelRatio || 1, 0, 0);
+        }
+        window.requestAnimationFrame(tick);
+    }
+    window.requestAnimationFrame(tick);
+})();
+'''
+
+# Raw bytes per base64 chunk; a multiple of 3 so chunks concatenate cleanly
+_BASE64_CHUNK = 3 * 64 * 1024
+
+
+def _chunk_writer(stream):
+    """Return a write function for text streams or UTF-8 encoding binary streams"""
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(stream, 'mode', ''):
+        return lambda text: stream.write(text.encode('utf-8'))
+    return stream.write
+
+
+def _write_base64(write, buffer):
+    """Base64-encode a binary buffer from its start, one chunk at a time"""
+    buffer.seek(0)
+    while True:
+        chunk = buffer.read(_BASE64_CHUNK)
+        if not chunk:
+            break
+        write(base64.b64encode(chunk).decode('ascii'))
+
+
+def _build_maps(mapper_cls, params, seeds, return_cores):
+    """Build one map per seed (in a worker process for generate_batch)"""
+    maps = [mapper_cls(seed=seed, **params) for seed in seeds]
+    if return_cores:
+        return [mapper.map_arrays() for mapper in maps]
+    return maps
+
+
+# Per-process renderer used by parallel_animation_frames workers
+_frame_worker_renderer = None
+
+
+def _init_frame_worker(mapper, frames, render_mode):
+    """Build the frame renderer once per worker process (headless Agg canvas)"""
+    global _frame_worker_renderer
+    _frame_worker_renderer = PulseFrameRenderer(mapper, frames, render_mode=render_mode)
+
+
+def _render_frames(frame_numbers):
+    """Render frames to RGB arrays in a worker process"""
+    return [_frame_worker_renderer.render(frame) for frame in frame_numbers]
+
+
+def _quantize_frames(start, stop, palette):
+    """Render and quantize a contiguous range of frames in a worker process"""
+    return [_frame_worker_renderer.quantize(_frame_worker_renderer.render(frame), palette)
+            for frame in range(start, stop)]
+
+
+if __name__ == "__main__":
+    # Create and generate the visualization (seeded for reproducibility)
+    mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=8, seed=42)
+    fig = mapper.visualize(figsize=(14, 14), save_path='qkov_drift_map.png')
 
-# Create and generate the visualization
-mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=8)
-fig = mapper.visualize(figsize=(14
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""Content-addressed on-disk cache for rendered drift map artifacts."""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import weakref
+
+import numpy as np
+
+from qkov_concurrency import write_atomic
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+# Bump when rendering output changes so stale artifacts are never served
+CACHE_VERSION = 1
+
+# Map arrays that determine a rendered artifact
+_KEY_ARRAYS = ('level_offsets', 'entropy', 'loopback_density', 'classifier_inertia',
+               'glyph_code', 'indptr', 'indices', 'edge_weight', 'drift', 'is_classifier',
+               'edge_drift')
+
+
+class RenderCache:
+    """
+    Stores PNG/GIF/HTML renders of drift maps in a local directory, keyed by a
+    hash of the mapper parameters, seed, graph arrays and render options.
+
+    The directory is bounded to max_bytes by evicting the least recently used
+    artifacts. Writes are atomic (temp file + rename) and eviction and the
+    shared counters are serialized with a file lock, so several processes can
+    use the same directory at once. Hits and misses are added to the shared
+    counters in batches of flush_every, on put and stats, and when the cache
+    is garbage collected or the interpreter exits.
+    """
+
+    # Lookups counted in memory before they are added to the shared stats file
+    flush_every = 64
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_path = os.path.join(self.directory, '.lock')
+        self._stats_path = os.path.join(self.directory, 'stats.json')
+        self._pending = {'hits': 0, 'misses': 0}
+        weakref.finalize(self, _flush_counts, self._lock_path, self._stats_path, self._pending)
+
+    def key(self, mapper, kind, **options):
+        """Return the cache key for rendering mapper as kind with the given options"""
+        digest = hashlib.sha256()
+        header = {
+            'version': CACHE_VERSION,
+            'kind': kind,
+            'depth': mapper.depth,
+            'nodes_per_level': mapper.nodes_per_level,
+            'drift_threshold': mapper.drift_threshold,
+            'seed': repr(getattr(mapper, 'seed', None)),
+            'glyphs': mapper.glyphs,
+            'options': {name: repr(value) for name, value in sorted(options.items())},
+        }
+        digest.update(json.dumps(header, sort_keys=True).encode('utf-8'))
+
+        # The graph itself: arrays and layout
+        arrays = mapper.map_arrays()
+        for name in _KEY_ARRAYS:
+            digest.update(name.encode('ascii'))
+            digest.update(np.ascontiguousarray(getattr(arrays, name)).tobytes())
+        digest.update(np.ascontiguousarray(mapper.position_array()).tobytes())
+        return digest.hexdigest()
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def get(self, key, ext):
+        """Return cached bytes (refreshing their LRU position) or None"""
+        path = self.path(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        # Another process may evict the file between the read and the touch
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(path)
+        self._count('hits')
+        return data
+
+    def put(self, key, ext, data):
+        """Atomically store bytes under key, then evict down to max_bytes"""
+        write_atomic(self.path(key, ext), data)
+        self.evict()
+        self.flush()
+
+    def get_or_render(self, key, ext, render):
+        """Return cached bytes for key, calling render() to produce them on a miss"""
+        data = self.get(key, ext)
+        if data is None:
+            data = render()
+            self.put(key, ext, data)
+        return data
+
+    def png(self, mapper, figsize=(14, 14), dpi=300, show_legend=True, render_mode='artists',
+            label_budget=None, edge_mode='lines'):
+        """Cached RecursiveQKOVMapper.render_png"""
+        options = dict(figsize=figsize, dpi=dpi, show_legend=show_legend,
+                       render_mode=render_mode, label_budget=label_budget, edge_mode=edge_mode)
+        return self.get_or_render(self.key(mapper, 'png', **options), 'png',
+                                  lambda: mapper.render_png(**options))
+
+    def load_figure(self, mapper, path, dpi=300, **options):
+        """
+        Write the cached render of RecursiveQKOVMapper.visualize with the given
+        options to path and return True, or return False on a miss; the
+        format follows path's extension
+        """
+        ext = self._figure_ext(path)
+        data = self.get(self.key(mapper, 'visualize', dpi=dpi, **options), ext)
+        if data is None:
+            return False
+        with open(path, 'wb') as f:
+            f.write(data)
+        return True
+
+    def savefig(self, mapper, fig, path, dpi=300, **options):
+        """
+        fig.savefig(path) of a figure drawn by RecursiveQKOVMapper.visualize
+        with the given options, storing the file for load_figure
+        """
+        ext = self._figure_ext(path)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=ext, dpi=dpi, bbox_inches='tight')
+        data = buffer.getvalue()
+        self.put(self.key(mapper, 'visualize', dpi=dpi, **options), ext, data)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    @staticmethod
+    def _figure_ext(path):
+        return os.path.splitext(path)[1][1:].lower() or 'png'
+
+    def gif(self, mapper, frames=60, interval=100, render_mode='artists', workers=None):
+        """Cached RecursiveQKOVMapper.create_animation, as GIF bytes"""
+        def render():
+            buffer = io.BytesIO()
+            mapper.create_animation(buffer, frames=frames, interval=interval,
+                                    render_mode=render_mode, workers=workers)
+            return buffer.getvalue()
+
+        # The worker count does not change the output, so it is not part of the key
+        key = self.key(mapper, 'gif', frames=frames, interval=interval, render_mode=render_mode)
+        return self.get_or_render(key, 'gif', render)
+
+    def html(self, mapper, render_mode='artists', workers=None, output_mode='images',
+             frames=60, interval=100):
+        """Cached RecursiveQKOVMapper.generate_html_output"""
+        def render():
+            return mapper.generate_html_output(render_mode=render_mode, workers=workers,
+                                               output_mode=output_mode, frames=frames,
+                                               interval=interval).encode('utf-8')
+
+        key = self.key(mapper, 'html', render_mode=render_mode, output_mode=output_mode,
+                       frames=frames, interval=interval)
+        return self.get_or_render(key, 'html', render).decode('utf-8')
+
+    def entries(self):
+        """Return (path, size, mtime) for every cached artifact"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.') or entry.name.endswith(('.tmp', '.json')):
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Remove least recently used artifacts until the cache fits in max_bytes"""
+        with self._locked():
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+                if total <= self.max_bytes:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                total -= size
+
+    def stats(self):
+        """Return this instance's and the directory-wide hit/miss counters and usage"""
+        self.flush()
+        with self._locked():
+            shared = _read_counts(self._stats_path)
+        entries = self.entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'shared_hits': shared['hits'],
+            'shared_misses': shared['misses'],
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
+
+    def clear(self):
+        """Remove every cached artifact and reset the shared counters"""
+        with self._locked():
+            for path, _, _ in self.entries():
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._stats_path)
+        self.hits = self.misses = 0
+        self._pending.update(hits=0, misses=0)
+
+    def flush(self):
+        """Add the hits and misses counted since the last flush to the shared counters"""
+        _flush_counts(self._lock_path, self._stats_path, self._pending)
+
+    def _count(self, counter):
+        """Increment a counter, flushing to the shared stats file every flush_every lookups"""
+        setattr(self, counter, getattr(self, counter) + 1)
+        self._pending[counter] += 1
+        if sum(self._pending.values()) >= self.flush_every:
+            self.flush()
+
+    def _locked(self):
+        return _directory_lock(self._lock_path)
+
+
+def _read_counts(stats_path):
+    try:
+        with open(stats_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'hits': 0, 'misses': 0}
+
+
+def _flush_counts(lock_path, stats_path, pending):
+    """Add pending counts to a cache directory's stats file and reset them"""
+    if not any(pending.values()):
+        return
+    with _directory_lock(lock_path):
+        shared = _read_counts(stats_path)
+        for counter, count in pending.items():
+            shared[counter] += count
+        write_atomic(stats_path, json.dumps(shared))
+    pending.update(dict.fromkeys(pending, 0))
+
+
+@contextlib.contextmanager
+def _directory_lock(lock_path):
+    """Hold an exclusive lock on a cache directory (no-op without fcntl)"""
+    with open(lock_path, 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
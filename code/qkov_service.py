@@ -0,0 +1,572 @@
+"""
+Local asyncio render service for drift maps, with a process pool, request
+coalescing and backpressure, plus a load-testing client.
+
+    python qkov_service.py serve --port 8765 --workers 4 --cache /tmp/qkov-cache
+    python qkov_service.py load --requests 200 --concurrency 16
+
+GET /render/{png,gif,html}?depth=5&nodes_per_level=20&seed=1&dpi=100 renders
+a generated map; POST the same path with an .npz body to render ingested
+arrays instead (either the DriftMapArrays fields or qk_<L>/ov_<L>
+attribution tensors, see RecursiveQKOVMapper.from_attributions). GET /stats
+returns the service counters as JSON.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+
+def _flag(value):
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+def _choice(*choices):
+    """Parser accepting one of choices"""
+    def parse(value):
+        if value not in choices:
+            raise ValueError(f"{value!r} is not one of {', '.join(choices)}")
+        return value
+    return parse
+
+
+_render_mode = _choice('artists', 'batched')
+
+# Query parameters of a generated map, and of ingested arrays (POST bodies)
+MAP_PARAMS = {'depth': int, 'nodes_per_level': int, 'drift_threshold': float, 'seed': int,
+              'array_core': _flag, 'layout': str}
+INGEST_PARAMS = {'drift_threshold': float, 'seed': int, 'layout': str, 'top_k': int,
+                 'min_weight': float}
+
+# Render options accepted for each kind of artifact
+RENDER_OPTIONS = {
+    'png': {'dpi': int, 'show_legend': _flag, 'render_mode': _render_mode, 'label_budget': int,
+            'edge_mode': _choice('lines', 'density')},
+    'gif': {'frames': int, 'interval': int, 'render_mode': _render_mode},
+    'html': {'render_mode': _render_mode, 'output_mode': _choice('images', 'canvas'),
+             'frames': int, 'interval': int},
+}
+
+CONTENT_TYPES = {'png': 'image/png', 'gif': 'image/gif', 'html': 'text/html; charset=utf-8'}
+
+# DriftMapArrays constructor fields, in order, as stored in an uploaded .npz
+CORE_FIELDS = ('level_offsets', 'entropy', 'loopback_density', 'classifier_inertia',
+               'glyph_code', 'indptr', 'indices', 'edge_weight')
+
+# Responses are written in slices of this size, waiting for the client to drain each
+CHUNK_BYTES = 64 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+
+
+class ServiceError(Exception):
+    """A request the service answers with an HTTP error status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RenderService:
+    """
+    Serves PNG/GIF/HTML renders of drift maps over HTTP on localhost
+
+    Renders run in a pool of worker processes (so a cold render never
+    blocks the event loop) and, with cache_dir, go through a RenderCache
+    shared by the workers. Requests for the same artifact (same kind,
+    parameters, options and body) that arrive while it is being rendered
+    are coalesced onto that one job. At most workers + max_queued distinct
+    jobs are admitted at once; further requests get 503 with Retry-After
+    rather than piling up behind them.
+
+    Maps, generated or uploaded, are limited to max_nodes nodes and
+    max_frames frames, uploads to max_body_bytes.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, workers=2, max_queued=8, cache_dir=None,
+                 max_nodes=200_000, max_frames=600, max_body_bytes=256 * 1024 * 1024,
+                 idle_timeout=30):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_queued = max_queued
+        self.cache_dir = cache_dir
+        self.max_nodes = max_nodes
+        self.max_frames = max_frames
+        self.max_body_bytes = max_body_bytes
+        self.idle_timeout = idle_timeout
+
+        # In-flight jobs by request key, shared by every request for the same artifact
+        self.jobs = {}
+        self.counters = {'requests': 0, 'rendered': 0, 'coalesced': 0, 'rejected': 0,
+                         'failed': 0}
+        self.pool = None
+        self.server = None
+
+        # Open connections (handler task -> writer), closed by close()
+        self.connections = {}
+
+    async def start(self):
+        """Start the worker pool and listen; returns the bound (host, port)"""
+        self.pool = self.new_pool()
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.host, self.port = self.server.sockets[0].getsockname()[:2]
+        return self.host, self.port
+
+    def new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_service_worker,
+                                   initargs=(self.cache_dir,))
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """Stop listening, close open connections and shut the worker pool down"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+        # Handlers see EOF and return once their current response is written
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    def stats(self):
+        return dict(self.counters, in_flight=len(self.jobs), workers=self.workers,
+                    max_queued=self.max_queued)
+
+    async def handle(self, reader, writer):
+        """Serve requests on one (keep-alive) connection until it closes"""
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader, self.max_body_bytes),
+                                                     self.idle_timeout)
+                except ServiceError as error:
+                    await write_response(writer, error.status, str(error).encode('utf-8'),
+                                         'text/plain; charset=utf-8', keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                status, data, content_type, extra = await self.respond(method, target, body)
+                await write_response(writer, status, data, content_type, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def respond(self, method, target, body):
+        """Return (status, body bytes, content type, extra headers) for one request"""
+        self.counters['requests'] += 1
+        url = urlsplit(target)
+        try:
+            if url.path == '/stats':
+                return 200, json.dumps(self.stats()).encode('utf-8'), 'application/json', {}
+            kind, params, options = self.parse_render(method, url, body)
+            data = await self.render(kind, params, options, body or None)
+            return 200, data, CONTENT_TYPES[kind], {}
+        except ServiceError as error:
+            extra = {'Retry-After': '1'} if error.status == 503 else {}
+            return error.status, str(error).encode('utf-8'), 'text/plain; charset=utf-8', extra
+
+    def parse_render(self, method, url, body):
+        """Validate a /render/<kind> request into (kind, map params, render options)"""
+        parts = url.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'render' or parts[1] not in RENDER_OPTIONS:
+            raise ServiceError(404, f"Unknown path {url.path!r}")
+        if method not in ('GET', 'POST'):
+            raise ServiceError(405, f"Method {method} not allowed")
+        kind = parts[1]
+        if method == 'POST' and not body:
+            raise ServiceError(400, "POST needs an .npz body of map arrays or attribution tensors")
+
+        allowed = dict(INGEST_PARAMS if method == 'POST' else MAP_PARAMS)
+        allowed.update(RENDER_OPTIONS[kind])
+        params, options = {}, {}
+        for name, value in parse_qsl(url.query, keep_blank_values=True):
+            if name not in allowed:
+                raise ServiceError(400, f"Unknown parameter {name!r} for {method} /render/{kind}")
+            try:
+                value = allowed[name](value)
+            except ValueError as error:
+                raise ServiceError(400, f"Bad value for {name}: {error}")
+            (options if name in RENDER_OPTIONS[kind] else params)[name] = value
+
+        if method == 'GET':
+            # Levels hold max(3, nodes_per_level - level) nodes, as the mapper builds them;
+            # any depth over max_nodes / 3 is over the limit without counting
+            depth = params.get('depth', 4)
+            nodes_per_level = params.get('nodes_per_level', 7)
+            if depth > self.max_nodes // 3:
+                raise ServiceError(400, f"Depth {depth} exceeds the limit of {self.max_nodes} nodes")
+            nodes = sum(max(3, nodes_per_level - level) for level in range(depth))
+        else:
+            nodes = _upload_node_count(body)
+        if nodes > self.max_nodes:
+            raise ServiceError(400, f"Map of {nodes} nodes exceeds the limit of {self.max_nodes}")
+        if options.get('frames', 0) > self.max_frames:
+            raise ServiceError(400, f"{options['frames']} frames exceed the limit of {self.max_frames}")
+        return kind, params, options
+
+    async def render(self, kind, params, options, body=None):
+        """Render in the pool, joining an identical in-flight job if there is one"""
+        digest = hashlib.sha256(json.dumps([kind, params, options], sort_keys=True).encode('utf-8'))
+        if body is not None:
+            digest.update(body)
+        key = digest.hexdigest()
+
+        job = self.jobs.get(key)
+        if job is not None:
+            self.counters['coalesced'] += 1
+        else:
+            if len(self.jobs) >= self.workers + self.max_queued:
+                self.counters['rejected'] += 1
+                raise ServiceError(503, f"Saturated: {len(self.jobs)} renders in flight")
+            pool = self.pool
+            job = asyncio.get_running_loop().run_in_executor(
+                pool, _render_job, kind, params, options, body)
+            self.jobs[key] = job
+            job.add_done_callback(lambda done: self.finish_job(key, done, pool))
+
+        # A client that goes away must not cancel a job other requests are waiting on
+        try:
+            return await asyncio.shield(job)
+        except ValueError as error:
+            raise ServiceError(400, str(error))
+        except Exception as error:
+            raise ServiceError(500, f"Render failed: {type(error).__name__}: {error}")
+
+    def finish_job(self, key, job, pool):
+        self.jobs.pop(key, None)
+        if job.cancelled():
+            return
+        error = job.exception()
+        if error is None:
+            self.counters['rendered'] += 1
+            return
+        self.counters['failed'] += 1
+        if isinstance(error, BrokenProcessPool) and pool is self.pool:
+            # A worker died (e.g. out of memory); later jobs get a fresh pool
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self.new_pool()
+
+
+async def read_request(reader, max_body_bytes):
+    """Read one HTTP/1.1 request: (method, target, headers, body), or None at EOF"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise ServiceError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise ServiceError(400, "Too many headers")
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise ServiceError(400, f"Malformed Content-Length {headers['content-length']!r}")
+    if length < 0:
+        raise ServiceError(400, f"Negative Content-Length {length}")
+    if length > max_body_bytes:
+        raise ServiceError(413, f"Body of {length} bytes exceeds the limit of {max_body_bytes}")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+async def write_response(writer, status, data, content_type, keep_alive=True, extra=None):
+    """Write a response, streaming the body in CHUNK_BYTES slices under flow control"""
+    headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+               f"Content-Type: {content_type}",
+               f"Content-Length: {len(data)}",
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    headers += [f"{name}: {value}" for name, value in (extra or {}).items()]
+    writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+    view = memoryview(data)
+    for start in range(0, len(view), CHUNK_BYTES):
+        writer.write(view[start:start + CHUNK_BYTES])
+        await writer.drain()
+    await writer.drain()
+
+
+async def exchange(reader, writer, method, path, body=b''):
+    """Send one request on an open connection and return (status, headers, body)"""
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, data
+
+
+async def fetch(host, port, path, body=None):
+    """Send one request on a new connection; POST when a body is given"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await exchange(reader, writer, 'POST' if body else 'GET', path, body or b'')
+    finally:
+        writer.close()
+
+
+def load_paths(kind='png', distinct=4, depth=5, nodes_per_level=20, **options):
+    """Request paths for distinct maps (seeds 0..distinct-1) rendered as kind"""
+    query = '&'.join(f"{name}={value}" for name, value in options.items())
+    return [f"/render/{kind}?depth={depth}&nodes_per_level={nodes_per_level}&seed={seed}"
+            + (f"&{query}" if query else '') for seed in range(distinct)]
+
+
+async def load_test(host, port, paths, requests=200, concurrency=16):
+    """
+    Drive a service with concurrency keep-alive clients sending a total of
+    requests requests, cycling through paths; returns the throughput,
+    latency percentiles of successful requests and the status counts
+    """
+    latencies = []
+    statuses = {}
+    counter = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for number in counter:
+                start = time.perf_counter()
+                status, _, _ = await exchange(reader, writer, 'GET', paths[number % len(paths)])
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 503:
+                    await asyncio.sleep(0.05)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    latency_ms = np.array(latencies) * 1000
+
+    def percentile(q):
+        return float(np.percentile(latency_ms, q)) if len(latency_ms) else None
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'throughput_rps': statuses.get(200, 0) / seconds,
+        'p50_ms': percentile(50),
+        'p99_ms': percentile(99),
+        'max_ms': percentile(100),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def run_load_test(host=None, port=None, requests=200, concurrency=16, paths=None,
+                        **service_options):
+    """load_test against host:port, or against a fresh in-process service if port is None"""
+    paths = paths or load_paths()
+    if port is not None:
+        return await load_test(host or '127.0.0.1', port, paths, requests, concurrency)
+
+    service = RenderService(**service_options)
+    host, port = await service.start()
+    try:
+        result = await load_test(host, port, paths, requests, concurrency)
+        result['service'] = service.stats()
+        return result
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'load'):
+        command = commands.add_parser(name)
+        command.add_argument('--host', default='127.0.0.1')
+        command.add_argument('--port', type=int, default=8765 if name == 'serve' else None,
+                             help='service port (load: omit to start an in-process service)')
+        command.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        command.add_argument('--max-queued', type=int, default=8,
+                             help='distinct renders admitted beyond the workers before 503s')
+        command.add_argument('--cache', help='RenderCache directory shared by the workers')
+    load = commands.choices['load']
+    load.add_argument('--requests', type=int, default=200)
+    load.add_argument('--concurrency', type=int, default=16)
+    load.add_argument('--kind', choices=sorted(RENDER_OPTIONS), default='png')
+    load.add_argument('--distinct', type=int, default=4, help='distinct maps requested')
+    load.add_argument('--depth', type=int, default=5)
+    load.add_argument('--nodes-per-level', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    service_options = dict(workers=args.workers, max_queued=args.max_queued,
+                           cache_dir=args.cache)
+    if args.command == 'serve':
+        service = RenderService(host=args.host, port=args.port, **service_options)
+
+        async def serve():
+            host, port = await service.start()
+            print(f"Serving drift map renders on http://{host}:{port}", file=sys.stderr)
+            try:
+                await service.serve_forever()
+            finally:
+                await service.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    options = {'dpi': 100, 'render_mode': 'batched'} if args.kind == 'png' else \
+        {'frames': 10, 'render_mode': 'batched'}
+    paths = load_paths(args.kind, args.distinct, args.depth, args.nodes_per_level, **options)
+    result = asyncio.run(run_load_test(args.host if args.port else None, args.port,
+                                       args.requests, args.concurrency, paths,
+                                       **service_options))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+# Per-worker state, set up by _init_service_worker
+_service_cache = None
+
+
+def _upload_node_count(body):
+    """
+    Number of nodes an uploaded .npz describes, from its level_offsets or
+    the row counts of its qk_<L> tensors, without reading the tensors
+    """
+    import zipfile
+
+    from qkov_ingest import read_npy_header
+
+    try:
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            names = archive.namelist()
+            if 'level_offsets.npy' in names:
+                with archive.open('level_offsets.npy') as member:
+                    offsets = np.load(member)
+                return int(offsets[-1]) if offsets.size else 0
+            nodes = 0
+            for name in names:
+                if re.fullmatch(r'qk_\d+\.npy', name):
+                    with archive.open(name) as member:
+                        shape, _, _ = read_npy_header(member, name)
+                    nodes += shape[-2] if len(shape) >= 2 else 0
+            return nodes
+    except (zipfile.BadZipFile, ValueError) as error:
+        raise ServiceError(400, f"Body is not a readable .npz archive: {error}")
+
+
+def _init_service_worker(cache_dir):
+    global _service_cache
+    if cache_dir is not None:
+        from qkov_render_cache import RenderCache
+
+        _service_cache = RenderCache(cache_dir)
+
+
+def _service_mapper(params, body):
+    """Build the mapper for a job: generated from params, or from an uploaded .npz"""
+    from qkov_recursive_map import DriftMapArrays, RecursiveQKOVMapper
+
+    if body is None:
+        return RecursiveQKOVMapper(**params)
+
+    params = dict(params)
+    layout = params.pop('layout', 'radial')
+    with np.load(io.BytesIO(body)) as archive:
+        if 'level_offsets' in archive.files:
+            missing = [name for name in CORE_FIELDS if name not in archive.files]
+            if missing:
+                raise ValueError(f"Uploaded map arrays are missing {missing}")
+            core = DriftMapArrays(*(archive[name] for name in CORE_FIELDS))
+            if 'edge_noise' in archive.files:
+                core.edge_noise = archive['edge_noise']
+            params.pop('top_k', None)
+            params.pop('min_weight', None)
+            mapper = RecursiveQKOVMapper(core=core, **params)
+            mapper.set_layout(layout)
+            return mapper
+
+    # Attribution tensors; from_attributions reads them from an archive on disk
+    with tempfile.NamedTemporaryFile(suffix='.npz') as f:
+        f.write(body)
+        f.flush()
+        mapper = RecursiveQKOVMapper.from_attributions(f.name, **params)
+    mapper.set_layout(layout)
+    return mapper
+
+
+def _render_job(kind, params, options, body):
+    """Render one artifact in a worker process and return its bytes"""
+    mapper = _service_mapper(params, body)
+    if kind == 'png':
+        options = dict(options, dpi=options.get('dpi', 100))
+        if _service_cache is not None:
+            return _service_cache.png(mapper, **options)
+        return mapper.render_png(**options)
+    if kind == 'gif':
+        if _service_cache is not None:
+            return _service_cache.gif(mapper, **options)
+        buffer = io.BytesIO()
+        mapper.create_animation(buffer, **options)
+        return buffer.getvalue()
+    if _service_cache is not None:
+        return _service_cache.html(mapper, **options).encode('utf-8')
+    return mapper.generate_html_output(**options).encode('utf-8')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Matplotlib-free rasterizer for small drift map previews."""
+import io
+import itertools
+
+import numpy as np
+
+from qkov_recursive_map import COLORMAP_STOPS, RecursiveQKOVMapper, colormap_lut
+
+# Figure background of the matplotlib renders
+BACKGROUND = np.array([0xf9, 0xf9, 0xfe], dtype=np.uint8)
+
+# Node outline and classifier ring colours, as drawn by the batched renderer
+NODE_EDGE = np.array([0x33, 0x33, 0x33]) / 255
+CLASSIFIER = np.array([0x9C, 0x27, 0xB0]) / 255
+
+# Colormap lookup tables, built once per process
+_LUTS = {}
+
+
+def lut(name):
+    """Cached colormap_lut of COLORMAP_STOPS[name]"""
+    if name not in _LUTS:
+        _LUTS[name] = colormap_lut(COLORMAP_STOPS[name])
+    return _LUTS[name]
+
+
+def lookup(table, values):
+    """Colours of values in [0, 1] from a lookup table, indexed as matplotlib does"""
+    index = np.clip((np.asarray(values) * len(table)).astype(np.int64), 0, len(table) - 1)
+    return table[index]
+
+
+class ThumbnailRasterizer:
+    """
+    Draws a drift map straight into a NumPy RGB buffer, for previews
+
+    The picture is the data layer of render_mode='batched' scaled down to
+    size x size pixels: edges coloured by edge_cmap with drift-dependent
+    widths, node discs coloured by node_cmap with their outlines, and the
+    dashed classifier rings, with marker sizes and line widths in points
+    scaled as on a figsize-inch figure. Titles, legend, labels, glyphs and
+    arrow heads are left out; at preview sizes they are a few pixels wide.
+
+    Each layer is generated as (pixel, alpha and colour weights) samples in
+    chunks of at most max_samples, summed with np.bincount and composited
+    in one pass (overlapping marks within a layer blend regardless of draw
+    order), so the cost is a few array operations per layer, with no
+    figure or artist, and memory stays flat on large maps.
+    """
+
+    def __init__(self, size=256, figsize=14, dash=(3.7, 1.6), max_samples=1 << 20):
+        self.size = size
+        self.px_per_pt = size / (figsize * 72)
+        self.dash = dash
+        self.max_samples = max_samples
+
+    def viewport(self, xy):
+        """Map data coordinates to pixel (column, row), framed as set_map_limits frames them"""
+        if len(xy) == 0:
+            return np.zeros((0, 2))
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        span = (high - low) * 1.3
+        units_per_pixel = max(span.max(), 1e-9) / self.size
+        center = (low + high) / 2
+        pixels = (xy - center) / units_per_pixel
+        return np.stack([pixels[:, 0], -pixels[:, 1]], axis=1) + self.size / 2
+
+    def rasterize(self, mapper):
+        """Return the (size, size, 3) uint8 RGB preview of a mapper"""
+        arrays = mapper.map_arrays()
+        pixels = self.viewport(mapper.position_array())
+        image = np.empty((self.size * self.size, 3), dtype=np.uint8)
+        image[:] = BACKGROUND
+
+        # Edges under nodes, as in draw_edges. A line thinner than a pixel
+        # covers part of each pixel it crosses: its width times its length
+        # per sample (one sample per pixel along the major axis). Zero-length
+        # edges (both ends on one spot) cover nothing and are skipped
+        drawn = np.flatnonzero((pixels[arrays.edge_src] != pixels[arrays.edge_dst]).any(axis=1))
+        start, end = pixels[arrays.edge_src[drawn]], pixels[arrays.edge_dst[drawn]]
+        delta = np.abs(end - start)
+        per_sample = np.hypot(delta[:, 0], delta[:, 1]) / np.maximum(delta.max(axis=1, initial=0), 1)
+        flow = 1.0 - arrays.edge_drift[drawn]
+        width = (1.5 * flow + 0.5) * self.px_per_pt
+        self.composite(image, self.edge_samples(
+            start, end, 0.7 * np.minimum(width * per_sample, 1.0),
+            lookup(lut('flow'), flow)[:, :3]))
+
+        # Node discs with their outlines, blended as one layer
+        diameter = np.sqrt(np.maximum(300 * (1 - 0.15 * arrays.level), 0)) * self.px_per_pt
+        outline = self.px_per_pt
+        self.composite(image, itertools.chain(
+            self.disc_samples(pixels, diameter / 2 - outline / 2, None, 0.7,
+                              lookup(lut('entropy'), arrays.entropy)[:, :3]),
+            self.disc_samples(pixels, diameter / 2, outline, 0.7,
+                              np.broadcast_to(NODE_EDGE, (len(pixels), 3)))))
+
+        # Dashed classifier rings just outside the discs
+        classifiers = np.flatnonzero(arrays.is_classifier)
+        if len(classifiers):
+            ring_width = 2 * self.px_per_pt
+            radius = (diameter[classifiers] + 8 * self.px_per_pt) / 2
+            self.composite(image, self.disc_samples(
+                pixels[classifiers], radius, ring_width, 0.8,
+                np.broadcast_to(CLASSIFIER, (len(classifiers), 3)),
+                dash=tuple(length * ring_width for length in self.dash)))
+
+        return image.reshape(self.size, self.size, 3)
+
+    def edge_samples(self, start, end, alpha, colors):
+        """Yield (pixel, weights) chunks of the edge lines, one sample per pixel crossed"""
+        weights = self.weights(alpha, colors)
+        for pixel, segment in RecursiveQKOVMapper.segment_samples(
+                start, end, (self.size, self.size), self.max_samples):
+            yield pixel, weights[:, segment]
+
+    def disc_samples(self, centers, radius, width, alpha, colors, dash=None):
+        """
+        Yield (pixel, weights) chunks of discs of the given radii, or of rings
+        of the given width centred on them, with antialiased borders
+        """
+        size = self.size
+        reach = radius + (0 if width is None else width / 2)
+        half = int(np.ceil(reach.max(initial=0))) + 1
+        offsets = np.arange(-half, half + 1)
+        col_offsets = np.tile(offsets, len(offsets))
+        row_offsets = np.repeat(offsets, len(offsets))
+
+        # Every pixel in a square window around each centre, for a block of centres at a time
+        block = max(1, self.max_samples // len(col_offsets))
+        for first in range(0, len(centers), block):
+            center = centers[first:first + block]
+            r = radius[first:first + block, None]
+            base = np.floor(center).astype(np.int64)
+            col = base[:, 0, None] + col_offsets
+            row = base[:, 1, None] + row_offsets
+            dx = col + 0.5 - center[:, 0, None]
+            dy = row + 0.5 - center[:, 1, None]
+            distance = np.hypot(dx, dy)
+
+            # Coverage of the disc (or the ring between two circles) per pixel
+            if width is None:
+                coverage = np.clip(r - distance + 0.5, 0, 1)
+            else:
+                coverage = (np.clip(r + width / 2 - distance + 0.5, 0, 1) -
+                            np.clip(r - width / 2 - distance + 0.5, 0, 1))
+                if dash is not None:
+                    on, off = dash
+                    arc = (np.arctan2(dy, dx) + np.pi) * r
+                    coverage = coverage * ((arc % (on + off)) < on)
+
+            keep = (coverage > 0) & (col >= 0) & (col < size) & (row >= 0) & (row < size)
+            yield (row * size + col)[keep], self.weights(
+                alpha * coverage[keep], colors[first + np.nonzero(keep)[0]])
+
+    @staticmethod
+    def weights(alpha, colors):
+        """Sample weights summed per pixel: log(1 - alpha), alpha-weighted RGB and alpha"""
+        return np.vstack([np.log1p(-alpha), alpha * colors.T, alpha])
+
+    def composite(self, image, samples):
+        """
+        Blend one layer, given as (pixel, weights) chunks, over a flat
+        (pixels, 3) uint8 image in place: each pixel gets opacity
+        1 - prod(1 - alpha) and the alpha-weighted mean colour of its samples
+        """
+        # Small layers are summed over the pixels they touch; once a layer has
+        # more samples than the image has pixels, it goes into full-image sums
+        total = self.size * self.size
+        pending, count, grid = [], 0, None
+        for pixel, weights in samples:
+            pending.append((pixel, weights))
+            count += len(pixel)
+            if count > total:
+                grid = np.zeros((5, total)) if grid is None else grid
+                for pixel, weights in pending:
+                    for sums, weight in zip(grid, weights):
+                        sums += np.bincount(pixel, weight, total)
+                pending, count = [], 0
+
+        if grid is None:
+            # Number the touched pixels through a flag image (no sort)
+            pixel = np.concatenate([pixel for pixel, _ in pending] or [np.zeros(0, np.int64)])
+            weights = np.hstack([weights for _, weights in pending] or [np.zeros((5, 0))])
+            touched = np.zeros(total, dtype=bool)
+            touched[pixel] = True
+            pixels = np.flatnonzero(touched)
+            number = np.empty(total, dtype=np.int64)
+            number[pixels] = np.arange(len(pixels))
+            index = number[pixel]
+            sums = np.stack([np.bincount(index, weight, len(pixels)) for weight in weights])
+            pixels, sums = pixels[sums[4] > 0], sums[:, sums[4] > 0]
+        else:
+            for pixel, weights in pending:
+                for sums, weight in zip(grid, weights):
+                    sums += np.bincount(pixel, weight, total)
+            pixels = np.flatnonzero(grid[4] > 0)
+            sums = grid[:, pixels]
+
+        # Only pixels with some coverage are converted (samples of zero alpha
+        # have no colour), so untouched background costs nothing
+        opacity = 1 - np.exp(sums[0])[:, None]
+        color = (sums[1:4] / sums[4]).T * 255
+        image[pixels] = np.rint(image[pixels] * (1 - opacity) + color * opacity)
+
+    def png(self, mapper, format='PNG', **params):
+        """Encode the preview with Pillow (PNG at compress_level=1 unless overridden)"""
+        from PIL import Image
+
+        if format.upper() == 'PNG':
+            params.setdefault('compress_level', 1)
+        buffer = io.BytesIO()
+        Image.fromarray(self.rasterize(mapper)).save(buffer, format=format, **params)
+        return buffer.getvalue()
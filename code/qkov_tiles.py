@@ -0,0 +1,389 @@
+"""Tiled, multi-resolution (deep-zoom) rendering of large drift maps."""
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qkov_concurrency import bounded_map
+from qkov_layout import near_pairs
+from qkov_recursive_map import GLYPH_KEYS, RecursiveQKOVMapper
+
+
+class TilePyramid:
+    """
+    An XYZ tile pyramid over a drift map
+
+    Zoom z splits the (square, padded) map extent into 2^z x 2^z tiles of
+    tile_size pixels, row 0 at the top. Zooms below detail_zoom draw per-level
+    node clusters on a cluster_px grid with aggregated edges and no labels;
+    from detail_zoom on, tiles draw every node with its glyph, entropy label
+    and classifier overlay. detail_zoom is the first zoom at which the median
+    nearest-neighbour distance between nodes is at least detail_spacing px.
+
+    Tiles are rendered only when requested (tile), optionally through a
+    RenderCache, or ahead of time across a process pool (render, export).
+    Clusters, label cells and arrow heads follow world-aligned grids, so
+    neighbouring tiles agree at their borders.
+    """
+
+    # Extra margin (pixels) around a tile for markers and labels that reach into it
+    margin = 48
+
+    # Edge samples generated at once when finding the tiles edges cross
+    max_samples = 1 << 22
+
+    def __init__(self, mapper, tile_size=256, max_zoom=None, detail_spacing=24, cluster_px=24,
+                 dpi=100, cache=None):
+        self.mapper = mapper
+        self.tile_size = tile_size
+        self.detail_spacing = detail_spacing
+        self.cluster_px = cluster_px
+        self.dpi = dpi
+        self.cache = cache
+
+        self.arrays = mapper.map_arrays()
+        self.xy = np.asarray(mapper.position_array(), dtype=np.float64)
+        self.arrow_edges = np.zeros(self.arrays.num_edges, dtype=bool)
+        self.arrow_edges[mapper.select_arrow_edges(
+            self.arrays.edge_drift, arrow_seed=mapper.seed_sequences['arrows'])] = True
+
+        # Square world extent with the same 15% padding as set_map_limits
+        low, high = self.xy.min(axis=0), self.xy.max(axis=0)
+        self.side = max(float((high - low).max()) * 1.3, 1e-9)
+        center = (low + high) / 2
+        self.origin = center - self.side / 2
+
+        self.detail_zoom = self.zoom_for_spacing(detail_spacing)
+        self.max_zoom = self.detail_zoom + 1 if max_zoom is None else max_zoom
+        self._clusters = {}
+        self._blank = None
+
+        # Tile keys extend one hash of the map and tile options
+        if cache is not None:
+            self.base_key = cache.key(mapper, 'tiles', tile_size=tile_size, dpi=dpi,
+                                      detail_spacing=detail_spacing, cluster_px=cluster_px)
+
+    def scale(self, zoom):
+        """Pixels per data unit at a zoom level"""
+        return self.tile_size * 2 ** zoom / self.side
+
+    def zoom_for_spacing(self, spacing, max_zoom=20):
+        """Smallest zoom at which the median nearest-neighbour distance spans spacing pixels"""
+        n = len(self.xy)
+        if n < 2:
+            return 0
+        cells = max(1, int(np.sqrt(n / 2)))
+        cell = np.minimum(((self.xy - self.origin) / self.side * cells).astype(np.int64), cells - 1)
+        i, j = near_pairs(cell, cells)
+        nearest = np.full(n, np.inf)
+        np.minimum.at(nearest, i, np.hypot(*(self.xy[i] - self.xy[j]).T))
+        nearest = nearest[np.isfinite(nearest) & (nearest > 0)]
+        if len(nearest) == 0:
+            return 0
+        zoom = np.log2(spacing * self.side / (self.tile_size * np.median(nearest)))
+        return int(np.clip(np.ceil(zoom), 0, max_zoom))
+
+    def bounds(self, zoom, x, y):
+        """Data-space (x0, y0, x1, y1) of a tile"""
+        size = self.side / 2 ** zoom
+        x0 = self.origin[0] + x * size
+        y1 = self.origin[1] + self.side - y * size
+        return x0, y1 - size, x0 + size, y1
+
+    def tiles(self, zoom):
+        """(zoom, x, y) of every tile at a zoom level that has something to draw"""
+        n = 2 ** zoom
+        if zoom < self.detail_zoom:
+            points = self.clusters(zoom)['xy']
+        else:
+            points = self.xy
+        cell = np.clip(((points - self.origin) / self.side * n).astype(np.int64), 0, n - 1)
+        occupied = np.unique(cell[:, 0] * n + (n - 1 - cell[:, 1]))
+
+        # Edges can cross tiles without an endpoint in them; include every tile
+        # a segment touches, sampled twice per tile in chunks of max_samples
+        src, dst = self.arrays.edge_src, self.arrays.indices
+        if len(src):
+            start = (self.xy[src] - self.origin) / self.side * 2 * n
+            end = (self.xy[dst] - self.origin) / self.side * 2 * n
+            for pixel, _ in RecursiveQKOVMapper.segment_samples(start, end, (2 * n, 2 * n),
+                                                                self.max_samples):
+                cell_y, cell_x = np.divmod(np.unique(pixel), 2 * n)
+                occupied = np.union1d(occupied, cell_x // 2 * n + (n - 1 - cell_y // 2))
+        return [(zoom, int(x), int(y)) for x, y in zip(*np.divmod(occupied, n))]
+
+    def clusters(self, zoom):
+        """
+        Per-level node clusters on a cluster_px grid at a zoom level, with the
+        cluster-to-cluster edges they aggregate (computed once per zoom)
+        """
+        if zoom in self._clusters:
+            return self._clusters[zoom]
+        arrays = self.arrays
+        cell = np.floor((self.xy - self.origin) * self.scale(zoom) / self.cluster_px).astype(np.int64)
+        key = (arrays.level.astype(np.int64) * (cell[:, 0].max() + 1) + cell[:, 0]) * \
+              (cell[:, 1].max() + 1) + cell[:, 1]
+        _, cluster, count = np.unique(key, return_inverse=True, return_counts=True)
+        num = len(count)
+
+        def mean(values):
+            return np.bincount(cluster, values, num) / count
+
+        clusters = {
+            'xy': np.stack([mean(self.xy[:, 0]), mean(self.xy[:, 1])], axis=1),
+            'count': count,
+            'level': np.bincount(cluster, arrays.level, num) // count,
+            'entropy': mean(arrays.entropy),
+            'classifier': mean(arrays.is_classifier) > 0.5,
+        }
+
+        # Edges between distinct clusters, merged per cluster pair
+        src, dst = cluster[arrays.edge_src], cluster[arrays.indices]
+        between = src != dst
+        pair, inverse, edge_count = np.unique(src[between] * num + dst[between],
+                                              return_inverse=True, return_counts=True)
+        clusters['edge_src'], clusters['edge_dst'] = np.divmod(pair, num)
+        clusters['edge_count'] = edge_count
+        clusters['edge_drift'] = (np.bincount(inverse, arrays.edge_drift[between], len(pair)) /
+                                  np.maximum(edge_count, 1))
+        self._clusters[zoom] = clusters
+        return clusters
+
+    def tile(self, zoom, x, y):
+        """PNG bytes of one tile, rendered on request (through the cache if there is one)"""
+        if not (0 <= zoom and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+            raise ValueError(f"No tile ({zoom}, {x}, {y}) in the pyramid")
+        if self.cache is None:
+            return self.render_tile(zoom, x, y)
+        key = hashlib.sha256(f"{self.base_key}/{zoom}/{x}/{y}".encode('ascii')).hexdigest()
+        return self.cache.get_or_render(key, 'png', lambda: self.render_tile(zoom, x, y))
+
+    def render_tile(self, zoom, x, y):
+        """Render one tile to PNG bytes on a headless figure"""
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        dpi = self.dpi
+        fig = Figure(figsize=(self.tile_size / dpi, self.tile_size / dpi), dpi=dpi,
+                     facecolor='#f9f9fe')
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes((0, 0, 1, 1))
+        ax.set_axis_off()
+        x0, y0, x1, y1 = self.bounds(zoom, x, y)
+        ax.set_xlim(x0, x1)
+        ax.set_ylim(y0, y1)
+
+        pad = self.margin / self.scale(zoom)
+        area = (x0 - pad, y0 - pad, x1 + pad, y1 + pad)
+        if zoom < self.detail_zoom:
+            drawn = self.draw_clusters(ax, zoom, area)
+        else:
+            drawn = self.draw_detail(ax, area)
+        if not drawn:
+            return self.blank()
+
+        png = io.BytesIO()
+        fig.savefig(png, format='png', dpi=dpi, facecolor=fig.get_facecolor())
+        return png.getvalue()
+
+    def blank(self):
+        """PNG bytes of an empty tile"""
+        if self._blank is None:
+            from PIL import Image
+
+            png = io.BytesIO()
+            Image.new('RGB', (self.tile_size, self.tile_size), '#f9f9fe').save(png, format='PNG')
+            self._blank = png.getvalue()
+        return self._blank
+
+    @staticmethod
+    def in_area(xy, area):
+        x0, y0, x1, y1 = area
+        return (xy[:, 0] >= x0) & (xy[:, 0] <= x1) & (xy[:, 1] >= y0) & (xy[:, 1] <= y1)
+
+    @staticmethod
+    def segments_in_area(start, end, area):
+        """Whether each segment's bounding box overlaps the area"""
+        x0, y0, x1, y1 = area
+        low, high = np.minimum(start, end), np.maximum(start, end)
+        return (high[:, 0] >= x0) & (low[:, 0] <= x1) & (high[:, 1] >= y0) & (low[:, 1] <= y1)
+
+    def draw_clusters(self, ax, zoom, area):
+        """Draw clusters and aggregated edges in area; returns whether anything was drawn"""
+        from matplotlib.collections import LineCollection
+
+        mapper = self.mapper
+        clusters = self.clusters(zoom)
+        xy = clusters['xy']
+        edges = np.flatnonzero(self.segments_in_area(xy[clusters['edge_src']],
+                                                     xy[clusters['edge_dst']], area))
+        nodes = np.flatnonzero(self.in_area(xy, area))
+        if len(nodes) == 0 and len(edges) == 0:
+            return False
+
+        # Aggregated edges: wider for more merged edges, coloured by mean drift
+        drift = clusters['edge_drift'][edges]
+        ax.add_collection(LineCollection(
+            np.stack([xy[clusters['edge_src'][edges]], xy[clusters['edge_dst'][edges]]], axis=1),
+            linewidths=0.5 + 0.5 * np.log2(clusters['edge_count'][edges]),
+            colors=mapper.edge_cmap(1.0 - drift), alpha=0.5, zorder=1))
+
+        # Cluster discs grow with log member count up to the cluster cell (in points)
+        cell_points = self.cluster_px * 72 / self.dpi
+        fill = np.log1p(clusters['count'][nodes]) / np.log1p(clusters['count'].max())
+        size = (cell_points * (0.3 + 0.6 * fill)) ** 2
+        ax.scatter(xy[nodes, 0], xy[nodes, 1], s=size,
+                   c=mapper.node_cmap(clusters['entropy'][nodes]), edgecolors='#333',
+                   alpha=0.7, linewidths=0.5, zorder=3)
+        ring = nodes[clusters['classifier'][nodes]]
+        if len(ring):
+            ax.scatter(xy[ring, 0], xy[ring, 1],
+                       s=(np.sqrt(size[clusters['classifier'][nodes]]) + 4) ** 2,
+                       facecolors='none', edgecolors='#9C27B0', alpha=0.8, linewidths=1,
+                       linestyles='--', zorder=5)
+        return True
+
+    def draw_detail(self, ax, area):
+        """Draw nodes, glyphs, labels and edges in area (as draw_map does in batched mode)"""
+        from matplotlib.collections import LineCollection
+        from matplotlib.colors import to_rgba
+        from matplotlib.transforms import offset_copy
+
+        mapper, arrays, xy = self.mapper, self.arrays, self.xy
+        edges = np.flatnonzero(self.segments_in_area(xy[arrays.edge_src], xy[arrays.indices],
+                                                     area))
+        nodes = np.flatnonzero(self.in_area(xy, area))
+        if len(nodes) == 0 and len(edges) == 0:
+            return False
+
+        # Edges and their arrow heads (chosen over the whole map, so tiles agree)
+        edge_drift = arrays.edge_drift[edges]
+        edge_pos = np.stack([xy[arrays.edge_src[edges]], xy[arrays.indices[edges]]], axis=1)
+        edge_colors = mapper.edge_cmap(1.0 - edge_drift)
+        ax.add_collection(LineCollection(edge_pos, linewidths=1.5 * (1.0 - edge_drift) + 0.5,
+                                         colors=edge_colors, zorder=1, alpha=0.7))
+        arrows = self.arrow_edges[edges]
+        mapper.draw_arrows(ax, edge_pos[arrows], edge_colors[arrows])
+        if len(nodes) == 0:
+            return True
+
+        # Nodes and glyphs, with the marker sizes of draw_nodes_batched
+        entropy = arrays.entropy[nodes]
+        size = np.maximum(300 * (1 - 0.15 * arrays.level[nodes]), 0)
+        ax.scatter(xy[nodes, 0], xy[nodes, 1], s=size, c=mapper.node_cmap(entropy),
+                   edgecolors='#333', alpha=0.7, zorder=3, linewidths=1)
+        glyph_size = 10 + size / 80
+        glyph_color = np.where(entropy[:, None] > 0.5, to_rgba('white'), to_rgba('black'))
+        for code, key in enumerate(GLYPH_KEYS):
+            members = np.flatnonzero(arrays.glyph_code[nodes] == code)
+            if len(members):
+                ax.scatter(xy[nodes[members], 0], xy[nodes[members], 1],
+                           s=glyph_size[members] ** 2,
+                           marker=mapper.glyph_marker(mapper.glyphs[key]),
+                           c=glyph_color[members], edgecolors='black', linewidths=0.5, zorder=4)
+
+        # Labels sit a fixed distance in points from their node at every zoom;
+        # label_subset bins on a data-aligned grid, so tiles pick the same labels
+        def offset(points):
+            return offset_copy(ax.transData, fig=ax.figure, y=points, units='points')
+
+        below = offset(-14)
+        for i in mapper.label_subset(ax, xy[nodes], entropy, (30, 14)):
+            ax.text(xy[nodes[i], 0], xy[nodes[i], 1], f"{entropy[i]:.2f}", transform=below,
+                    color='black', fontsize=7, ha='center', va='center',
+                    bbox=dict(facecolor='white', alpha=0.5, pad=1, boxstyle='round'))
+
+        # Classifier rings, glyphs and labels
+        classifier = nodes[arrays.is_classifier[nodes]]
+        if len(classifier):
+            ring_size = np.maximum(300 * (1 - 0.15 * arrays.level[classifier]), 0)
+            ax.scatter(xy[classifier, 0], xy[classifier, 1], s=(np.sqrt(ring_size) + 8) ** 2,
+                       facecolors='none', edgecolors='#9C27B0', alpha=0.8, linewidths=2,
+                       linestyles='--', zorder=5)
+            ax.scatter(xy[classifier, 0], xy[classifier, 1], s=14 ** 2, transform=offset(24),
+                       marker=mapper.glyph_marker(mapper.glyphs['classifier']), c='#9C27B0',
+                       edgecolors='white', linewidths=0.75, zorder=6)
+            above = offset(38)
+            inertia = arrays.classifier_inertia[classifier]
+            for i in mapper.label_subset(ax, xy[classifier], inertia, (80, 40)):
+                ax.text(xy[classifier[i], 0], xy[classifier[i], 1], "Classifier Lock",
+                        transform=above, color='#9C27B0', fontsize=8, ha='center', va='center',
+                        bbox=dict(facecolor='white', alpha=0.7, pad=1, boxstyle='round'))
+        return True
+
+    def description(self):
+        """Pyramid geometry for a viewer (XYZ scheme, row 0 at the top)"""
+        return {
+            'tile_size': self.tile_size,
+            'min_zoom': 0,
+            'max_zoom': self.max_zoom,
+            'detail_zoom': self.detail_zoom,
+            'bounds': [float(self.origin[0]), float(self.origin[1]),
+                       float(self.origin[0] + self.side), float(self.origin[1] + self.side)],
+            'url': '{z}/{x}/{y}.png',
+        }
+
+    def render(self, tiles, workers=None, chunk_tiles=16):
+        """
+        Yield ((zoom, x, y), PNG bytes) for the given tiles, rendered across a
+        process pool when workers > 1 (cache hits are served without rendering)
+        """
+        tiles = list(tiles)
+        if workers is None or workers <= 1:
+            for zoom, x, y in tiles:
+                yield (zoom, x, y), self.tile(zoom, x, y)
+            return
+
+        chunks = [tiles[start:start + chunk_tiles] for start in range(0, len(tiles), chunk_tiles)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_tile_worker,
+                                 initargs=(self,)) as pool:
+            for rendered in bounded_map(pool, _render_tiles, ((chunk,) for chunk in chunks),
+                                        workers):
+                yield from rendered
+
+    def export(self, directory, zooms=None, workers=None):
+        """
+        Write {z}/{x}/{y}.png for every non-empty tile of the given zooms (all
+        by default) plus pyramid.json; return the number of tiles written
+        """
+        os.makedirs(directory, exist_ok=True)
+        if zooms is None:
+            zooms = range(self.max_zoom + 1)
+        tiles = [tile for zoom in zooms for tile in self.tiles(zoom)]
+        written = 0
+        for (zoom, x, y), png in self.render(tiles, workers):
+            # Tiles with nothing in them are left for the viewer's background
+            if png == self.blank():
+                continue
+            path = os.path.join(directory, str(zoom), str(x))
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, f"{y}.png"), 'wb') as f:
+                f.write(png)
+            written += 1
+        with open(os.path.join(directory, 'pyramid.json'), 'w') as f:
+            json.dump(self.description(), f, indent=2)
+        return written
+
+    def __getstate__(self):
+        # Per-zoom clusters are cheap to rebuild and can be large; workers recompute them
+        state = dict(self.__dict__)
+        state['_clusters'] = {}
+        return state
+
+
+# Per-process pyramid used by TilePyramid.render workers
+_tile_worker_pyramid = None
+
+
+def _init_tile_worker(pyramid):
+    """Receive the pyramid once per worker process"""
+    global _tile_worker_pyramid
+    _tile_worker_pyramid = pyramid
+
+
+def _render_tiles(tiles):
+    """Render a chunk of tiles in a worker process"""
+    return [((zoom, x, y), _tile_worker_pyramid.tile(zoom, x, y)) for zoom, x, y in tiles]
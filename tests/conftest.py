@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live flat in code/; tests render headless
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code'))
+os.environ.setdefault('MPLBACKEND', 'Agg')
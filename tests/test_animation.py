@@ -0,0 +1,25 @@
+import io
+
+import pytest
+
+from qkov_recursive_map import RecursiveQKOVMapper
+
+
+def gif(mapper, **options):
+    buffer = io.BytesIO()
+    mapper.create_animation(buffer, frames=6, **options)
+    return buffer.getvalue()
+
+
+def test_parallel_gif_matches_serial():
+    for render_mode in ('artists', 'batched'):
+        mapper = RecursiveQKOVMapper(depth=3, nodes_per_level=6, seed=4)
+        serial = gif(mapper, render_mode=render_mode)
+        assert serial.startswith(b'GIF89a')
+        assert gif(mapper, render_mode=render_mode, workers=2, chunk_frames=2) == serial
+
+
+def test_animation_needs_a_frame():
+    mapper = RecursiveQKOVMapper(depth=3, nodes_per_level=6, seed=4)
+    with pytest.raises(ValueError, match='frames must be >= 1'):
+        mapper.create_animation(io.BytesIO(), frames=0)
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from qkov_concurrency import IN_FLIGHT_PER_WORKER, atomic_file, bounded_map, write_atomic
+
+
+class RecordingPool:
+    """Runs tasks on submit and records the most futures left unconsumed at once"""
+
+    def __init__(self):
+        self.unconsumed = []
+        self.most = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        self.unconsumed.append(future)
+        self.most = max(self.most, len(self.unconsumed))
+        return future
+
+
+def test_bounded_map_keeps_order_and_bound():
+    pool = RecordingPool()
+    results = []
+    for result in bounded_map(pool, pow, ((n, 2) for n in range(20)), workers=3):
+        results.append(result)
+        pool.unconsumed.pop(0)
+    assert results == [n * n for n in range(20)]
+    assert pool.most == IN_FLIGHT_PER_WORKER * 3
+
+
+def test_bounded_map_unordered_returns_everything():
+    with ThreadPoolExecutor(4) as pool:
+        results = bounded_map(pool, pow, ((n, 2) for n in range(50)), workers=4, ordered=False)
+        assert sorted(results) == [n * n for n in range(50)]
+
+
+def test_atomic_file_leaves_no_partial_file(tmp_path):
+    path = tmp_path / 'artifact.bin'
+    write_atomic(path, b'old')
+    with pytest.raises(RuntimeError):
+        with atomic_file(path) as f:
+            f.write(b'partial')
+            raise RuntimeError
+    assert path.read_bytes() == b'old'
+    assert os.listdir(tmp_path) == ['artifact.bin']
+    write_atomic(path, 'new')
+    assert path.read_text() == 'new'
+    assert path.stat().st_mode & 0o777 == 0o644
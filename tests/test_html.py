@@ -0,0 +1,15 @@
+import io
+
+import pytest
+
+from qkov_recursive_map import RecursiveQKOVMapper
+
+
+@pytest.mark.parametrize('output_mode', ['images', 'canvas'])
+def test_binary_and_text_streams_match(output_mode):
+    mapper = RecursiveQKOVMapper(depth=3, nodes_per_level=5, seed=8)
+    text, binary = io.StringIO(), io.BytesIO()
+    for stream in (text, binary):
+        mapper.write_html_output(stream, output_mode=output_mode, frames=4)
+    assert binary.getvalue() == text.getvalue().encode('utf-8')
+    assert mapper.generate_html_output(output_mode=output_mode, frames=4) == text.getvalue()
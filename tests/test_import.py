@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+
+from qkov_benchmarks import IMPORT_BUDGET_MS, LAZY_IMPORTS, measure_import
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code')
+
+
+def test_import_time_budget():
+    # Best of three fresh interpreters, so one cold start does not fail the budget
+    timings = []
+    for _ in range(3):
+        elapsed, packages = measure_import()
+        assert not packages.intersection(LAZY_IMPORTS)
+        timings.append(elapsed)
+    assert min(timings) <= IMPORT_BUDGET_MS
+
+
+def test_import_is_headless():
+    loaded = subprocess.run(
+        [sys.executable, '-c', 'import json, sys, qkov_recursive_map; '
+                               'print(json.dumps(sorted(sys.modules)))'],
+        cwd=CODE_DIR, capture_output=True, text=True, check=True)
+    modules = set(json.loads(loaded.stdout))
+    assert 'matplotlib.pyplot' not in modules
+    assert 'IPython' not in modules
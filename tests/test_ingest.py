@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from qkov_ingest import AttributionTensor
+
+
+def mass(tensor, block_bytes):
+    blocks = list(tensor.mass_blocks(block_bytes))
+    step = tensor.block_rows(block_bytes)
+    assert [start for start, _ in blocks] == list(range(0, tensor.rows, step))
+    return np.concatenate([block for _, block in blocks])
+
+
+@pytest.mark.parametrize('shape, block_bytes', [((40, 16), 8 * 16 * 7), ((3, 40, 16), 1 << 20)])
+def test_compressed_members_stream_like_stored_ones(tmp_path, shape, block_bytes):
+    array = np.random.default_rng(0).normal(size=shape).astype(np.float32)
+    np.savez(tmp_path / 'stored.npz', a=array)
+    np.savez_compressed(tmp_path / 'compressed.npz', a=array)
+    stored = AttributionTensor((tmp_path / 'stored.npz', 'a'))
+    compressed = AttributionTensor((tmp_path / 'compressed.npz', 'a'))
+    assert compressed.member is not None and stored.member is None
+    expected = np.abs(array).sum(axis=0) if array.ndim == 3 else np.abs(array)
+    np.testing.assert_allclose(mass(compressed, block_bytes), expected, rtol=1e-6)
+    np.testing.assert_allclose(mass(stored, block_bytes), expected, rtol=1e-6)
+
+
+def test_large_compressed_multi_head_member_is_refused(tmp_path):
+    np.savez_compressed(tmp_path / 'compressed.npz', a=np.ones((2, 40, 16)))
+    tensor = AttributionTensor((tmp_path / 'compressed.npz', 'a'))
+    with pytest.raises(ValueError, match='np.savez'):
+        mass(tensor, 8 * 16 * 7)
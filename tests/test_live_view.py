@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from qkov_recursive_map import LiveDriftView, RecursiveQKOVMapper
+
+
+def live_view(**kwargs):
+    mapper = RecursiveQKOVMapper(depth=5, nodes_per_level=20, array_core=True, seed=7)
+    return LiveDriftView(mapper, figsize=(6, 6), dpi=100, **kwargs)
+
+
+@pytest.mark.parametrize('label_budget', [None, 20])
+def test_incremental_redraw_matches_full_redraw(label_budget):
+    view = live_view(label_budget=label_budget)
+    rng = np.random.default_rng(0)
+    updates = [[5, 40]] + [rng.choice(view.mapper.core.num_nodes, size=3, replace=False)
+                           for _ in range(5)]
+    for nodes in updates:
+        view.update_node_metrics(nodes, entropy=rng.random(len(nodes)),
+                                 classifier_inertia=rng.random(len(nodes)))
+        fresh = LiveDriftView(view.mapper, figsize=(6, 6), dpi=100, label_budget=label_budget)
+        assert np.array_equal(view.rgb(), fresh.rgb())
+
+
+def test_add_nodes_rejects_unknown_level():
+    view = live_view()
+    for level in (-1, view.mapper.depth):
+        with pytest.raises(ValueError, match='Level must be in'):
+            view.add_nodes(level, [0.5])
+    with pytest.raises(ValueError, match='Level must be in'):
+        view.mapper.core.insert_nodes(view.mapper.depth, [0.5], [0.5], [0.5], [0],
+                                      view.mapper.depth)
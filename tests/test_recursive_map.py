@@ -0,0 +1,112 @@
+import numpy as np
+
+from qkov_ingest import sparsify_rows
+from qkov_recursive_map import RecursiveQKOVMapper
+
+
+def edge_set(mapper):
+    arrays = mapper.map_arrays()
+    return set(zip(arrays.edge_src.tolist(), arrays.indices.tolist()))
+
+
+def test_drift_threshold_prunes_edges():
+    for array_core in (False, True):
+        kept = {threshold: RecursiveQKOVMapper(depth=5, nodes_per_level=20, seed=1,
+                                               array_core=array_core,
+                                               drift_threshold=threshold)
+                for threshold in (None, 0.9, 0.65)}
+        edges = {threshold: edge_set(mapper) for threshold, mapper in kept.items()}
+        assert edges[0.65] < edges[0.9] < edges[None]
+
+        # Pruned edges are over the threshold; every node but the last level keeps an out-edge
+        arrays = kept[0.65].map_arrays()
+        out_degree = np.diff(arrays.indptr)
+        assert (out_degree[:arrays.level_offsets[-2]] > 0).all()
+        full = kept[None].map_arrays()
+        pruned = edges[None] - edges[0.65]
+        drift = dict(zip(zip(full.edge_src.tolist(), full.indices.tolist()), full.edge_drift))
+        assert all(drift[edge] > 0.65 for edge in pruned)
+
+
+def test_prune_drift_edges_without_threshold():
+    mapper = RecursiveQKOVMapper(depth=4, nodes_per_level=6, seed=2, drift_threshold=None)
+    assert mapper.prune_drift_edges() == 0
+    assert mapper.prune_drift_edges(0.5) > 0
+
+
+def test_from_attributions_keeps_edges(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / 'attributions.npz'
+    np.savez(path, **{f'{kind}_{layer}': rng.random((16, 16))
+                      for kind in ('qk', 'ov') for layer in range(2)})
+    pruned = RecursiveQKOVMapper.from_attributions(path).map_arrays()
+    full = RecursiveQKOVMapper.from_attributions(path, drift_threshold=None).map_arrays()
+    assert 0 < pruned.num_edges < full.num_edges
+    assert (np.diff(pruned.indptr)[:16] > 0).all()
+
+
+def test_sparsify_rows_keeps_strongest_entry():
+    shares = np.array([[0.5, 0.3, 0.2], [0.1, 0.1, 0.8]])
+    rows, cols, _ = sparsify_rows(shares, top_k=2, max_drift=0.0,
+                                  src_drift=np.ones(2), dst_drift=np.ones(3))
+    assert list(zip(rows, cols)) == [(0, 0), (1, 2)]
+
+
+def test_seeded_maps_are_reproducible():
+    for array_core in (False, True):
+        first, second, other = (RecursiveQKOVMapper(depth=4, nodes_per_level=10, seed=seed,
+                                                    array_core=array_core).map_arrays()
+                                for seed in (5, 5, 6))
+        for name in ('level_offsets', 'entropy', 'loopback_density', 'classifier_inertia',
+                     'glyph_code', 'indptr', 'indices', 'edge_weight', 'edge_drift'):
+            assert np.array_equal(getattr(first, name), getattr(second, name)), name
+        assert not np.array_equal(first.entropy, other.entropy)
+
+    # The array core draws in another order, so the same seed gives another map
+    legacy, array = (RecursiveQKOVMapper(seed=5, array_core=array_core).map_arrays()
+                     for array_core in (False, True))
+    assert np.array_equal(legacy.level_offsets, array.level_offsets)
+    assert not np.array_equal(legacy.entropy, array.entropy)
+
+
+def check_csr(core):
+    n = core.num_nodes
+    assert core.level_offsets[0] == 0 and (np.diff(core.level_offsets) >= 0).all()
+    assert core.level_offsets[-1] == n
+    assert core.indptr[0] == 0 and core.indptr[-1] == core.num_edges == len(core.indices)
+    assert len(core.indptr) == n + 1 and (np.diff(core.indptr) >= 0).all()
+    for name in ('entropy', 'loopback_density', 'classifier_inertia', 'glyph_code', 'drift',
+                 'is_classifier'):
+        assert len(getattr(core, name)) == n, name
+    for name in ('edge_weight', 'edge_drift', 'edge_noise'):
+        assert len(getattr(core, name)) == core.num_edges, name
+
+    # Edges run from level L to L+1, sorted and unique within each row
+    level = np.searchsorted(core.level_offsets, np.arange(n), side='right') - 1
+    assert ((core.indices >= 0) & (core.indices < n)).all()
+    assert (level[core.indices] == level[core.edge_src] + 1).all()
+    same_row = core.edge_src[1:] == core.edge_src[:-1]
+    assert (np.diff(core.indices)[same_row] > 0).all()
+
+
+def test_csr_invariants_after_add_and_remove():
+    mapper = RecursiveQKOVMapper(depth=4, nodes_per_level=8, array_core=True, seed=9)
+    core = mapper.core
+    check_csr(core)
+
+    nodes = mapper.add_nodes(1, [0.2, 0.8])
+    check_csr(core)
+    offsets = core.level_offsets
+    src = np.repeat(nodes, 2)
+    dst = np.tile(offsets[2] + np.arange(2), 2)
+    edges = mapper.add_edges(src, dst)
+    assert len(edges) == 4
+    check_csr(core)
+    assert len(mapper.add_edges(src, dst)) == 0
+
+    assert mapper.remove_edges(src[:2], dst[:2]) == 2
+    check_csr(core)
+    remap = mapper.remove_nodes([0, nodes[1], core.num_nodes - 1])
+    assert (remap == -1).sum() == 3
+    check_csr(core)
+    assert len(mapper.position_array()) == core.num_nodes
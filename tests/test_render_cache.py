@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from qkov_recursive_map import RecursiveQKOVMapper
+from qkov_render_cache import RenderCache
+
+
+def test_visualize_cache_hit_copies_without_drawing(tmp_path, monkeypatch):
+    mapper = RecursiveQKOVMapper(depth=3, nodes_per_level=5, seed=3)
+    cache = RenderCache(tmp_path / 'cache')
+    first, second = tmp_path / 'first.png', tmp_path / 'second.png'
+    assert mapper.visualize(figsize=(4, 4), save_path=str(first), cache=cache) is not None
+
+    def draw_map(*args, **kwargs):
+        raise AssertionError('a cache hit must not draw')
+
+    monkeypatch.setattr(mapper, 'draw_map', draw_map)
+    assert mapper.visualize(figsize=(4, 4), save_path=str(second), cache=cache) is None
+    assert first.read_bytes() == second.read_bytes()
+    assert cache.stats()['hits'] == 1
+
+
+def test_get_survives_eviction_after_read(tmp_path, monkeypatch):
+    cache = RenderCache(tmp_path)
+    cache.put('key', 'png', b'data')
+
+    def utime(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, 'utime', utime)
+    assert cache.get('key', 'png') == b'data'
+
+
+def test_counters_are_flushed_in_batches(tmp_path):
+    cache = RenderCache(tmp_path)
+    cache.flush_every = 10
+    for _ in range(9):
+        cache.get('missing', 'png')
+    assert not (tmp_path / 'stats.json').exists()
+    cache.get('missing', 'png')
+    assert (tmp_path / 'stats.json').exists()
+
+    cache.get('missing', 'png')
+    other = RenderCache(tmp_path)
+    assert other.stats()['shared_misses'] == 10
+    stats = cache.stats()
+    assert (stats['misses'], stats['shared_misses']) == (11, 11)
+
+
+@pytest.mark.parametrize('collect', [False, True])
+def test_pending_counters_flush_on_collection(tmp_path, collect):
+    cache = RenderCache(tmp_path)
+    cache.get('missing', 'png')
+    if collect:
+        del cache
+    else:
+        cache.flush()
+    assert RenderCache(tmp_path).stats()['shared_misses'] == 1
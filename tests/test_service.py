@@ -0,0 +1,64 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+
+from qkov_service import (RenderService, ServiceError, fetch, load_paths, read_request,
+                          run_load_test)
+
+
+def npz(**arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def serve(test, **options):
+    async def run():
+        service = RenderService(workers=1, **options)
+        host, port = await service.start()
+        try:
+            return await test(host, port)
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+def test_post_bodies_count_towards_max_nodes():
+    core = npz(level_offsets=np.array([0, 40, 80]))
+    tensors = npz(qk_0=np.ones((30, 30)), qk_1=np.ones((30, 30)), ov_0=np.ones((30, 30)))
+
+    async def test(host, port):
+        return [await fetch(host, port, '/render/png', body) for body in (core, tensors)]
+
+    for status, _, data in serve(test, max_nodes=50):
+        assert status == 400
+        assert b'exceeds the limit of 50' in data
+
+
+async def read(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return await read_request(reader, 1024)
+
+
+@pytest.mark.parametrize('length', [b'ten', b'-5'])
+def test_bad_content_length_is_rejected(length):
+    with pytest.raises(ServiceError) as error:
+        asyncio.run(read(b'POST /render/png HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n'))
+    assert error.value.status == 400
+
+
+def test_load_test():
+    result = asyncio.run(run_load_test(
+        requests=24, concurrency=6, paths=load_paths(distinct=2, depth=3, nodes_per_level=5,
+                                                     dpi=30),
+        workers=2, max_queued=4))
+    assert set(result['statuses']) <= {'200', '503'}
+    assert result['statuses']['200'] > 0
+    service = result['service']
+    assert service['failed'] == 0 and service['in_flight'] == 0
+    assert service['requests'] == 24
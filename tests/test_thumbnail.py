@@ -0,0 +1,17 @@
+import numpy as np
+
+from qkov_recursive_map import DriftMapArrays, RecursiveQKOVMapper
+from qkov_thumbnail import BACKGROUND, ThumbnailRasterizer
+
+
+def test_zero_length_edges_leave_no_nan_pixels():
+    # Two nodes on one spot, joined by a single edge
+    core = DriftMapArrays(np.array([0, 1, 2]), np.array([0.2, 0.6]), np.full(2, 0.5),
+                          np.full(2, 0.3), np.zeros(2, dtype=np.int8), np.array([0, 1, 1]),
+                          np.array([1]), np.array([1.0]))
+    mapper = RecursiveQKOVMapper(core=core, seed=0, drift_threshold=None)
+    mapper.positions = np.zeros((2, 2))
+
+    with np.errstate(invalid='raise'):
+        image = ThumbnailRasterizer(64).rasterize(mapper)
+    assert (image[0, 0] == BACKGROUND).all()